@@ -0,0 +1,129 @@
+"""
+HMP2030 driver benchmark on the simulated instrument
+
+Report the round trips, bytes and wall time of the public API. A JSON report saved with --save can be given to
+--compare: the run then fails when any benchmark needs more round trips or bytes than the saved report.
+"""
+import argparse
+import json
+import sys
+import time
+from pyrs.hmp2030 import HMP2030
+from pyrs.simulator import SimulatedResourceManager
+from pyrs.stream import acquire
+
+SETTINGS = {'volt': {'value': 2.0, 'step': 0.5}, 'current': {'value': 0.5, 'step': 0.1}}
+
+
+def measure_loop(device):
+    """
+    Measure voltage and current on all channels, one channel at a time
+    """
+    for channel in (1, 2, 3):
+        device.channel = channel
+        float(device.measure_voltage)
+        float(device.measure_current)
+
+
+def source_properties(device):
+    """
+    Set then get the selected channel source properties
+    """
+    device.source_properties = SETTINGS
+    return device.source_properties
+
+
+BENCHMARKS = {
+    'identity': lambda device: device.identity,
+    'source_properties.get': lambda device: device.source_properties,
+    'source_properties.set': lambda device: setattr(device, 'source_properties', SETTINGS),
+    'source_properties.set+get': source_properties,
+    'set_power': lambda device: device.set_power({1: 1.0, 2: 2.0, 3: 3.0}),
+    'output_selected': lambda device: device.output_selected([1, 2, 3], 1),
+    'measure_loop': measure_loop,
+    'acquire': lambda device: acquire(device, [1, 2, 3]),
+    'measure.10': lambda device: device.measure([1, 2, 3], samples=10),
+}
+
+
+def run(device, function, repeat):
+    """
+    Run a benchmark
+
+    :param device: HMP2030 device on a simulated instrument
+    :param function: benchmark function
+    :param repeat: number of calls
+    :return: dictionary of per call figures
+    """
+    function(device)
+    before = dict(device.instr.counters)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function(device)
+    elapsed = time.perf_counter() - start
+    counters = {key: (value - before[key]) / repeat for key, value in device.instr.counters.items()}
+    return {
+        'round_trips': counters['writes'],
+        'reads': counters['reads'],
+        'bytes': counters['bytes_written'] + counters['bytes_read'],
+        'time_ms': 1000 * elapsed / repeat,
+    }
+
+
+def compare(report, reference):
+    """
+    Compare a report with a reference report
+
+    :param report: benchmark report
+    :param reference: reference benchmark report
+    :return: a list of regression messages
+    """
+    regressions = []
+    for name, figures in report.items():
+        for key in ('round_trips', 'bytes'):
+            if name in reference and figures[key] > reference[name][key]:
+                regressions.append(f"{name}: {key} {reference[name][key]:g} -> {figures[key]:g}")
+    return regressions
+
+
+def main():
+    """
+    Main entry
+
+    :return:
+    """
+    parser = argparse.ArgumentParser(description='HMP2030 driver benchmark on the simulated instrument')
+    parser.add_argument('-r', '--repeat', type=int, default=20, help='number of calls per benchmark. default = 20')
+    parser.add_argument('--latency', type=float, default=0.002, help='simulated write latency. default = 0.002 s')
+    parser.add_argument('--jitter', type=float, default=0.0, help='simulated write jitter. default = 0 s')
+    parser.add_argument('--cache', action='store_true', help='enable the driver shadow state cache')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    parser.add_argument('--save', help='save the report in a JSON file')
+    parser.add_argument('--compare', help='fail on round trips or bytes regressions against a JSON report')
+    args = parser.parse_args()
+
+    rm = SimulatedResourceManager(latency=args.latency, jitter=args.jitter)
+    device = HMP2030('SIM::HMP2030', resource_manager=rm, cache=args.cache)
+    report = {name: run(device, function, args.repeat) for name, function in BENCHMARKS.items()}
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{'benchmark':<28}{'round trips':>12}{'reads':>8}{'bytes':>8}{'time (ms)':>12}")
+        for name, figures in report.items():
+            print(f"{name:<28}{figures['round_trips']:>12g}{figures['reads']:>8g}{figures['bytes']:>8g}"
+                  f"{figures['time_ms']:>12.2f}")
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            regressions = compare(report, json.load(file))
+        for regression in regressions:
+            print(f"regression: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
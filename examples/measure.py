@@ -4,6 +4,7 @@ Example on measure domain
 import argparse
 import pyvisa.errors
 from pyrs.hmp2030 import HMP2030
+from pyrs.simulator import SimulatedResourceManager
 
 NAME = 'USB0::0x0AAD::0x0117::120470::INSTR'
 LIBRARY = '/usr/lib/librsvisa.so'
@@ -12,10 +13,12 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('-n', '--name', default=NAME, help=f'device visa name or address. default = {NAME}')
     parser.add_argument('-l', '--library', default=LIBRARY, help=f'visa shared library. default = {LIBRARY}')
+    parser.add_argument('-s', '--simulate', action='store_true', help='use a simulated instrument')
     args = parser.parse_args()
 
     try:
-        device = HMP2030(name=args.name, library=args.library)
+        rm = SimulatedResourceManager() if args.simulate else None
+        device = HMP2030(name=args.name, library=args.library, resource_manager=rm)
         device.beep()
 
         print("----------------------------------------------------------------------------------------------------------")
@@ -0,0 +1,222 @@
+"""
+EasyArb sequences
+
+A sequence is an array of (voltage, current, dwell) points, played by the instrument with its own timing.
+"""
+
+import time
+import numpy as np
+
+#: maximum number of points of the instrument ARB table
+MAX_POINTS = 128
+#: point limits of the HMP2030 channels
+VOLT_RANGE = (0.0, 32.0)
+CURRENT_RANGE = (0.0, 5.0)
+DWELL_RANGE = (0.01, 60.0)
+#: maximum number of repetitions. 0 repeats forever
+MAX_REPETITIONS = 255
+
+
+def sequence(volt, current, dwell):
+    """
+    Build a sequence from voltage, current and dwell values
+
+    Scalars are broadcast to the length of the other arguments.
+
+    :param volt: voltage value(s) in volt
+    :param current: current value(s) in Ampere
+    :param dwell: dwell time(s) in seconds
+    :return: array of (volt, current, dwell) points
+    """
+    volt, current, dwell = np.broadcast_arrays(*(np.atleast_1d(np.asarray(value, dtype=float))
+                                                 for value in (volt, current, dwell)))
+    return np.column_stack((volt, current, dwell))
+
+
+def validate(points):
+    """
+    Check a sequence against the instrument limits
+
+    :param points: array of (volt, current, dwell) points
+    :return: None
+    :raise ValueError: when a point is out of the instrument limits
+    """
+    if len(points) == 0:
+        raise ValueError("empty ARB sequence")
+    for column, name, (low, high) in ((0, 'voltage', VOLT_RANGE), (1, 'current', CURRENT_RANGE),
+                                      (2, 'dwell', DWELL_RANGE)):
+        values = points[:, column]
+        invalid = np.flatnonzero(~np.isfinite(values) | (values < low) | (values > high))
+        if len(invalid):
+            raise ValueError(f"ARB point {invalid[0]}: {name} {values[invalid[0]]} out of range [{low}, {high}]")
+
+
+def compress(points, tolerance=0.0):
+    """
+    Merge consecutive points with the same voltage and current, adding their dwell times
+
+    Merged dwell times longer than the instrument maximum are split again.
+
+    :param points: array of (volt, current, dwell) points
+    :param tolerance: maximum voltage and current difference of a merged point to the first point of its run. 0 merges
+                      identical points only
+    :return: array of (volt, current, dwell) points
+    """
+    if len(points) < 2:
+        return points
+    if tolerance == 0:
+        change = np.any(np.diff(points[:, :2], axis=0) != 0, axis=1)
+        starts = np.concatenate(([0], np.flatnonzero(change) + 1))
+    else:
+        starts = [0]
+        reference = points[0, :2].tolist()
+        for index, (volt, current) in enumerate(points[1:, :2].tolist(), 1):
+            if abs(volt - reference[0]) > tolerance or abs(current - reference[1]) > tolerance:
+                starts.append(index)
+                reference = [volt, current]
+        starts = np.array(starts)
+    dwell = np.add.reduceat(points[:, 2], starts)
+    merged = np.column_stack((points[starts, 0], points[starts, 1], dwell))
+    repeats = np.ceil(dwell / DWELL_RANGE[1]).astype(int)
+    merged = np.repeat(merged, repeats, axis=0)
+    merged[:, 2] = np.repeat(dwell / repeats, repeats)
+    return merged
+
+
+def chunks(points, size=MAX_POINTS):
+    """
+    Split a sequence into tables fitting the instrument
+
+    :param points: array of (volt, current, dwell) points
+    :param size: maximum number of points per table
+    :return: a list of arrays of points
+    """
+    return [points[start:start + size] for start in range(0, len(points), size)]
+
+
+def data_command(points):
+    """
+    Build the ARB:DATA command of a table
+
+    :param points: array of (volt, current, dwell) points
+    :return: command string
+    """
+    return 'ARB:DATA ' + ','.join(f"{volt:.3f},{current:.4f},{dwell:.3f}" for volt, current, dwell in points)
+
+
+def duration(points, repetitions=1):
+    """
+    Get the play time of a sequence
+
+    :param points: array of (volt, current, dwell) points
+    :param repetitions: number of repetitions
+    :return: duration in seconds
+    """
+    return float(np.sum(points[:, 2])) * repetitions
+
+
+class Generator:
+    """
+    EasyArb generator of a HMP2030::
+
+        device.arb.run(volt=np.linspace(0, 5, 50), current=0.1, dwell=0.02, channels=[1])
+        device.arb.stop([1])
+    """
+    def __init__(self, device):
+        """
+        Create a generator handle
+
+        :param device: HMP2030 device
+        """
+        self.device = device
+
+    def _table(self, batch, points, repetitions):
+        """
+        Queue the upload of an ARB table
+
+        :param batch: batch to fill
+        :param points: array of (volt, current, dwell) points
+        :param repetitions: number of repetitions. 0 repeats forever
+        :return: None
+        """
+        if not 0 <= repetitions <= MAX_REPETITIONS:
+            raise ValueError(f"ARB repetitions {repetitions} out of range [0, {MAX_REPETITIONS}]")
+        batch.write('ARB:CLE')
+        batch.write(data_command(points))
+        batch.write(f'ARB:REP {repetitions}')
+
+    def upload(self, volt, current, dwell, repetitions=1):
+        """
+        Upload a sequence in the instrument ARB table
+
+        :param volt: voltage value(s) in volt
+        :param current: current value(s) in Ampere
+        :param dwell: dwell time(s) in seconds
+        :param repetitions: number of repetitions. 0 repeats forever
+        :return: array of (volt, current, dwell) points
+        """
+        points = sequence(volt, current, dwell)
+        validate(points)
+        if len(points) > MAX_POINTS:
+            raise ValueError(f"{len(points)} ARB points, the instrument table holds {MAX_POINTS}")
+        with self.device.batch() as batch:
+            self._table(batch, points, repetitions)
+        return points
+
+    def start(self, channels: list):
+        """
+        Transfer the ARB table to channels and start it
+
+        :param channels: a list of channel number (1,2,3)
+        :return: None
+        """
+        with self.device.batch() as batch:
+            for i in channels:
+                batch.write(f'ARB:TRAN {i}')
+                batch.write(f'ARB:STAR {i}')
+
+    def stop(self, channels: list):
+        """
+        Stop the ARB sequence of channels
+
+        :param channels: a list of channel number (1,2,3)
+        :return: None
+        """
+        with self.device.batch() as batch:
+            for i in channels:
+                batch.write(f'ARB:STOP {i}')
+
+    def run(self, volt, current, dwell, channels: list, *, repetitions=1, tolerance=0.0) -> float:
+        """
+        Play a sequence on channels with the instrument timing
+
+        A sequence fitting the ARB table is uploaded and started in a single transfer, and the call returns
+        immediately. A longer sequence is first compressed (consecutive points closer than tolerance are merged),
+        then split into tables played one after the other: the call then returns once the sequence is done, and
+        each table switch costs a round trip.
+
+        :param volt: voltage value(s) in volt
+        :param current: current value(s) in Ampere
+        :param dwell: dwell time(s) in seconds
+        :param channels: a list of channel number (1,2,3)
+        :param repetitions: number of repetitions. 0 repeats forever
+        :param tolerance: maximum voltage and current difference of merged points
+        :return: sequence duration in seconds
+        """
+        points = sequence(volt, current, dwell)
+        validate(points)
+        if len(points) > MAX_POINTS:
+            points = compress(points, tolerance)
+        tables = chunks(points)
+        if len(tables) > 1 and repetitions == 0:
+            raise ValueError(f"{len(points)} ARB points can not be repeated forever")
+        for _ in range(repetitions if len(tables) > 1 else 1):
+            for table in tables:
+                with self.device.batch() as batch:
+                    self._table(batch, table, 1 if len(tables) > 1 else repetitions)
+                    for i in channels:
+                        batch.write(f'ARB:TRAN {i}')
+                        batch.write(f'ARB:STAR {i}')
+                if len(tables) > 1:
+                    time.sleep(duration(table))
+        return duration(points, repetitions)
@@ -0,0 +1,475 @@
+"""
+HMP2030 Power supply asyncio interface
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from pyrs.hmp2030 import HMP2030
+
+
+class AsyncHMP2030:
+    """
+    HMP2030 Power supply class with awaitable operations
+
+    Each operation runs the blocking HMP2030 I/O in an executor thread, so the event loop is never blocked.
+    Operations on one device are serialized by a lock, and run in a device transaction, so a channel selection, a
+    write and its read are never interleaved with another operation, even from threads sharing the device.
+    Operations on different devices run concurrently: by default each device has its own worker thread, so the
+    number of devices driven at once is not capped by a shared executor.
+    """
+    def __init__(self, device: HMP2030, executor=None):
+        """
+        Create AsyncHMP2030 object
+
+        :param device: HMP2030 device
+        :param executor: concurrent.futures executor running the I/O. None for a worker thread owned by the object
+        """
+        self.device = device
+        self._owned = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix='pyrs-async')
+        self._lock = None
+
+    @classmethod
+    async def open(cls, name, library="/usr/lib/librsvisa.so", executor=None, **options):
+        """
+        Open a device without blocking the event loop
+
+        :param name: VISA resource name
+        :param library: Path on VISA backend library
+        :param executor: concurrent.futures executor running the I/O. None for a worker thread owned by the object
+        :param options: HMP2030 options (timeout, delay, cache, resource_manager)
+        :return: AsyncHMP2030 object
+        """
+        loop = asyncio.get_running_loop()
+        device = await loop.run_in_executor(executor, functools.partial(HMP2030, name, library, **options))
+        return cls(device, executor)
+
+    async def run(self, function, *args):
+        """
+        Run a blocking function on the device, as an atomic operation
+
+        :param function: callable taking the HMP2030 object and args
+        :param args: function arguments
+        :return: function result
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(function, self.device, *args))
+
+    async def _get(self, name, channel=None):
+        """
+        Get a device property, on a channel selected in the same operation
+
+        :param name: property name
+        :param channel: channel number. None for the selected channel
+        :return: property value
+        """
+        def get(device):
+            with device.transaction():
+                if channel is not None:
+                    device.channel = channel
+                return getattr(device, name)
+        return await self.run(get)
+
+    async def _set(self, name, value, channel=None):
+        """
+        Set a device property, on a channel selected in the same operation
+
+        :param name: property name
+        :param value: property value
+        :param channel: channel number. None for the selected channel
+        :return: None
+        """
+        def set_(device):
+            with device.transaction():
+                if channel is not None:
+                    device.channel = channel
+                setattr(device, name, value)
+        await self.run(set_)
+
+    async def _call(self, name, *args, channel=None):
+        """
+        Call a device method, on a channel selected in the same operation
+
+        :param name: method name
+        :param args: method arguments
+        :param channel: channel number. None for the selected channel
+        :return: method result
+        """
+        def call(device):
+            with device.transaction():
+                if channel is not None:
+                    device.channel = channel
+                return getattr(device, name)(*args)
+        return await self.run(call)
+
+    async def send(self, command):
+        """
+        Send the command
+
+        :param command: command string
+        :return: None
+        """
+        await self._call('send', command)
+
+    async def query(self, command):
+        """
+        Send a query and read its response
+
+        :param command: query string
+        :return: response string
+        """
+        return await self._call('query', command)
+
+    async def close(self):
+        """
+        Close the device session, and stop the worker thread owned by the object
+
+        :return: None
+        """
+        try:
+            await self.run(HMP2030.close)
+        finally:
+            if self._owned:
+                self._executor.shutdown(wait=False)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # COMMON subsystem
+    # ------------------------------------------------------------------------------------------------------------------
+
+    async def identity(self):
+        """
+        Get identity string
+
+        :return: device identity string
+        """
+        return await self._get('identity')
+
+    async def save(self, location):
+        """
+        Save the current setting in a location
+
+        :param location: location number
+        :return: None
+        """
+        await self._call('save', location)
+
+    async def call(self, location):
+        """
+        recall settings form a location
+
+        :param location: location number
+        :return: None
+        """
+        await self._call('call', location)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # SYSTEM subsystem
+    # ------------------------------------------------------------------------------------------------------------------
+
+    async def beep(self):
+        """
+        Emit a single beep from the instrument
+
+        :return: None
+        """
+        await self._call('beep')
+
+    async def version(self):
+        """
+        Get scpi version
+
+        :return: version number
+        """
+        return await self._get('version')
+
+    async def error(self):
+        """
+        Query the error/event queue
+
+        :return: error string
+        """
+        return await self._get('error')
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # INSTRUMENT subsystem
+    # ------------------------------------------------------------------------------------------------------------------
+
+    async def channel(self):
+        """
+        Get the current selected channel
+
+        :return: Selected channel
+        """
+        return await self._get('channel')
+
+    async def set_channel(self, channel):
+        """
+        Set channel by number
+
+        :param channel: channel number
+        :return: None
+        """
+        await self._set('channel', channel)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # MEASURE subsystem
+    # ------------------------------------------------------------------------------------------------------------------
+
+    async def measure_current(self, channel=None):
+        """
+        Queries the current value of a channel
+
+        :param channel: channel number. None for the selected channel
+        :return: current in Ampere
+        """
+        return await self._get('measure_current', channel)
+
+    async def measure_voltage(self, channel=None):
+        """
+        Queries the voltage value of a channel
+
+        :param channel: channel number. None for the selected channel
+        :return: voltage in volt
+        """
+        return await self._get('measure_voltage', channel)
+
+    async def measure(self, channels: list, samples=1, mean=False):
+        """
+        Measure voltage and current on several channels in one call
+
+        :param channels: a list of channel number (1,2,3)
+        :param samples: number of samples per channel
+        :param mean: average the samples of each channel
+        :return: array of records (time, channel, volt, current)
+        """
+        return await self._call('measure', channels, samples, mean)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # OUTPUT subsystem
+    # ------------------------------------------------------------------------------------------------------------------
+
+    async def output(self, channel=None):
+        """
+        Query the output state of a channel
+
+        :param channel: channel number. None for the selected channel
+        :return: output state
+        """
+        return await self._get('output', channel)
+
+    async def set_output(self, state, channel=None):
+        """
+        Activate a channel and turns on the output
+
+        :param state: ON | OFF
+        :param channel: channel number. None for the selected channel
+        :return: None
+        """
+        await self._set('output', state, channel)
+
+    async def output_selected(self, channels: list, state):
+        """
+        selected channels in the list, activate and turns on output simultaneously
+
+        :param channels: a list of channel number (1,2,3)
+        :param state: 0 or 1
+        :return: None
+        """
+        await self._call('output_selected', channels, state)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # SOURCE subsystem
+    # ------------------------------------------------------------------------------------------------------------------
+
+    @property
+    def source(self):
+        """
+        Get selected source parameter
+
+        :return: source parameter (volt, curr)
+        """
+        return self.device.source
+
+    async def set_source(self, param):
+        """
+        Set current source parameter, once the running operations of the device are done
+
+        :param param: source parameter (volt, curr)
+        :return: None
+        """
+        await self._set('source', param)
+
+    async def param(self, channel=None) -> float:
+        """
+        Get selected source parameter value
+
+        :param channel: channel number. None for the selected channel
+        :return: parameter value
+        """
+        return await self._get('param', channel)
+
+    async def set_param(self, value: float, channel=None):
+        """
+        Set selected source parameter value
+
+        :param value: parameter value
+        :param channel: channel number. None for the selected channel
+        :return: None
+        """
+        await self._set('param', value, channel)
+
+    async def step(self, channel=None) -> float:
+        """
+        Get selected source step value
+
+        :param channel: channel number. None for the selected channel
+        :return: step value
+        """
+        return await self._get('step', channel)
+
+    async def set_step(self, value: float, channel=None):
+        """
+        Set selected source step value
+
+        :param value: step value
+        :param channel: channel number. None for the selected channel
+        :return: None
+        """
+        await self._set('step', value, channel)
+
+    async def volt(self, channel=None):
+        """
+        Get the output voltage of a channel
+
+        :param channel: channel number. None for the selected channel
+        :return: channel voltage
+        """
+        return await self._get('volt', channel)
+
+    async def set_volt(self, value, channel=None):
+        """
+        Set a channel voltage
+
+        :param value: voltage value
+        :param channel: channel number. None for the selected channel
+        :return: None
+        """
+        await self._set('volt', value, channel)
+
+    async def volt_up(self, channel=None):
+        """
+        Increase a channel voltage by step value
+
+        :param channel: channel number. None for the selected channel
+        :return: None
+        """
+        await self._call('volt_up', channel=channel)
+
+    async def volt_down(self, channel=None):
+        """
+        Decrease a channel voltage by step value
+
+        :param channel: channel number. None for the selected channel
+        :return: None
+        """
+        await self._call('volt_down', channel=channel)
+
+    async def current(self, channel=None):
+        """
+        Get the output current of a channel
+
+        :param channel: channel number. None for the selected channel
+        :return: channel current
+        """
+        return await self._get('current', channel)
+
+    async def set_current(self, value, channel=None):
+        """
+        set the current of a channel
+
+        :param value: current value
+        :param channel: channel number. None for the selected channel
+        :return: None
+        """
+        await self._set('current', value, channel)
+
+    async def current_up(self, channel=None):
+        """
+        Increase a channel current by step value
+
+        :param channel: channel number. None for the selected channel
+        :return: None
+        """
+        await self._call('current_up', channel=channel)
+
+    async def current_down(self, channel=None):
+        """
+        Decrease a channel current by step value
+
+        :param channel: channel number. None for the selected channel
+        :return: None
+        """
+        await self._call('current_down', channel=channel)
+
+    async def move_up(self, channel=None):
+        """
+        Increase a channel selected parameter by step value
+
+        :param channel: channel number. None for the selected channel
+        :return: None
+        """
+        await self._call('move_up', channel=channel)
+
+    async def move_down(self, channel=None):
+        """
+        Decrease a channel selected parameter by step value
+
+        :param channel: channel number. None for the selected channel
+        :return: None
+        """
+        await self._call('move_down', channel=channel)
+
+    async def source_properties(self, channel=None) -> dict:
+        """
+        Get a channel source properties
+
+        :param channel: channel number. None for the selected channel
+        :return: a dictionary
+        """
+        return await self._get('source_properties', channel)
+
+    async def set_source_properties(self, settings: dict, channel=None):
+        """
+        set a channel with a dictionary
+
+        :param settings: dictionary of settings
+        :param channel: channel number. None for the selected channel
+        :return: None
+        """
+        await self._set('source_properties', settings, channel)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # APPLY subsystem
+    # ------------------------------------------------------------------------------------------------------------------
+
+    async def apply(self, channel=None):
+        """
+        Get voltage and current of a channel
+
+        :param channel: channel number. None for the selected channel
+        :return: voltage and current values
+        """
+        return await self._get('apply', channel)
+
+    async def set_power(self, sets: dict):
+        """
+        set power according to dictionary
+        {1:value, 2:value}
+
+        :return: None
+        """
+        await self._call('set_power', sets)
@@ -0,0 +1,625 @@
+"""
+Local instrument broker
+
+The broker owns the device sessions and serves them on a Unix socket, so that many processes share one open
+supply. Clients use the regular HMP2030 class with a BrokerResourceManager::
+
+    device = HMP2030('psu1', resource_manager=BrokerResourceManager('/tmp/pyrs.sock'))
+
+The protocol is made of JSON lines. A connection opens a device, then sends write and query requests: writes are
+not answered, queries are answered with the response or an error. A connection can instead subscribe to the
+measurements of a device: the broker then streams records until the connection is closed.
+
+Each connection keeps its own channel selection: the broker selects the connection channel before executing its
+messages. The identity and version queries are answered from a cache. With write-behind enabled on the devices, the
+commands of all the connections are coalesced and written in batches.
+"""
+
+import argparse
+import collections
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+import numpy as np
+import pyvisa
+from pyrs.hmp2030 import HMP2030
+from pyrs.simulator import SimulatedResourceManager
+from pyrs.stream import SAMPLE_DTYPE
+from pyrs.writer import selection
+
+PATH = '/tmp/pyrs.sock'
+LIBRARY = '/usr/lib/librsvisa.so'
+#: queries whose response never changes
+STATIC = ('*IDN?', 'SYST:VERS?')
+
+
+class BrokerError(Exception):
+    """
+    Error reported by the broker
+    """
+
+
+def encode(message) -> bytes:
+    """
+    Encode a protocol message
+
+    :param message: message dictionary
+    :return: JSON line
+    """
+    return json.dumps(message).encode('utf-8') + b'\n'
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Server
+# ----------------------------------------------------------------------------------------------------------------------
+
+class Publisher:
+    """
+    Measurement fan-out of a device
+
+    A single thread measures the union of the subscribed channels, at the highest subscribed rate, and dispatches
+    the records to the subscribers. A slow subscriber loses its oldest records.
+    """
+    def __init__(self, device):
+        """
+        Create a publisher
+
+        :param device: HMP2030 device
+        """
+        self.device = device
+        self.subscribers = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self, channels, rate=None, size=64) -> queue.Queue:
+        """
+        Add a subscriber
+
+        :param channels: a list of channel number (1,2,3)
+        :param rate: measurement rate in Hz. None measures as fast as the link allows
+        :param size: number of record batches kept for the subscriber
+        :return: queue receiving the record arrays
+        """
+        records = queue.Queue(size)
+        with self._lock:
+            self.subscribers.append((set(channels), rate, records))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='pyrs-publisher', daemon=True)
+                self._thread.start()
+        return records
+
+    def unsubscribe(self, records):
+        """
+        Remove a subscriber
+
+        :param records: queue returned by subscribe()
+        :return: None
+        """
+        with self._lock:
+            self.subscribers = [subscriber for subscriber in self.subscribers if subscriber[2] is not records]
+
+    @staticmethod
+    def _put(records, value):
+        """
+        Queue a value, dropping the oldest one when the queue is full
+
+        :param records: subscriber queue
+        :param value: record array or exception
+        :return: None
+        """
+        while True:
+            try:
+                records.put_nowait(value)
+                return
+            except queue.Full:
+                try:
+                    records.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def _run(self):
+        """
+        Measure and dispatch until there is no subscriber left
+
+        A measurement error is forwarded to the subscribers. Any other error stops the thread, after forwarding it,
+        so that the next subscriber starts a new one.
+
+        :return: None
+        """
+        try:
+            self._dispatch()
+        except Exception as error:  # pylint: disable=broad-except
+            with self._lock:
+                subscribers = list(self.subscribers)
+            for _, _, target in subscribers:
+                self._put(target, error)
+        finally:
+            with self._lock:
+                if self._thread is threading.current_thread():
+                    self._thread = None
+
+    def _dispatch(self):
+        """
+        Measure and dispatch the records until there is no subscriber left
+
+        :return: None
+        """
+        while True:
+            with self._lock:
+                subscribers = list(self.subscribers)
+                if not subscribers:
+                    self._thread = None
+                    return
+            start = time.monotonic()
+            channels = sorted(set().union(*(channels for channels, _, _ in subscribers)))
+            try:
+                records = self.device.measure(channels)
+            except Exception as error:  # pylint: disable=broad-except
+                records = error
+            for wanted, _, target in subscribers:
+                self._put(target, records if isinstance(records, Exception) else
+                          records[np.isin(records['channel'], list(wanted))])
+            rates = [rate for _, rate, _ in subscribers]
+            if None not in rates:
+                time.sleep(max(0.0, 1.0 / max(rates) - (time.monotonic() - start)))
+
+
+class Session:
+    """
+    State of a client connection
+    """
+    def __init__(self, broker):
+        """
+        Create a session
+
+        :param broker: Broker object
+        """
+        self.broker = broker
+        self.name = None
+        self.channel = None
+        self.error = None
+
+    def request(self, request):
+        """
+        Execute a client request
+
+        :param request: request dictionary
+        :return: reply dictionary, or None when the request is not answered
+        """
+        operation = request.get('op')
+        operations = {'open': self.open, 'list': self.list_devices, 'write': self.write, 'query': self.query,
+                      'close': self.close}
+        try:
+            if operation not in operations:
+                raise BrokerError(f"unknown operation '{operation}'")
+            if self.name is None and operation in ('write', 'query', 'close'):
+                raise BrokerError("no device opened")
+            return operations[operation](request)
+        except (BrokerError, KeyError, ValueError, pyvisa.errors.VisaIOError) as error:
+            if operation == 'write':
+                self.error = error
+                return None
+            reply = {'error': str(error)}
+            if isinstance(error, pyvisa.errors.VisaIOError):
+                reply['code'] = int(error.error_code)
+            return reply
+
+    def _raise(self):
+        """
+        Raise the error of a previous write, once
+
+        :return: None
+        """
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def open(self, request) -> dict:
+        """
+        Open a device
+
+        :param request: open request (device)
+        :return: reply dictionary
+        """
+        if request['device'] not in self.broker.devices:
+            raise BrokerError(f"unknown device '{request['device']}'")
+        self.name = request['device']
+        return {'data': self.name}
+
+    def list_devices(self, _) -> dict:
+        """
+        List the devices served by the broker
+
+        :return: reply dictionary
+        """
+        return {'data': list(self.broker.devices)}
+
+    def write(self, request):
+        """
+        Execute a command, without reply
+
+        :param request: write request (data)
+        :return: None
+        """
+        _, self.channel = self.broker.execute(self.name, self.channel, request['data'])
+
+    def query(self, request) -> dict:
+        """
+        Execute a query
+
+        :param request: query request (data)
+        :return: reply dictionary
+        """
+        self._raise()
+        response, self.channel = self.broker.execute(self.name, self.channel, request['data'])
+        return {'data': response}
+
+    def close(self, _) -> dict:
+        """
+        Close the session
+
+        :return: reply dictionary
+        """
+        self._raise()
+        return {'data': ''}
+
+
+class BrokerHandler(socketserver.StreamRequestHandler):
+    """
+    Client connection handler
+    """
+    def handle(self):
+        session = Session(self.server)
+        try:
+            for line in self.rfile:
+                request = json.loads(line)
+                if request.get('op') == 'subscribe':
+                    self.stream(request)
+                    return
+                reply = session.request(request)
+                if reply is not None:
+                    self.wfile.write(encode(reply))
+        except OSError:
+            pass
+
+    def stream(self, request):
+        """
+        Stream the measurements of a device until the client disconnects
+
+        :param request: subscribe request (device, channels, rate)
+        :return: None
+        """
+        publisher = self.server.publisher(request['device'])
+        records = publisher.subscribe(request['channels'], request.get('rate'))
+        try:
+            while True:
+                value = records.get()
+                if isinstance(value, Exception):
+                    self.wfile.write(encode({'error': str(value)}))
+                    return
+                self.wfile.write(encode({'records': value.tolist()}))
+        except OSError:
+            pass
+        finally:
+            publisher.unsubscribe(records)
+
+
+class Broker(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Unix socket server sharing HMP2030 sessions between processes
+    """
+    daemon_threads = True
+
+    def __init__(self, path, devices: dict):
+        """
+        Create a broker
+
+        :param path: Unix socket path
+        :param devices: dictionary of HMP2030 devices by name
+        :raise BrokerError: when another broker is serving on the path
+        """
+        if os.path.exists(path):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                try:
+                    probe.connect(path)
+                except OSError:
+                    os.unlink(path)
+                else:
+                    raise BrokerError(f"a broker is already serving on {path}")
+        super().__init__(path, BrokerHandler)
+        self.devices = dict(devices)
+        self._publishers = {}
+        self._static = {}
+        self._lock = threading.Lock()
+
+    def publisher(self, name) -> Publisher:
+        """
+        Get the measurement publisher of a device
+
+        :param name: device name
+        :return: Publisher object
+        """
+        with self._lock:
+            if name not in self._publishers:
+                self._publishers[name] = Publisher(self.devices[name])
+            return self._publishers[name]
+
+    def execute(self, name, channel, message):
+        """
+        Execute a client message on a device, with the client channel selected
+
+        :param name: device name
+        :param channel: channel selected by the client. None when unknown
+        :param message: message string
+        :return: response string (None for commands), and channel selected by the client after the message
+        """
+        device = self.devices[name]
+        key = message.strip().lstrip(':').upper()
+        if key in STATIC:
+            with self._lock:
+                if (name, key) in self._static:
+                    return self._static[(name, key)], channel
+        query = '?' in message
+        with device.transaction(write_only=not query):
+            if channel is not None and not key.startswith('INST:NSEL'):
+                device.channel = channel
+            response = device.query(message) if query else device.send(message)
+        if key in STATIC:
+            with self._lock:
+                self._static[(name, key)] = response
+        return response, selection(message, channel)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        for device in self.devices.values():
+            device.close()
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Client
+# ----------------------------------------------------------------------------------------------------------------------
+
+class BrokerResource:
+    """
+    Device session served by a broker, with the VISA resource interface used by HMP2030
+
+    An I/O error or a timeout drops the connection: a late reply would otherwise be read as the reply of the next
+    request. The next request connects again and opens a new session on the broker.
+    """
+    def __init__(self, path, name):
+        """
+        Open a device session on the broker
+
+        :param path: broker Unix socket path
+        :param name: device name
+        """
+        self.timeout = 2000
+        self.read_termination = '\n'
+        self.write_termination = '\n'
+        self._address = (path, name)
+        self._responses = collections.deque()
+        self._socket = None
+        self._file = None
+        try:
+            self._connect()
+        except OSError as error:
+            raise self._error(error) from error
+
+    def _connect(self):
+        """
+        Connect to the broker and open the device session
+
+        :return: None
+        """
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._file = self._socket.makefile('rb')
+        try:
+            self._socket.settimeout(self.timeout / 1000 if self.timeout else None)
+            path, name = self._address
+            self._socket.connect(path)
+            self._socket.sendall(encode({'op': 'open', 'device': name}))
+            self._reply()
+        except (OSError, BrokerError, pyvisa.errors.VisaIOError):
+            self._disconnect()
+            raise
+
+    def _disconnect(self):
+        """
+        Drop the connection, so that the next request connects again
+
+        :return: None
+        """
+        if self._socket is not None:
+            self._file.close()
+            self._socket.close()
+            self._socket = self._file = None
+
+    def _error(self, error) -> pyvisa.errors.VisaIOError:
+        """
+        Drop the connection after a socket error
+
+        :param error: OSError raised by the socket
+        :return: VisaIOError to raise: timeout, or connection lost
+        """
+        self._disconnect()
+        if isinstance(error, socket.timeout):
+            return pyvisa.errors.VisaIOError(pyvisa.constants.StatusCode.error_timeout)
+        return pyvisa.errors.VisaIOError(pyvisa.constants.StatusCode.error_connection_lost)
+
+    def _send(self, request, reply=False):
+        """
+        Send a request, connecting first when the connection has been dropped
+
+        :param request: request dictionary
+        :param reply: read the reply of the request
+        :return: reply data, None without reply
+        :raise VisaIOError: on timeout or connection error
+        """
+        try:
+            if self._socket is None:
+                self._connect()
+            self._socket.settimeout(self.timeout / 1000 if self.timeout else None)
+            self._socket.sendall(encode(request))
+            return self._reply() if reply else None
+        except OSError as error:
+            raise self._error(error) from error
+
+    def _reply(self):
+        """
+        Read the reply of a request
+
+        :return: reply data
+        """
+        line = self._file.readline()
+        if not line:
+            raise ConnectionResetError("connection closed by the broker")
+        reply = json.loads(line)
+        if 'code' in reply:
+            raise pyvisa.errors.VisaIOError(reply['code'])
+        if 'error' in reply:
+            raise BrokerError(reply['error'])
+        return reply['data']
+
+    def write(self, message):
+        """
+        Write a message. Queries are executed at once, and their response kept for read()
+
+        :param message: message string
+        :return: None
+        """
+        if '?' in message:
+            self._responses.append(self._send({'op': 'query', 'data': message}, reply=True))
+        else:
+            self._send({'op': 'write', 'data': message})
+
+    def read(self):
+        """
+        Read the response of the oldest query
+
+        :return: response string
+        """
+        if not self._responses:
+            raise BrokerError("no query response pending")
+        return self._responses.popleft()
+
+    def query(self, message):
+        """
+        Send a query and read its response
+
+        :param message: query string
+        :return: response string
+        """
+        self.write(message)
+        return self.read()
+
+    def close(self):
+        """
+        Close the session, reporting the error of a previous write if any
+
+        :return: None
+        """
+        if self._socket is None:
+            return
+        try:
+            self._send({'op': 'close'}, reply=True)
+        finally:
+            self._disconnect()
+
+
+class BrokerResourceManager:
+    """
+    Resource manager opening the device sessions served by a broker
+    """
+    def __init__(self, path=PATH):
+        """
+        Create a resource manager
+
+        :param path: broker Unix socket path
+        """
+        self.path = path
+
+    def open_resource(self, name, **_):
+        """
+        Open a device session
+
+        :param name: device name
+        :return: BrokerResource object
+        """
+        return BrokerResource(self.path, name)
+
+    def list_resources(self):
+        """
+        List the devices served by the broker
+
+        :return: a tuple of device names
+        """
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            connection.connect(self.path)
+            connection.sendall(encode({'op': 'list'}))
+            return tuple(json.loads(connection.makefile('rb').readline())['data'])
+
+    def subscribe(self, name, channels, rate=None):
+        """
+        Receive the measurements of a device, shared with the other subscribers
+
+        :param name: device name
+        :param channels: a list of channel number (1,2,3)
+        :param rate: measurement rate in Hz. None measures as fast as the link allows
+        :return: iterator of arrays of records (time, channel, volt, current)
+        """
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            connection.connect(self.path)
+            connection.sendall(encode({'op': 'subscribe', 'device': name, 'channels': list(channels), 'rate': rate}))
+            for line in connection.makefile('rb'):
+                message = json.loads(line)
+                if 'error' in message:
+                    raise BrokerError(message['error'])
+                yield np.array([tuple(record) for record in message['records']], dtype=SAMPLE_DTYPE)
+
+    def close(self):
+        """
+        Close the resource manager
+
+        :return: None
+        """
+
+
+def main():
+    """
+    Main entry
+
+    :return:
+    """
+    parser = argparse.ArgumentParser(description='HMP2030 Power supply broker')
+    parser.add_argument('-n', '--name', action='append', required=True, help='device visa name or address')
+    parser.add_argument('-p', '--path', default=PATH, help=f'broker socket path. default = {PATH}')
+    parser.add_argument('-l', '--library', default=LIBRARY, help=f'visa shared library. default = {LIBRARY}')
+    parser.add_argument('-s', '--simulate', action='store_true', help='use simulated instruments')
+    parser.add_argument('-w', '--write-behind', action='store_true',
+                        help='queue the client commands and write them in batches')
+    args = parser.parse_args()
+
+    rm = SimulatedResourceManager() if args.simulate else None
+    devices = {name: HMP2030(name, args.library, cache=True, resource_manager=rm) for name in args.name}
+    if args.write_behind:
+        for device in devices.values():
+            device.enable_write_behind()
+    try:
+        broker = Broker(args.path, devices)
+    except BrokerError as error:
+        raise SystemExit(f"pyrs_broker: {error}") from error
+    with broker:
+        try:
+            broker.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
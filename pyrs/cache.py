@@ -0,0 +1,216 @@
+"""
+Client side shadow state of the device
+"""
+
+from pyrs.snapshot import CHANNELS, SETPOINTS, ChannelState, DeviceState
+
+
+class ShadowState:
+    """
+    Write-through cache of the device state
+
+    The cache follows the commands sent to the device: the selected channel, the per-channel voltage/current
+    setpoints and steps, and the output states (OUTP, OUTP:SEL, and OUTP:GEN stored under channel 0). Values are
+    stored as response strings, as the device would return them. Setpoints outside the device ranges are rejected by
+    the device, and discarded from the cache. Any command whose effect is unknown invalidates the whole cache.
+    """
+    #: response format of the cached setpoints
+    FORMATS = {
+        'VOLT': '{:.3f}',
+        'VOLT:STEP': '{:.3f}',
+        'CURR': '{:.4f}',
+        'CURR:STEP': '{:.4f}',
+    }
+    #: setpoint ranges accepted by the device
+    RANGES = {
+        'VOLT': (0.0, 32.05),
+        'VOLT:STEP': (0.0, 32.05),
+        'CURR': (0.0, 5.0),
+        'CURR:STEP': (0.0, 5.0),
+    }
+    #: commands without effect on the cached state
+    NEUTRAL = ('SYST:BEEP', 'SYST:ERR', 'SYST:VERS', 'SYST:REM', 'SYST:LOC', 'SYST:RWL', 'SYST:MIX', '*SAV', '*CLS',
+               '*ESE', '*SRE', '*OPC', '*WAI', 'ARB:CLE', 'ARB:DATA', 'ARB:REP', 'ARB:TRAN')
+
+    def __init__(self):
+        """
+        Create an empty shadow state
+        """
+        self.channel = None
+        self._values = {}
+
+    def invalidate(self):
+        """
+        Forget the whole device state
+
+        :return: None
+        """
+        self.channel = None
+        self._values.clear()
+
+    def get(self, key, channel=None):
+        """
+        Get a cached value
+
+        :param key: parameter key (VOLT, VOLT:STEP, CURR, CURR:STEP, OUTP)
+        :param channel: channel number. None for the selected channel
+        :return: response string, or None when unknown
+        """
+        channel = self.channel if channel is None else channel
+        return self._values.get((channel, key))
+
+    def store(self, key, response, channel=None):
+        """
+        Store a value read from the device
+
+        :param key: parameter key
+        :param response: response string
+        :param channel: channel number. None for the selected channel
+        :return: None
+        """
+        channel = self.channel if channel is None else channel
+        if channel is not None:
+            self._values[(channel, key)] = response
+
+    def discard(self, key, channel=None):
+        """
+        Forget a value
+
+        :param key: parameter key
+        :param channel: channel number. None for the selected channel
+        :return: None
+        """
+        channel = self.channel if channel is None else channel
+        self._values.pop((channel, key), None)
+
+    def load(self, state):
+        """
+        Store a whole device state read from the device
+
+        :param state: DeviceState
+        :return: None
+        """
+        for i, channel in zip(CHANNELS, state.channels):
+            for field, (header, fmt) in SETPOINTS.items():
+                self.store(header, fmt.format(getattr(channel, field)), i)
+            self.store('OUTP:SEL', str(int(channel.output)), i)
+            self.store('OUTP', str(int(channel.output and state.general)), i)
+        self.store('OUTP:GEN', str(int(state.general)), 0)
+
+    def device_state(self, default=None):
+        """
+        Build a device state from the cached values
+
+        :param default: DeviceState providing the values missing from the cache. None requires every value
+        :return: DeviceState, or None when not fully known
+        """
+        def value(key, channel, fallback, convert):
+            response = self.get(key, channel)
+            return fallback if response is None else convert(response)
+        values = []
+        for i in CHANNELS:
+            known = None if default is None else default.channel(i)
+            values.append([value(header, i, None if known is None else getattr(known, field), float)
+                           for field, (header, _) in SETPOINTS.items()] +
+                          [value('OUTP:SEL', i, None if known is None else known.output, '1'.__eq__)])
+        general = value('OUTP:GEN', 0, None if default is None else default.general, '1'.__eq__)
+        if general is None or any(item is None for channel in values for item in channel):
+            return None
+        return DeviceState(tuple(ChannelState(*channel) for channel in values), general)
+
+    def update(self, command):
+        """
+        Update the state from a (compound) command sent to the device
+
+        :param command: command string
+        :return: None
+        """
+        for part in command.split(';'):
+            self._apply(part.strip().lstrip(':').upper())
+
+    def _apply(self, command):
+        """
+        Update the state from a single command
+
+        :param command: upper case command string
+        :return: None
+        """
+        if not command or command.endswith('?'):
+            return
+        header, _, value = command.partition(' ')
+        if header.startswith('SOUR:'):
+            header = header[5:]
+        if header in ('INST:NSEL', 'INST:SEL', 'INST'):
+            self.channel = int(value) if header == 'INST:NSEL' and value.strip().isdigit() else None
+        elif header in self.FORMATS:
+            try:
+                number = float(value)
+            except ValueError:
+                number = None
+            low, high = self.RANGES[header]
+            if number is not None and low <= number <= high:
+                self.store(header, self.FORMATS[header].format(number))
+            else:
+                self.discard(header)
+        elif header.startswith('OUTP'):
+            self._output(header, value)
+        elif header.startswith('APPL'):
+            self.discard('VOLT')
+            self.discard('CURR')
+        elif not header.startswith(self.NEUTRAL):
+            self.invalidate()
+
+    def reject(self, commands):
+        """
+        Forget the settings of commands the device reported an error for
+
+        The settings of a channel selected before the first command are forgotten on every channel.
+
+        :param commands: a list of (compound) command strings
+        :return: None
+        """
+        channel = None
+        for command in commands:
+            for part in command.split(';'):
+                header, _, value = part.strip().lstrip(':').upper().partition(' ')
+                if header.startswith('SOUR:'):
+                    header = header[5:]
+                if header == 'INST:NSEL':
+                    channel = int(value) if value.strip().isdigit() else None
+                elif header in self.FORMATS or (header.startswith('OUTP') and not header.endswith('?')):
+                    keys = [header] if header in self.FORMATS else ['OUTP', 'OUTP:SEL']
+                    for key in keys:
+                        for i in CHANNELS if channel is None else (channel,):
+                            self.discard(key, i)
+                    if header.startswith('OUTP'):
+                        self.discard('OUTP:GEN', 0)
+
+    def _output(self, header, value):
+        """
+        Update the output state from an OUTPut command
+
+        :param header: upper case command header
+        :param value: upper case command value
+        :return: None
+        """
+        state = {'ON': '1', '1': '1', 'OFF': '0', '0': '0'}.get(value)
+        if header in ('OUTP', 'OUTP:STAT') and state is not None:
+            for key in [key for key in self._values if key[1] == 'OUTP']:
+                del self._values[key]
+            self.store('OUTP', state)
+            self.store('OUTP:SEL', state)
+            if state == '1':
+                self.store('OUTP:GEN', state, 0)
+            else:
+                self.discard('OUTP:GEN', 0)
+        elif header == 'OUTP:GEN' and state is not None:
+            for key in [key for key in self._values if key[1] == 'OUTP']:
+                del self._values[key]
+            self.store('OUTP:GEN', state, 0)
+        elif header == 'OUTP:SEL' and state is not None:
+            self.discard('OUTP')
+            self.store('OUTP:SEL', state)
+        else:
+            self.discard('OUTP')
+            self.discard('OUTP:SEL')
+            self.discard('OUTP:GEN', 0)
@@ -0,0 +1,253 @@
+"""
+HMP2030 channel handles
+"""
+
+
+class Channel:
+    """
+    Handle on a HMP2030 channel
+
+    The handle carries its channel number: each operation selects the channel and runs in a device transaction, so
+    that threads sharing a device never measure or set the wrong channel::
+
+        monitor, control = device.ch(1), device.ch(2)
+        print(monitor.measure_voltage)
+        control.volt = 3.3
+    """
+    def __init__(self, device, number):
+        """
+        Create a channel handle
+
+        :param device: HMP2030 device
+        :param number: channel number (1,2,3)
+        """
+        self.device = device
+        self.number = number
+
+    def __repr__(self):
+        return f"Channel({self.device.name!r}, {self.number})"
+
+    def _get(self, name):
+        """
+        Get a device property on the channel
+
+        :param name: property name
+        :return: property value
+        """
+        with self.device.transaction():
+            self.device.channel = self.number
+            return getattr(self.device, name)
+
+    def _set(self, name, value):
+        """
+        Set a device property on the channel
+
+        :param name: property name
+        :param value: property value
+        :return: None
+        """
+        with self.device.transaction(write_only=True):
+            self.device.channel = self.number
+            setattr(self.device, name, value)
+
+    def _call(self, name):
+        """
+        Call a device command method on the channel
+
+        :param name: method name
+        :return: None
+        """
+        with self.device.transaction(write_only=True):
+            self.device.channel = self.number
+            getattr(self.device, name)()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # MEASURE subsystem
+    # ------------------------------------------------------------------------------------------------------------------
+
+    @property
+    def measure_current(self):
+        """
+        Queries the current value of the channel
+
+        :return: current in Ampere
+        """
+        return self.device.query_channel(self.number, 'MEAS:CURR?')
+
+    @property
+    def measure_voltage(self):
+        """
+        Queries the voltage value of the channel
+
+        :return: voltage in volt
+        """
+        return self.device.query_channel(self.number, 'MEAS:VOLT?')
+
+    def measure(self, samples=1, mean=False):
+        """
+        Measure voltage and current of the channel
+
+        :param samples: number of samples
+        :param mean: average the samples
+        :return: array of records (time, channel, volt, current)
+        """
+        return self.device.measure([self.number], samples, mean)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # OUTPUT subsystem
+    # ------------------------------------------------------------------------------------------------------------------
+
+    @property
+    def output(self):
+        """
+        Query the output state of the channel
+
+        :return: output state
+        """
+        return self._get('output')
+
+    @output.setter
+    def output(self, state):
+        """
+        Activate the channel and turns on the output
+
+        :param state: ON | OFF
+        :return: None
+        """
+        self._set('output', state)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # SOURCE subsystem
+    # ------------------------------------------------------------------------------------------------------------------
+
+    @property
+    def volt(self):
+        """
+        Get the output voltage of the channel
+
+        :return: channel voltage
+        """
+        return self._get('volt')
+
+    @volt.setter
+    def volt(self, value):
+        """
+        Set the channel voltage
+
+        :param value: voltage value
+        :return: None
+        """
+        self._set('volt', value)
+
+    def volt_up(self):
+        """
+        Increase the channel voltage by step value
+
+        :return: None
+        """
+        self._call('volt_up')
+
+    def volt_down(self):
+        """
+        Decrease the channel voltage by step value
+
+        :return: None
+        """
+        self._call('volt_down')
+
+    @property
+    def current(self):
+        """
+        Get the output current of the channel
+
+        :return: channel current
+        """
+        return self._get('current')
+
+    @current.setter
+    def current(self, value):
+        """
+        Set the channel current
+
+        :param value: current value
+        :return: None
+        """
+        self._set('current', value)
+
+    def current_up(self):
+        """
+        Increase the channel current by step value
+
+        :return: None
+        """
+        self._call('current_up')
+
+    def current_down(self):
+        """
+        Decrease the channel current by step value
+
+        :return: None
+        """
+        self._call('current_down')
+
+    @property
+    def source_properties(self) -> dict:
+        """
+        Get the channel source properties
+
+        :return: a dictionary
+        """
+        return self._get('source_properties')
+
+    @source_properties.setter
+    def source_properties(self, settings: dict):
+        """
+        Set the channel with a dictionary
+
+        :param settings: dictionary of settings
+        :return: None
+        """
+        self._set('source_properties', settings)
+
+    @property
+    def apply(self):
+        """
+        Get voltage and current of the channel
+
+        :return: voltage and current values
+        """
+        return self._get('apply')
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # STATUS subsystem
+    # ------------------------------------------------------------------------------------------------------------------
+
+    @property
+    def current_limited(self) -> bool:
+        """
+        Check whether the channel is in constant current mode
+
+        :return: True when the current limit is reached
+        """
+        return self.device.status.current_limited(self.number)
+
+    @property
+    def overvoltage_tripped(self) -> bool:
+        """
+        Check whether the channel over voltage protection has tripped
+
+        :return: True when tripped
+        """
+        return self.device.status.overvoltage_tripped(self.number)
+
+    def wait_settled(self, tolerance=0.01, timeout=5.0, target=None, interval=0.01) -> float:
+        """
+        Wait until the channel output voltage has reached its setpoint
+
+        :param tolerance: maximum voltage error in volt
+        :param timeout: maximum wait time in seconds
+        :param target: expected voltage. None uses the channel setpoint
+        :param interval: time (in seconds) between polls
+        :return: measured voltage
+        """
+        return self.device.status.wait_settled(self.number, tolerance, timeout, target, interval)
@@ -0,0 +1,97 @@
+"""
+Instrument error reporting
+
+The SCPI error queue entries (code, message) are raised as typed exceptions, by error class:
+
+- CommandError: syntax and command errors (-100 to -199)
+- ExecutionError: valid commands that could not be executed (-200 to -299)
+- DeviceError: device-specific errors (-300 to -399, and positive codes)
+- QueryError: query protocol errors (-400 to -499)
+"""
+
+from typing import Tuple
+
+#: error queue query
+CHECK = 'SYST:ERR?'
+
+
+class InstrumentError(Exception):
+    """
+    Error reported by the instrument error queue
+    """
+    def __init__(self, code, message, commands=(), errors=()):
+        """
+        Create an instrument error
+
+        :param code: SCPI error code
+        :param message: error message
+        :param commands: messages sent since the previous check, which caused the error
+        :param errors: all the (code, message) entries drained from the error queue
+        """
+        self.code = code
+        self.message = message
+        self.commands = tuple(commands)
+        self.errors = tuple(errors) or ((code, message),)
+        text = f"{code},\"{message}\""
+        if self.commands:
+            text += f" after '{'; '.join(self.commands)}'"
+        if len(self.errors) > 1:
+            text += f" ({len(self.errors) - 1} more errors)"
+        super().__init__(text)
+
+    @property
+    def command(self) -> str:
+        """
+        Get the last message sent before the error was detected
+
+        :return: message string, or None when unknown
+        """
+        return self.commands[-1] if self.commands else None
+
+
+class CommandError(InstrumentError):
+    """
+    Command error: syntax error, undefined header, wrong data type (-100 to -199)
+    """
+
+
+class ExecutionError(InstrumentError):
+    """
+    Execution error: data out of range, settings conflict (-200 to -299)
+    """
+
+
+class DeviceError(InstrumentError):
+    """
+    Device-specific error (-300 to -399, and positive codes)
+    """
+
+
+class QueryError(InstrumentError):
+    """
+    Query error: interrupted or unterminated query (-400 to -499)
+    """
+
+
+def parse(response) -> Tuple[int, str]:
+    """
+    Parse an error queue entry
+
+    :param response: SYST:ERR? response string, such as -222,"Data out of range"
+    :return: error code (0 for no error) and message
+    """
+    code, _, message = response.strip().partition(',')
+    return int(code), message.strip().strip('"')
+
+
+def error_class(code) -> type:
+    """
+    Get the exception class of an error code
+
+    :param code: SCPI error code
+    :return: InstrumentError subclass
+    """
+    classes = {1: CommandError, 2: ExecutionError, 3: DeviceError, 4: QueryError}
+    if code > 0:
+        return DeviceError
+    return classes.get(-code // 100, InstrumentError)
@@ -0,0 +1,205 @@
+"""
+Parallel control of several HMP2030 power supplies
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pyrs import resources
+from pyrs.hmp2030 import HMP2030
+
+
+class FarmResult:
+    """
+    Per-device results and errors of a farm operation
+    """
+    def __init__(self):
+        """
+        Create an empty result
+        """
+        self.results = {}
+        self.errors = {}
+
+    def __getitem__(self, name):
+        return self.results[name]
+
+    def __repr__(self):
+        return f"FarmResult(results={self.results}, errors={self.errors})"
+
+    @property
+    def ok(self) -> bool:
+        """
+        Check that every device succeeded
+
+        :return: True when no error occurred
+        """
+        return not self.errors
+
+    def raise_errors(self):
+        """
+        Raise the first device error, if any
+
+        :return: None
+        """
+        for name, error in self.errors.items():
+            raise RuntimeError(f"{name}: {error}") from error
+
+
+class PowerSupplyFarm:
+    """
+    A set of HMP2030 power supplies driven concurrently
+
+    Every operation is run on all devices (or a subset) on a bounded worker pool, and returns a FarmResult holding
+    the per-device results and errors. The devices share one VISA resource manager.
+    """
+    def __init__(self, names: list, library="/usr/lib/librsvisa.so", workers=None, **options):
+        """
+        Open the power supplies
+
+        :param names: a list of VISA resource names
+        :param library: Path on VISA backend library
+        :param workers: maximum number of concurrent operations. None uses one worker per device (up to 32)
+        :param options: HMP2030 options (timeout, delay, cache, resource_manager)
+        """
+        self.resource_manager = options.pop('resource_manager', None) or resources.resource_manager(library)
+        self.devices = {}
+        try:
+            for name in names:
+                self.devices[name] = HMP2030(name, library, resource_manager=self.resource_manager, **options)
+        except Exception:
+            for device in self.devices.values():
+                device.close()
+            raise
+        self._pool = ThreadPoolExecutor(max_workers=workers or min(len(names), 32) or 1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Stop the worker pool and close the devices
+
+        :return: None
+        """
+        self._pool.shutdown()
+        for device in self.devices.values():
+            device.close()
+
+    def _names(self, names) -> list:
+        """
+        Check a list of device names
+
+        :param names: a list of device names. None for all devices
+        :return: a list of device names
+        :raise ValueError: when a name is not a device of the farm
+        """
+        if names is None:
+            return list(self.devices)
+        unknown = [name for name in names if name not in self.devices]
+        if unknown:
+            raise ValueError(f"unknown device '{unknown[0]}'")
+        return list(names)
+
+    def map(self, function, names=None, pool=None) -> FarmResult:
+        """
+        Call a function on several devices concurrently
+
+        :param function: callable taking the device name and the HMP2030 object
+        :param names: a list of device names. None for all devices
+        :param pool: executor to use. None for the farm worker pool
+        :return: per-device results and errors
+        :raise ValueError: when a name is not a device of the farm
+        """
+        names = self._names(names)
+        futures = {name: (pool or self._pool).submit(function, name, self.devices[name]) for name in names}
+        result = FarmResult()
+        for name, future in futures.items():
+            try:
+                result.results[name] = future.result()
+            except Exception as error:  # pylint: disable=broad-exception-caught
+                result.errors[name] = error
+        return result
+
+    def set_power(self, sets=None, names=None, per_device=None) -> FarmResult:
+        """
+        Set channel voltages on several devices
+
+        :param sets: channel voltages {1:value, 2:value} applied to every device
+        :param names: a list of device names. None for all devices, or the devices of per_device
+        :param per_device: a dictionary of channel voltages per device name, instead of sets
+        :return: per-device results and errors
+        """
+        if (sets is None) == (per_device is None):
+            raise ValueError("set_power takes either sets or per_device")
+        if per_device is None:
+            return self.map(lambda name, device: device.set_power(sets), names)
+        names = list(per_device) if names is None else names
+        return self.map(lambda name, device: device.set_power(per_device[name]), names)
+
+    def output_selected(self, channels: list, state, names=None, synchronized=False, timeout=10.0) -> FarmResult:
+        """
+        Switch the selected channels outputs on several devices
+
+        With synchronized set, the channels of every device are selected first, then all devices switch the general
+        output at the same instant. The results are then the switch times (time.monotonic), and their spread is
+        the achieved switching window.
+
+        :param channels: a list of channel number (1,2,3)
+        :param state: 0 or 1
+        :param names: a list of device names. None for all devices
+        :param synchronized: switch all devices within a tight time window
+        :param timeout: maximum time (in seconds) waiting for the other devices when synchronized
+        :return: per-device results and errors
+        """
+        names = self._names(names)
+        if not synchronized or not channels or not names:
+            return self.map(lambda name, device: device.output_selected(channels, state), names)
+        barrier = threading.Barrier(len(names), timeout=timeout)
+
+        def switch(_, device):
+            try:
+                with device.batch() as batch:
+                    for i in channels:
+                        batch.write(f'INST:NSEL {i}')
+                        batch.write(f'OUTP:SEL {state}')
+            except Exception:
+                barrier.abort()
+                raise
+            barrier.wait()
+            device.send(f'OUTP:GEN {state}')
+            return time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=len(names)) as pool:
+            return self.map(switch, names, pool)
+
+    def measure(self, channels: list, names=None, samples=1) -> FarmResult:
+        """
+        Measure voltage and current on several devices
+
+        :param channels: a list of channel number (1,2,3)
+        :param names: a list of device names. None for all devices
+        :param samples: number of samples per channel
+        :return: per-device arrays of records (time, channel, volt, current)
+        """
+        return self.map(lambda name, device: device.measure(channels, samples), names)
+
+    def snapshot(self, names=None) -> FarmResult:
+        """
+        Read the settings of all channels on several devices
+
+        :param names: a list of device names. None for all devices
+        :return: per-device DeviceState
+        """
+        return self.map(lambda name, device: device.snapshot(), names)
+
+    def source_properties(self, names=None) -> FarmResult:
+        """
+        Read the selected channel source properties on several devices
+
+        :param names: a list of device names. None for all devices
+        :return: per-device dictionaries
+        """
+        return self.map(lambda name, device: device.source_properties, names)
@@ -2,43 +2,471 @@
 HMP2030 Power supply interface
 """
 
-import time
-import pyvisa
+import collections
+import threading
+from pyrs import errors, resources
+from pyrs.arb import Generator
+from pyrs.cache import ShadowState
+from pyrs.channel import Channel
+from pyrs.metrics import Instrumentation
+from pyrs.pipeline import Batch
+from pyrs.recovery import Recovery
+from pyrs.regulation import Regulator
+from pyrs.snapshot import CHANNELS, SETPOINTS, ChannelState, DeviceState
+from pyrs.status import ESR_URQ, Status
+from pyrs.stream import MeasurementStream, acquire, average
+from pyrs.writer import WriteBehind, selection
 
 
 class HMP2030:
     """
     HMP2028 Power supply class
     """
-    def __init__(self, name, library="/usr/lib/librsvisa.so"):
+    #: minimum time (in seconds) the instrument needs to process a command before the next I/O
+    DELAYS = {
+        '*RST': 0.5,
+        '*RCL': 0.1,
+        '*SAV': 0.1,
+    }
+    #: instrument input buffer size, in characters
+    BUFFER_SIZE = 256
+    #: maximum number of entries drained from the error queue
+    ERROR_QUEUE = 32
+
+    def __init__(self, name, library="/usr/lib/librsvisa.so", *, timeout=2000, delay=None, cache=False,
+                 resource_manager=None, checked=False):
         """
         Create HMP2030 object
 
         :param name: VISA resource name
         :param library: Path on VISA backend library
-        """
+        :param timeout: VISA I/O timeout in milliseconds
+        :param delay: fixed delay (in seconds) before each read. None reads as soon as the response is available
+        :param cache: keep a shadow copy of the channel selection, setpoints and outputs to skip redundant I/O
+        :param resource_manager: VISA resource manager. None uses the process-wide manager of the library
+        :param checked: check the instrument error queue with each query and batch, and raise InstrumentError
+        """
+        self._session = resources.Session(resource_manager or resources.resource_manager(library), name, timeout,
+                                          delay)
         self._source = 'VOLT'
-        rm = pyvisa.ResourceManager(visa_library=library)
-        self.instr = rm.open_resource(name)
+        self._state = ShadowState() if cache else None
+        self.writer = None
+        self.recovery = None
+        self._lock = threading.RLock()
+        self._unchecked = collections.deque(maxlen=16) if checked else None
+        self.open()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        """
+        Open the VISA session
+
+        :return: None
+        """
+        self._session.open()
+
+    def close(self):
+        """
+        Write the queued commands and close the VISA session
+
+        :return: None
+        """
+        self.disable_write_behind()
+        self._session.close()
+
+    def reconnect(self):
+        """
+        Reopen a dropped VISA session, keeping the resource manager
+
+        The shadow state is invalidated, since the device may have changed while disconnected.
+
+        :return: None
+        """
+        self.invalidate()
+        self._session.reconnect()
+
+    @property
+    def name(self) -> str:
+        """
+        Get the VISA resource name
+
+        :return: resource name
+        """
+        return self._session.name
+
+    @property
+    def instr(self):
+        """
+        Get the VISA resource of the session
+
+        :return: pyvisa resource
+        """
+        return self._session.instr
+
+    @property
+    def metrics(self) -> Instrumentation:
+        """
+        Get the traffic instrumentation
+
+        :return: Instrumentation, or None when disabled
+        """
+        return self._session.metrics
+
+    @property
+    def timeout(self) -> int:
+        """
+        Get the VISA I/O timeout
+
+        :return: timeout in milliseconds
+        """
+        return self._session.timeout
+
+    @timeout.setter
+    def timeout(self, milliseconds):
+        """
+        Set the VISA I/O timeout, kept across reconnections
+
+        :param milliseconds: timeout in milliseconds
+        :return: None
+        """
+        self._session.timeout = milliseconds
 
     def send(self, command):
         """
         Send the command
 
+        With write-behind enabled, commands are queued and the call returns immediately. Queries wait until the
+        queued commands are written, then are sent directly.
+
         :param command: command string
         :return: None
         """
-        self.instr.write(command)
+        if self._unchecked is not None:
+            self._unchecked.append(command)
+        if self.writer is not None and not (self.recovery and self.recovery.active()) and self.writer.put(command):
+            return
+        with self._lock:
+            if self._state is not None:
+                self._state.update(command)
+            self._write(command)
 
-    def read(self, timeout=0.3):
+    def _write(self, command):
+        """
+        Write a message to the device, recovering from I/O errors when enabled
+
+        :param command: message string
+        :return: None
+        """
+        self._retry(command, lambda: self._transmit(command))
+
+    def _transmit(self, command):
+        """
+        Write a message on the bus
+
+        :param command: message string
+        :return: None
+        """
+        delay = max(self.DELAYS.get(part.split(' ')[0].lstrip(':').upper(), 0) for part in command.split(';'))
+        self._session.write(command, delay)
+        if self.recovery is not None:
+            self.recovery.channel = selection(command, self.recovery.channel)
+
+    def read(self, timeout=None):
         """
         read command response
 
-        :param timeout: timeout value before read
-        :return:
+        The read returns as soon as the terminated response is received, or raises a VisaIOError after the VISA
+        timeout. A fixed delay before the read can still be requested, either per call or for the whole instance.
+
+        :param timeout: fixed delay (in seconds) before read. None uses the instance delay
+        :return: response string
+        """
+        return self._session.read(timeout)
+
+    def enable_metrics(self, trace=0, callback=None) -> Instrumentation:
+        """
+        Start collecting per-command traffic counters and latency histograms
+
+        :param trace: number of recent messages kept in the trace ring. 0 disables the trace
+        :param callback: callable receiving each trace event dictionary
+        :return: the Instrumentation object, also available as the metrics attribute
+        """
+        self._session.metrics = Instrumentation(self.name, trace, callback)
+        return self.metrics
+
+    def disable_metrics(self):
+        """
+        Stop collecting traffic statistics
+
+        :return: None
+        """
+        self._session.metrics = None
+
+    def enable_write_behind(self, linger=0.0) -> WriteBehind:
+        """
+        Queue the commands and write them from a background thread, so that setters never wait for the bus
+
+        Pending setpoints of the same channel and parameter are coalesced: only the last value is sent.
+
+        :param linger: time (in seconds) the writer waits for more commands before writing
+        :return: the WriteBehind queue, also available as the writer attribute
+        """
+        if self.writer is None:
+            self.writer = WriteBehind(self._write, self.BUFFER_SIZE, lock=self._lock, linger=linger,
+                                      update=None if self._state is None else self._state.update)
+        return self.writer
+
+    def disable_write_behind(self):
+        """
+        Write the queued commands and stop the background writer
+
+        :return: None
+        """
+        if self.writer is not None:
+            writer, self.writer = self.writer, None
+            writer.close()
+
+    def flush(self, timeout=None):
+        """
+        Wait until the queued commands are written. Does nothing without write-behind
+
+        :param timeout: maximum time (in seconds) to wait. None waits forever
+        :return: None
+        """
+        if self.writer is not None:
+            self.writer.flush(timeout)
+
+    def enable_recovery(self, retries=3, backoff=0.01, replay=True) -> Recovery:
+        """
+        Recover from VISA I/O errors: reopen the session in place, replay the channel selection and setpoints, and
+        send the failed message again when it is idempotent
+
+        The setpoints are replayed from the shadow state: with the cache enabled, a snapshot fills it first. The
+        outputs are kept as read from the device, unless replay is recovery.REPLAY_OUTPUTS.
+
+        :param retries: maximum number of reconnections, and of repetitions of a failed message
+        :param backoff: time (in seconds) before the second reconnection attempt, doubled at each attempt
+        :param replay: restore the setpoints after a reconnection (True), and the output states too (REPLAY_OUTPUTS)
+        :return: the Recovery policy, also available as the recovery attribute
+        """
+        if self.recovery is None:
+            self.recovery = Recovery(retries, backoff, replay)
+            if replay and self._state is not None:
+                self.snapshot()
+        return self.recovery
+
+    def disable_recovery(self):
+        """
+        Raise the VISA I/O errors to the caller
+
+        :return: None
+        """
+        self.recovery = None
+
+    def recover(self) -> float:
+        """
+        Reopen the VISA session and replay the last known channel selection and settings
+
+        The device state is read in one snapshot round trip, and only the settings that differ from the shadow state
+        are sent: the settings unknown to the shadow state are kept as read. The channel selected on the bus before
+        the failure is selected again, and the next channel operations select their channel explicitly. The
+        reconnection is attempted up to the recovery retries, with an exponential backoff.
+
+        :return: recovery duration in seconds
+        """
+        recovery = self.recovery or Recovery(retries=0)
+        with self._lock:
+            unchecked, self._unchecked = self._unchecked, None
+            try:
+                return recovery.recover(self, self._state, unchecked is not None)
+            finally:
+                self._unchecked = unchecked
+                if self._state is not None:
+                    self._state.channel = None
+
+    def _retry(self, message, operation):
+        """
+        Run an I/O operation, recovering from VISA I/O errors when enabled. The device lock must be held
+
+        :param message: message sent by the operation
+        :param operation: callable without arguments
+        :return: the operation result
+        """
+        return operation() if self.recovery is None else self.recovery.run(self, message, operation)
+
+    def query(self, command, timeout=None):
+        """
+        Send a query and read its response
+
+        :param command: query string
+        :param timeout: fixed delay (in seconds) before read. None uses the instance delay
+        :return: response string
+        """
+        with self._lock:
+            if self._unchecked is None:
+                return self.exchange(command, timeout)
+            response, _, error = self.exchange(f'{command};:{errors.CHECK}', timeout).rpartition(';')
+            self.check(error)
+            return response
+
+    def exchange(self, message, timeout=None):
+        """
+        Send a message and read its response, sending it again after a recovery when it is idempotent
+
+        Unlike query(), the error queue is not checked.
+
+        :param message: message string, holding at least one query
+        :param timeout: fixed delay (in seconds) before read. None uses the instance delay
+        :return: response string
+        """
+        def send_read():
+            self.send(message)
+            return self.read(timeout)
+        with self._lock:
+            return self._retry(message, send_read)
+
+    @property
+    def checked(self) -> bool:
+        """
+        Get the checked mode state
+
+        :return: True when the error queue is checked with each query and batch
         """
-        time.sleep(timeout)
-        return self.instr.read().split('\n')[0]
+        return self._unchecked is not None
+
+    @checked.setter
+    def checked(self, state):
+        """
+        Enable or disable the checked mode
+
+        In checked mode, an error queue query is appended to each query, and to the last message of each batch: the
+        errors caused by the messages sent since the previous check are raised as InstrumentError. Commands sent
+        alone are checked with the next query or batch, or by check().
+
+        :param state: True to check the error queue
+        :return: None
+        """
+        if state and self._unchecked is None:
+            self._unchecked = collections.deque(maxlen=16)
+        elif not state:
+            self._unchecked = None
+
+    def check(self, response=None):
+        """
+        Check the instrument error queue, and raise the errors caused by the messages sent since the previous check
+
+        The queue is drained only when it holds an error.
+
+        :param response: error queue response already read. None queries the device
+        :return: None
+        :raise InstrumentError: CommandError, ExecutionError, DeviceError or QueryError of the first queued error
+        """
+        with self._lock:
+            if response is None:
+                self.flush()
+                self._write(errors.CHECK)
+                response = self.read()
+            entries = []
+            code, message = errors.parse(response)
+            while code != 0 and len(entries) < self.ERROR_QUEUE:
+                entries.append((code, message))
+                self._write(errors.CHECK)
+                code, message = errors.parse(self.read())
+            commands = tuple(self._unchecked or ())
+            if self._unchecked is not None:
+                self._unchecked.clear()
+            if entries and self._state is not None:
+                self._state.reject(commands)
+        if entries:
+            raise errors.error_class(entries[0][0])(*entries[0], commands, entries)
+
+    def transaction(self, write_only=False):
+        """
+        Hold the device for a sequence of operations, such as a channel selection followed by commands and queries
+
+        Other threads sharing the device wait until the transaction ends. Transactions can be nested. With
+        write-behind enabled, a write only transaction holds the queue instead of the bus: it never waits for the
+        bus, and must not contain queries.
+
+        :param write_only: the transaction only sends commands
+        :return: a context manager
+        """
+        if write_only and self.writer is not None:
+            return self.writer.transaction()
+        return self._lock
+
+    def query_channel(self, channel, command):
+        """
+        Send a query to a channel, selecting it in the same message
+
+        :param channel: channel number
+        :param command: query string
+        :return: response string
+        """
+        with self._lock:
+            if self._state is not None and self._state.channel == channel:
+                return self.query(command)
+            return self.query(f'INST:NSEL {channel};:{command}')
+
+    def ch(self, channel) -> Channel:
+        """
+        Get a handle on a channel, selecting the channel for each of its operations
+
+        :param channel: channel number (1,2,3)
+        :return: Channel handle
+        """
+        if channel not in CHANNELS:
+            raise ValueError(f"invalid channel {channel}, expected one of {CHANNELS}")
+        return Channel(self, channel)
+
+    def batch(self):
+        """
+        Create a batch collecting commands and queries sent as compound messages
+
+        :return: a Batch context manager
+        """
+        return Batch(self, self.BUFFER_SIZE)
+
+    def _cached(self, key, command):
+        """
+        Query a setpoint of the selected channel, served from the shadow state when known
+
+        :param key: shadow state key
+        :param command: query string
+        :return: response string
+        """
+        if self._state is None:
+            return self.query(command)
+        with self._lock:
+            response = self._state.get(key)
+            if response is None:
+                response = self.query(command)
+                self._state.store(key, response)
+            return response
+
+    def invalidate(self):
+        """
+        Forget the shadow state, so that the next queries go to the device
+
+        :return: None
+        """
+        if self._state is not None:
+            self._state.invalidate()
+
+    def front_panel_changed(self) -> bool:
+        """
+        Detect a front panel operation since the last check, and invalidate the shadow state if so
+
+        The check reads (and clears) the standard event status register.
+
+        :return: True when a front panel key has been pressed
+        """
+        return bool(self.status.event_status & ESR_URQ)
 
     # ------------------------------------------------------------------------------------------------------------------
     # COMMON subsystem
@@ -51,8 +479,7 @@ class HMP2030:
 
         :return: device identity string
         """
-        self.send('*IDN?')
-        return self.read()
+        return self.query('*IDN?')
 
     def save(self, location):
         """
@@ -73,6 +500,7 @@ class HMP2030:
         """
         if location in range(0, 10):
             self.send(f"*RCL {location}")
+            self.invalidate()
 
     # ------------------------------------------------------------------------------------------------------------------
     # SYSTEM subsystem
@@ -93,8 +521,7 @@ class HMP2030:
 
         :return: version number
         """
-        self.send('SYST:VERS?')
-        return self.read()
+        return self.query('SYST:VERS?')
 
     @property
     def error(self):
@@ -103,8 +530,7 @@ class HMP2030:
 
         :return:
         """
-        self.send('SYST:ERR?')
-        return self.read()
+        return self.query('SYST:ERR?')
 
     # ------------------------------------------------------------------------------------------------------------------
     # INSTRUMENT subsystem
@@ -117,8 +543,7 @@ class HMP2030:
 
         :return: Selected channel
         """
-        self.send('INST?')
-        return self.read()
+        return self.query('INST?')
 
     @channel.setter
     def channel(self, channel):
@@ -129,6 +554,8 @@ class HMP2030:
         :return: None
         """
         if channel in [1, 2, 3]:
+            if self._state is not None and self._state.channel == channel:
+                return
             self.send(f'INST:NSEL {channel}')
 
     # ------------------------------------------------------------------------------------------------------------------
@@ -141,8 +568,7 @@ class HMP2030:
 
         :return: current in Ampere
         """
-        self.send('MEAS:CURR?')
-        return self.read()
+        return self.query('MEAS:CURR?')
 
     @property
     def measure_voltage(self):
@@ -151,8 +577,42 @@ class HMP2030:
 
         :return: voltage in volt
         """
-        self.send('MEAS:VOLT?')
-        return self.read()
+        return self.query('MEAS:VOLT?')
+
+    def measure(self, channels: list, samples=1, mean=False):
+        """
+        Measure voltage and current on several channels in one call
+
+        The selections and measurements of all channels are sent as compound messages, and the responses parsed
+        into a NumPy structured array of (time, channel, volt, current) records.
+
+        :param channels: a list of channel number (1,2,3)
+        :param samples: number of samples per channel
+        :param mean: average the samples of each channel
+        :return: array of records
+        """
+        with self._lock:
+            records = acquire(self, channels, samples)
+        return average(records) if mean else records
+
+    def stream_measurements(self, channels: list, rate=None, size=100000):
+        """
+        Sample voltage and current on several channels, as fast as possible or at a fixed rate
+
+        Each iteration yields a timestamped batch of records (time, channel, volt, current). The records are also
+        kept in the stream ring buffer, and the stream statistics report the achieved rate and dropped deadlines::
+
+            stream = device.stream_measurements([1, 2], rate=10)
+            for records in stream:
+                ...
+            print(stream.stats, stream.buffer.array())
+
+        :param channels: a list of channel number (1,2,3)
+        :param rate: target rate in Hz. None samples as fast as the link allows
+        :param size: ring buffer size, in records
+        :return: a MeasurementStream iterator
+        """
+        return MeasurementStream(self, channels, rate, size)
 
     # ------------------------------------------------------------------------------------------------------------------
     # OUTPUT subsystem
@@ -164,8 +624,7 @@ class HMP2030:
 
         :return:  output state
         """
-        self.send('OUTP?')
-        return self.read()
+        return self._cached('OUTP', 'OUTP?')
 
     @output.setter
     def output(self, state):
@@ -186,10 +645,13 @@ class HMP2030:
         :param state: 0 or 1
         :return: None
         """
-        for i in channels:
-            self.send(f'INST:NSEL {i}')
-            self.send(f'OUTP:SEL {state}')
-            self.send(f'OUTP:GEN {state}')
+        if not channels:
+            return
+        with self.batch() as batch:
+            for i in channels:
+                batch.write(f'INST:NSEL {i}')
+                batch.write(f'OUTP:SEL {state}')
+            batch.write(f'OUTP:GEN {state}')
 
     # ------------------------------------------------------------------------------------------------------------------
     # SOURCE subsystem
@@ -207,13 +669,14 @@ class HMP2030:
     @source.setter
     def source(self, param):
         """
-        Set current source parameter
+        Set current source parameter. The change waits for the running transaction
 
         :param param: source parameter (CURRENT, VOLT)
         :return: None
         """
         if param in ['volt', 'curr']:
-            self._source = str(param).upper()
+            with self._lock:
+                self._source = str(param).upper()
 
     @property
     def param(self) -> float:
@@ -222,8 +685,7 @@ class HMP2030:
 
         :return: parameter value
         """
-        self.send(f"{self._source}?")
-        return float(self.read())
+        return float(self._cached(self._source, f"{self._source}?"))
 
     @param.setter
     def param(self, value: float):
@@ -242,8 +704,7 @@ class HMP2030:
 
         :return: parameter value
         """
-        self.send(f"{self._source}:STEP?")
-        return float(self.read())
+        return float(self._cached(f"{self._source}:STEP", f"{self._source}:STEP?"))
 
     @step.setter
     def step(self, value: float):
@@ -262,8 +723,7 @@ class HMP2030:
 
         :return: selected channel voltage
         """
-        self.send('VOLT?')
-        return self.read()
+        return self._cached('VOLT', 'VOLT?')
 
     @volt.setter
     def volt(self, value):
@@ -296,8 +756,7 @@ class HMP2030:
 
         :return: selected channel current
         """
-        self.send('CURR?')
-        return self.read()
+        return self._cached('CURR', 'CURR?')
 
     @current.setter
     def current(self, value):
@@ -348,17 +807,22 @@ class HMP2030:
 
         :return: a dictionary
         """
-        self.source = 'volt'
-        volt = {
-            "value": self.param,
-            "step": self.step
-        }
-        self.source = 'curr'
-        current = {
-            "value": self.param,
-            "step": self.step
+        keys = ('VOLT', 'VOLT:STEP', 'CURR', 'CURR:STEP', 'OUTP')
+        with self._lock:
+            values = [None] * len(keys) if self._state is None else [self._state.get(key) for key in keys]
+            if None in values:
+                with self.batch() as batch:
+                    results = [batch.query(f"{key}?") for key in keys]
+                values = [result.value for result in results]
+                if self._state is not None:
+                    for key, value in zip(keys, values):
+                        self._state.store(key, value)
+        volt, volt_step, current, current_step, output = values
+        return {
+            'volt': {'value': float(volt), 'step': float(volt_step)},
+            'current': {'value': float(current), 'step': float(current_step)},
+            'output': output
         }
-        return {'volt': volt, 'current': current, 'output': self.output}
 
     @source_properties.setter
     def source_properties(self, settings: dict):
@@ -369,14 +833,11 @@ class HMP2030:
 
         :return: None
         """
-        cmd = f"VOLT {settings['volt']['value']}"
-        self.send(cmd)
-        cmd = f"VOLT:STEP {settings['volt']['step']};"
-        self.send(cmd)
-        cmd = f"CURR {settings['current']['value']}"
-        self.send(cmd)
-        cmd = f"CURR:STEP {settings['volt']['step']};"
-        self.send(cmd)
+        with self.batch() as batch:
+            batch.write(f"VOLT {settings['volt']['value']}")
+            batch.write(f"VOLT:STEP {settings['volt']['step']}")
+            batch.write(f"CURR {settings['current']['value']}")
+            batch.write(f"CURR:STEP {settings['current']['step']}")
 
     # ------------------------------------------------------------------------------------------------------------------
     # APPLY subsystem
@@ -388,8 +849,7 @@ class HMP2030:
 
         :return: voltage and current values
         """
-        self.send('APPLY?')
-        return self.read()
+        return self.query('APPLY?')
 
     def set_power(self, sets: dict):
         """
@@ -399,10 +859,114 @@ class HMP2030:
         :warning: no control is made on dictionary content
         :return:
         """
-        for i in sets:
-            self.channel = i
-            self.volt = sets[i]
+        with self.batch() as batch:
+            for i in sets:
+                batch.write(f'INST:NSEL {i}')
+                batch.write(f'VOLT {sets[i]}')
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # Device state
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def snapshot(self) -> DeviceState:
+        """
+        Read the settings of all channels and the general output in one round trip
+
+        The channels are selected in turn: the selected channel is restored when known by the shadow state.
+
+        :return: an immutable DeviceState
+        """
+        with self._lock:
+            selected = None if self._state is None else self._state.channel
+            with self.batch() as batch:
+                results = []
+                for i in CHANNELS:
+                    batch.write(f'INST:NSEL {i}')
+                    results.append([batch.query(f'{header}?', float) for header, _ in SETPOINTS.values()] +
+                                   [batch.query('OUTP:SEL?', int)])
+                general = batch.query('OUTP:GEN?', int)
+                if selected is not None:
+                    batch.write(f'INST:NSEL {selected}')
+            state = DeviceState(tuple(ChannelState(*[result.value for result in values[:-1]], bool(values[-1].value))
+                                      for values in results), bool(general.value))
+            if self._state is not None:
+                self._state.load(state)
+            return state
+
+    def known_state(self):
+        """
+        Get the device state from the shadow state, without any I/O
+
+        :return: DeviceState, or None when not fully known
+        """
+        return None if self._state is None else self._state.device_state()
+
+    def apply_snapshot(self, state: DeviceState) -> int:
+        """
+        Restore a device state, sending only the settings that differ from the current state
+
+        The current state comes from the shadow state when fully known, otherwise from a snapshot. The changes are
+        sent in pipelined messages, grouped per channel.
+
+        :param state: DeviceState to restore
+        :return: number of commands sent
+        """
+        with self._lock:
+            commands = state.commands(self.known_state() or self.snapshot())
+            if commands:
+                selected = None if self._state is None else self._state.channel
+                with self.batch() as batch:
+                    for command in commands:
+                        batch.write(command)
+                    if selected is not None:
+                        batch.write(f'INST:NSEL {selected}')
+            return len(commands)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # ARB subsystem
+    # ------------------------------------------------------------------------------------------------------------------
+
+    @property
+    def arb(self) -> Generator:
+        """
+        Get the EasyArb generator of the device
+
+        :return: Generator handle
+        """
+        return Generator(self)
 
     # ------------------------------------------------------------------------------------------------------------------
     # STATUS subsystem
     # ------------------------------------------------------------------------------------------------------------------
+
+    @property
+    def status(self) -> Status:
+        """
+        Get the status registers of the device
+
+        :return: Status handle
+        """
+        return Status(self)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # Regulation
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def regulate(self, channel, target, controller, *, mode='current', rate=None, resistance=0.0) -> Regulator:
+        """
+        Start holding a channel at a target current or load voltage, on a dedicated thread
+
+        The controller adjusts the channel voltage setpoint. Each loop iteration is a single message setting the
+        voltage and measuring the channel.
+
+        :param channel: channel number (1,2,3)
+        :param target: target current in Ampere, or load voltage in volt
+        :param controller: PIController computing the channel voltage
+        :param mode: regulated quantity: current or voltage
+        :param rate: loop rate in Hz. None runs as fast as the link allows
+        :param resistance: lead resistance (in ohm) compensated in voltage mode
+        :return: the running Regulator
+        """
+        regulator = Regulator(self, channel, target, controller, mode=mode, rate=rate, resistance=resistance)
+        regulator.start()
+        return regulator
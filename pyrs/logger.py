@@ -0,0 +1,297 @@
+"""
+Measurement logger
+
+Records are buffered in a preallocated array and written in large blocks to append-only binary files. A file is
+made of a header followed by the raw records:
+
+- magic string (8 bytes) and header size (uint32, little endian)
+- JSON metadata: record type, device names, creation time
+- records, packed with the record type
+
+The files are read back as memory-mapped arrays with read_log(), and can be exported to CSV or Parquet.
+"""
+
+import glob
+import importlib
+import json
+import os
+import struct
+import threading
+import time
+import numpy as np
+from pyrs.stream import SAMPLE_DTYPE
+
+MAGIC = b'PYRSLOG1'
+#: record type of a logged measurement
+LOG_DTYPE = np.dtype(SAMPLE_DTYPE.descr + [('device', 'u2')])
+#: header alignment, in bytes
+ALIGNMENT = 64
+
+
+def read_log(path):
+    """
+    Read a log file as a memory-mapped array
+
+    :param path: log file path
+    :return: metadata dictionary and array of records
+    """
+    with open(path, 'rb') as file:
+        magic, size = struct.unpack('<8sI', file.read(12))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a measurement log file")
+        metadata = json.loads(file.read(size - 12).rstrip(b' ').decode('utf-8'))
+    dtype = np.dtype([tuple(field) for field in metadata['dtype']])
+    count = (os.path.getsize(path) - size) // dtype.itemsize
+    if count == 0:
+        return metadata, np.empty(0, dtype=dtype)
+    return metadata, np.memmap(path, dtype=dtype, mode='r', offset=size, shape=(count,))
+
+
+def to_csv(path, output, block=1 << 16):
+    """
+    Export a log file to CSV
+
+    :param path: log file path
+    :param output: CSV file path
+    :param block: number of records converted at once
+    :return: None
+    """
+    metadata, records = read_log(path)
+    with open(output, 'w', encoding='utf-8') as file:
+        file.write('time,device,channel,volt,current\n')
+        for start in range(0, len(records), block):
+            chunk = records[start:start + block]
+            names = np.asarray(metadata['devices'], dtype=object)[chunk['device']]
+            np.savetxt(file, np.column_stack((chunk['time'], names, chunk['channel'], chunk['volt'],
+                                              chunk['current'])), fmt=['%.6f', '%s', '%d', '%.6g', '%.6g'],
+                       delimiter=',')
+
+
+def to_parquet(path, output):
+    """
+    Export a log file to Parquet (requires pyarrow)
+
+    :param path: log file path
+    :param output: Parquet file path
+    :return: None
+    """
+    pyarrow = importlib.import_module('pyarrow')
+    parquet = importlib.import_module('pyarrow.parquet')
+    metadata, records = read_log(path)
+    columns = {name: np.asarray(records[name]) for name in records.dtype.names}
+    columns['device'] = pyarrow.DictionaryArray.from_arrays(columns['device'], metadata['devices'])
+    parquet.write_table(pyarrow.table(columns), output)
+
+
+class RotatingFile:
+    """
+    Log file rotated on size or age
+
+    The files are named <stem>-<index><suffix> from the given path, and each one starts with its header. The first
+    file continues after the existing ones, so that no file is ever overwritten.
+    """
+    def __init__(self, path, devices, max_bytes=None, max_age=None):
+        """
+        Open the first file
+
+        :param path: log file path, used as a pattern for the rotated files
+        :param devices: a list of device names
+        :param max_bytes: file size (in bytes) triggering a rotation. None never rotates on size
+        :param max_age: file age (in seconds) triggering a rotation. None never rotates on age
+        """
+        stem, suffix = os.path.splitext(path)
+        self.pattern = f"{stem}-{{:04d}}{suffix}"
+        self.devices = devices
+        self.rotation = (max_bytes, max_age)
+        self.index = max(self._indexes(stem, suffix), default=-1)
+        self.path = None
+        self._file = None
+        self._opened = time.monotonic()
+        self.rotate()
+
+    @staticmethod
+    def _indexes(stem, suffix):
+        """
+        Get the indexes of the existing rotated files
+
+        :param stem: log file path without extension
+        :param suffix: log file extension
+        :return: a list of indexes
+        """
+        prefix = f"{stem}-"
+        paths = glob.glob(f"{glob.escape(prefix)}*{glob.escape(suffix)}")
+        names = (path[len(prefix):len(path) - len(suffix)] for path in paths)
+        return [int(name) for name in names if name.isdigit()]
+
+    def rotate(self):
+        """
+        Close the current file and open the next one
+
+        :return: None
+        """
+        if self._file is not None:
+            self._file.close()
+        self.index += 1
+        self.path = self.pattern.format(self.index)
+        metadata = json.dumps({
+            'dtype': [list(field) for field in LOG_DTYPE.descr],
+            'devices': self.devices,
+            'created': time.time(),
+        }).encode('utf-8')
+        size = -(-(12 + len(metadata)) // ALIGNMENT) * ALIGNMENT
+        self._file = open(self.path, 'xb')  # pylint: disable=consider-using-with
+        self._file.write(struct.pack('<8sI', MAGIC, size) + metadata.ljust(size - 12))
+        self._opened = time.monotonic()
+
+    def write(self, records):
+        """
+        Write records to the current file
+
+        :param records: array of records
+        :return: None
+        """
+        self._file.write(records.tobytes())
+
+    def flush(self):
+        """
+        Flush the current file, and rotate it if needed
+
+        :return: None
+        """
+        self._file.flush()
+        max_bytes, max_age = self.rotation
+        if (max_bytes and self._file.tell() >= max_bytes) or (max_age and time.monotonic() - self._opened >= max_age):
+            self.rotate()
+
+    def close(self):
+        """
+        Close the current file
+
+        :return: None
+        """
+        self._file.close()
+
+
+class MeasurementLogger:
+    """
+    Append-only, bounded-memory measurement logger
+
+    Records are accumulated in a fixed-size block, written to disk when the block is full or when the flush
+    interval has elapsed. Files are rotated on size or age: they are named <stem>-<index><suffix> from the given
+    path, and a logger restarted on the same path continues after the existing files::
+
+        with MeasurementLogger('burnin.plog', devices=['psu1'], max_bytes=1 << 30) as logger:
+            for records in device.stream_measurements([1, 2]):
+                logger.append(records, 'psu1')
+    """
+    def __init__(self, path, devices=('HMP2030',), *, block=1 << 16, flush_interval=10.0, max_bytes=None,
+                 max_age=None):
+        """
+        Create a logger
+
+        :param path: log file path, used as a pattern for the rotated files
+        :param devices: a list of device names
+        :param block: number of records buffered in memory
+        :param flush_interval: maximum time (in seconds) records stay in memory
+        :param max_bytes: file size (in bytes) triggering a rotation. None never rotates on size
+        :param max_age: file age (in seconds) triggering a rotation. None never rotates on age
+        """
+        self.devices = list(devices)
+        self.flush_interval = flush_interval
+        self._file = RotatingFile(path, self.devices, max_bytes, max_age)
+        self._buffer = np.zeros(block, dtype=LOG_DTYPE)
+        self._count = 0
+        self._flushed = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def path(self) -> str:
+        """
+        Get the path of the current file
+
+        :return: file path
+        """
+        return self._file.path
+
+    @property
+    def index(self) -> int:
+        """
+        Get the index of the current file
+
+        :return: file index
+        """
+        return self._file.index
+
+    def _write(self):
+        """
+        Write the buffered records, and rotate the file if needed
+
+        :return: None
+        """
+        if self._count:
+            self._file.write(self._buffer[:self._count])
+            self._count = 0
+        self._file.flush()
+        self._flushed = time.monotonic()
+
+    def append(self, records, device=0):
+        """
+        Append measurement records
+
+        :param records: array of records (time, channel, volt, current)
+        :param device: device name or index
+        :return: None
+        """
+        if not isinstance(device, int):
+            device = self.devices.index(device)
+        with self._lock:
+            start = 0
+            while start < len(records):
+                count = min(len(records) - start, len(self._buffer) - self._count)
+                target = self._buffer[self._count:self._count + count]
+                for name in SAMPLE_DTYPE.names:
+                    target[name] = records[name][start:start + count]
+                target['device'] = device
+                self._count += count
+                start += count
+                if self._count == len(self._buffer):
+                    self._write()
+            if time.monotonic() - self._flushed >= self.flush_interval:
+                self._write()
+
+    def append_farm(self, result):
+        """
+        Append the measurement records of a farm
+
+        :param result: FarmResult of PowerSupplyFarm.measure()
+        :return: None
+        """
+        for name, records in result.results.items():
+            self.append(records, name)
+
+    def flush(self):
+        """
+        Write the buffered records
+
+        :return: None
+        """
+        with self._lock:
+            self._write()
+
+    def close(self):
+        """
+        Write the buffered records and close the file
+
+        :return: None
+        """
+        with self._lock:
+            if self._count:
+                self._file.write(self._buffer[:self._count])
+                self._count = 0
+            self._file.close()
@@ -0,0 +1,249 @@
+"""
+SCPI traffic instrumentation
+"""
+
+import bisect
+import collections
+import json
+import threading
+import time
+
+#: upper bounds (in seconds) of the latency histogram buckets
+BUCKETS = tuple(float(f"{10 ** (exponent / 2):.2g}") for exponent in range(-12, 3))
+
+
+class Histogram:
+    """
+    Latency histogram with fixed logarithmic buckets
+    """
+    def __init__(self):
+        """
+        Create an empty histogram
+        """
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+
+    @property
+    def count(self) -> int:
+        """
+        Get the number of observations
+
+        :return: number of observations
+        """
+        return sum(self.counts)
+
+    def observe(self, seconds):
+        """
+        Add an observation
+
+        :param seconds: duration in seconds
+        :return: None
+        """
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+
+    def to_dict(self) -> dict:
+        """
+        Get the histogram content
+
+        :return: a dictionary
+        """
+        bounds = [f"{bound:g}" for bound in BUCKETS] + ['+Inf']
+        return {'count': self.count, 'sum': self.sum, 'buckets': dict(zip(bounds, self.counts))}
+
+
+class CommandStats:
+    """
+    Traffic statistics of a command
+    """
+    PHASES = ('write', 'wait', 'read')
+
+    def __init__(self):
+        """
+        Create empty statistics
+        """
+        self.count = 0
+        self.bytes = {'out': 0, 'in': 0}
+        self.latency = {phase: Histogram() for phase in self.PHASES}
+
+    def account(self, phase, wait, seconds, size):
+        """
+        Account a write or a read
+
+        :param phase: write or read
+        :param wait: time (in seconds) waited before the I/O
+        :param seconds: I/O duration
+        :param size: number of bytes transferred
+        :return: None
+        """
+        self.bytes['out' if phase == 'write' else 'in'] += size
+        self.latency[phase].observe(seconds)
+        if wait:
+            self.latency['wait'].observe(wait)
+
+    def to_dict(self) -> dict:
+        """
+        Get the statistics content
+
+        :return: a dictionary
+        """
+        return {
+            'count': self.count,
+            'bytes': dict(self.bytes),
+            'latency': {phase: histogram.to_dict() for phase, histogram in self.latency.items()},
+        }
+
+
+class Instrumentation:
+    """
+    Per-command SCPI traffic counters, latency histograms and trace
+
+    Each command of a message is counted under its header (arguments and leading colon removed, upper case). The bytes
+    and the time of a message are accounted under the header of a single command message, and under COMPOUND for
+    the messages joining several commands, so that the number of keys stays bounded. The time of a message is split
+    in write (sending the message), wait (delays before the I/O) and read (waiting for and reading the response,
+    which includes the instrument processing time).
+    """
+    #: statistics key of the messages joining several commands
+    COMPOUND = '(compound)'
+
+    def __init__(self, name='', trace=0, callback=None):
+        """
+        Create an instrumentation
+
+        :param name: device name, used as a label in the exports
+        :param trace: number of recent messages kept in the trace ring. 0 disables the trace
+        :param callback: callable receiving each trace event dictionary. None disables the callback
+        """
+        self.name = name
+        self.commands = collections.defaultdict(CommandStats)
+        self.trace = collections.deque(maxlen=trace) if trace else None
+        self.callback = callback
+        self._last = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def header(command) -> str:
+        """
+        Get the normalized header of a command
+
+        :param command: command string
+        :return: header, without argument and leading colon, in upper case
+        """
+        return command.strip().split(' ')[0].lstrip(':').upper()
+
+    def key(self, command) -> str:
+        """
+        Get the statistics key of a message
+
+        :param command: message string
+        :return: command header, or COMPOUND
+        """
+        return self.COMPOUND if ';' in command.strip().rstrip(';') else self.header(command)
+
+    def _event(self, event):
+        """
+        Record a trace event
+
+        :param event: event dictionary
+        :return: None
+        """
+        if self.trace is not None:
+            self.trace.append(event)
+        if self.callback is not None:
+            self.callback(event)
+
+    def write(self, command, wait, seconds, size):
+        """
+        Account a message write
+
+        :param command: message string
+        :param wait: time (in seconds) waited before the write
+        :param seconds: write duration
+        :param size: number of bytes written
+        :return: None
+        """
+        key = self.key(command)
+        with self._lock:
+            for part in command.split(';'):
+                if part.strip():
+                    self.commands[self.header(part)].count += 1
+            if key == self.COMPOUND:
+                self.commands[key].count += 1
+            self.commands[key].account('write', wait, seconds, size)
+            self._last = key
+        if self.trace is not None or self.callback is not None:
+            self._event({'time': time.time(), 'command': command, 'phase': 'write', 'wait': wait,
+                         'seconds': seconds, 'bytes': size})
+
+    def read(self, wait, seconds, size):
+        """
+        Account the read of the last message response
+
+        :param wait: time (in seconds) waited before the read
+        :param seconds: read duration
+        :param size: number of bytes read
+        :return: None
+        """
+        with self._lock:
+            self.commands[self._last].account('read', wait, seconds, size)
+        if self.trace is not None or self.callback is not None:
+            self._event({'time': time.time(), 'command': self._last, 'phase': 'read', 'wait': wait,
+                         'seconds': seconds, 'bytes': size})
+
+    def reset(self):
+        """
+        Clear the statistics and the trace
+
+        :return: None
+        """
+        with self._lock:
+            self.commands.clear()
+            if self.trace is not None:
+                self.trace.clear()
+
+    def to_dict(self) -> dict:
+        """
+        Get the statistics
+
+        :return: a dictionary
+        """
+        with self._lock:
+            return {
+                'device': self.name,
+                'commands': {key: stats.to_dict() for key, stats in self.commands.items()},
+                'trace': list(self.trace or ()),
+            }
+
+    def to_json(self, **kwargs) -> str:
+        """
+        Get the statistics as JSON
+
+        :param kwargs: json.dumps arguments
+        :return: JSON string
+        """
+        return json.dumps(self.to_dict(), **kwargs)
+
+    def to_prometheus(self, prefix='pyrs_scpi') -> str:
+        """
+        Get the statistics in the Prometheus text exposition format
+
+        :param prefix: metric name prefix
+        :return: metrics text
+        """
+        lines = [f"# TYPE {prefix}_messages_total counter", f"# TYPE {prefix}_bytes_total counter",
+                 f"# TYPE {prefix}_seconds histogram"]
+        with self._lock:
+            for key, stats in self.commands.items():
+                labels = f'device="{self.name}",command="{key}"'
+                lines.append(f"{prefix}_messages_total{{{labels}}} {stats.count}")
+                for direction, size in stats.bytes.items():
+                    lines.append(f'{prefix}_bytes_total{{{labels},direction="{direction}"}} {size}')
+                for phase, histogram in stats.latency.items():
+                    cumulative = 0
+                    for bound, count in histogram.to_dict()['buckets'].items():
+                        cumulative += count
+                        lines.append(f'{prefix}_seconds_bucket{{{labels},phase="{phase}",le="{bound}"}} {cumulative}')
+                    lines.append(f'{prefix}_seconds_sum{{{labels},phase="{phase}"}} {histogram.sum}')
+                    lines.append(f'{prefix}_seconds_count{{{labels},phase="{phase}"}} {cumulative}')
+        return '\n'.join(lines) + '\n'
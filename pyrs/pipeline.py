@@ -0,0 +1,165 @@
+"""
+SCPI command pipelining
+"""
+
+from pyrs.errors import CHECK
+
+
+class Result:
+    """
+    Deferred result of a batched query
+    """
+    def __init__(self, command, convert=str):
+        """
+        Create a deferred result
+
+        :param command: query string
+        :param convert: callable converting the response string
+        """
+        self.command = command
+        self._convert = convert
+        self._value = None
+        self.ready = False
+
+    def set(self, response):
+        """
+        Set the result from the response string
+
+        :param response: response string
+        :return: None
+        """
+        self._value = self._convert(response.strip())
+        self.ready = True
+
+    @property
+    def value(self):
+        """
+        Get the converted response
+
+        :return: response value
+        """
+        if not self.ready:
+            raise RuntimeError(f"batch containing '{self.command}' has not been executed")
+        return self._value
+
+
+class Batch:
+    """
+    Collect commands and queries and send them as compound SCPI messages
+
+    Commands are joined with ';' in messages that fit the instrument input buffer. Each message is sent with a
+    single write, followed by a single read when it holds queries. Typically used as a context manager::
+
+        with device.batch() as batch:
+            volt = batch.query('VOLT?', float)
+            batch.write('OUTP:SEL 1')
+        print(volt.value)
+    """
+    def __init__(self, device, size):
+        """
+        Create a batch
+
+        :param device: device used to send the messages
+        :param size: maximum message length in characters
+        """
+        self._device = device
+        self._size = size
+        self._items = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.execute()
+
+    def __len__(self):
+        return len(self._items)
+
+    def write(self, command):
+        """
+        Queue a command
+
+        :param command: command string
+        :return: None
+        """
+        self._items.append((command, None))
+
+    def query(self, command, convert=str):
+        """
+        Queue a query
+
+        :param command: query string
+        :param convert: callable converting the response string (str, float, int...)
+        :return: deferred result
+        """
+        result = Result(command, convert)
+        self._items.append((command, result))
+        return result
+
+    @staticmethod
+    def header(command):
+        """
+        Get the absolute form of a command, so that it can follow another one in a compound message
+
+        :param command: command string
+        :return: command string
+        """
+        if command.startswith((':', '*')):
+            return command
+        return f":{command}"
+
+    def messages(self, size=None):
+        """
+        Split the queued commands into compound messages
+
+        :param size: maximum message length in characters. None for the batch size
+        :return: a list of (message, results) tuples
+        """
+        size = self._size if size is None else size
+        messages = []
+        parts, results = [], []
+        length = 0
+        for command, result in self._items:
+            part = self.header(command)
+            if parts and length + len(part) + 1 > size:
+                messages.append((';'.join(parts), results))
+                parts, results = [], []
+                length = 0
+            length += len(part) + (1 if parts else 0)
+            parts.append(part)
+            if result is not None:
+                results.append(result)
+        if parts:
+            messages.append((';'.join(parts), results))
+        return messages
+
+    def execute(self):
+        """
+        Send the queued commands and dispatch the responses, in a device transaction
+
+        In checked mode, an error queue query is appended to the messages holding queries, and to the last message.
+
+        :return: a list of query values, in queue order
+        """
+        values = []
+        checked = self._device.checked
+        write_only = not checked and all(result is None for _, result in self._items)
+        with self._device.transaction(write_only=write_only):
+            messages = self.messages(self._size - len(CHECK) - 2 if checked else None)
+            for index, (message, results) in enumerate(messages):
+                check = checked and (results or index == len(messages) - 1)
+                if not results and not check:
+                    self._device.send(message)
+                    continue
+                responses = self._device.exchange(f'{message};:{CHECK}' if check else message).split(';')
+                error = responses.pop() if check else None
+                if len(responses) != len(results):
+                    raise ValueError(f"expected {len(results)} responses to '{message}', got {len(responses)}")
+                for result, response in zip(results, responses):
+                    result.set(response)
+                    values.append(result.value)
+                if check:
+                    self._device.check(error)
+        self._items = []
+        return values
@@ -2,14 +2,160 @@
 power cli utility
 """
 import argparse
+import json
+import sys
+import time
 import pyvisa.errors
 from pyrs.hmp2030 import HMP2030
+from pyrs.simulator import SimulatedResourceManager
 
 # ------------------------------------------------------------------------------------------------------------------
 
 NAME = 'USB0::0x0AAD::0x0117::120470::INSTR'
 LIBRARY = '/usr/lib/librsvisa.so'
 
+SCRIPT_HELP = """
+script operations, one per line ('#' starts a comment):
+  volt CH [VALUE]           get or set a channel voltage
+  current CH [VALUE]        get or set a channel current
+  output CH [on|off|1|0]    get or set a channel output
+  outputs CH,CH on|off|1|0  switch several channel outputs simultaneously
+  power CH=VALUE ...        set several channel voltages
+  measure CH,CH [SAMPLES]   measure voltage and current
+  snapshot                  read the settings of all channels
+  save LOCATION             save the settings
+  recall LOCATION           recall the settings
+  wait SECONDS              wait until the previous operations are written, then sleep
+  opc                       wait until the instrument has executed the previous operations
+  send COMMAND              send a SCPI command
+  query COMMAND             send a SCPI query
+  identity, error, beep
+"""
+
+
+def channels(text) -> list:
+    """
+    Parse a comma separated list of channels
+
+    :param text: channel list
+    :return: a list of channel numbers
+    """
+    return [int(channel) for channel in text.split(',')]
+
+
+def output_state(text) -> str:
+    """
+    Parse an output state
+
+    :param text: on, off, 1 or 0
+    :return: ON or OFF
+    """
+    states = {'ON': 'ON', '1': 'ON', 'OFF': 'OFF', '0': 'OFF'}
+    if text.upper() not in states:
+        raise ValueError(f"invalid output state '{text}', expected on, off, 1 or 0")
+    return states[text.upper()]
+
+
+def setpoint(name, convert=float):
+    """
+    Build a channel setpoint operation, getting the value without argument
+
+    :param name: channel handle property name
+    :param convert: callable converting the value read from the device
+    :return: operation function
+    """
+    def operation(device, channel, value=None):
+        handle = device.ch(int(channel))
+        if value is None:
+            return convert(getattr(handle, name))
+        setattr(handle, name, output_state(value) if name == 'output' else float(value))
+        return None
+    return operation
+
+
+def measure(device, selection, samples='1'):
+    """
+    Measure voltage and current on several channels
+
+    :param device: HMP2030 device
+    :param selection: comma separated list of channels
+    :param samples: number of samples per channel
+    :return: a list of record dictionaries
+    """
+    records = device.measure(channels(selection), int(samples))
+    return [dict(zip(records.dtype.names, record)) for record in records.tolist()]
+
+
+def wait(device, seconds):
+    """
+    Write the queued operations and sleep
+
+    :param device: HMP2030 device
+    :param seconds: sleep time in seconds
+    :return: None
+    """
+    device.flush()
+    time.sleep(float(seconds))
+
+
+#: script operations: function(device, *arguments) returning a JSON serializable result, or None
+OPERATIONS = {
+    'volt': setpoint('volt'),
+    'current': setpoint('current'),
+    'output': setpoint('output', lambda state: state == '1'),
+    'outputs': lambda device, selection, state: device.output_selected(channels(selection),
+                                                                       int(output_state(state) == 'ON')),
+    'power': lambda device, *sets: device.set_power({int(key): float(value) for key, value in
+                                                     (item.split('=') for item in sets)}),
+    'measure': measure,
+    'snapshot': lambda device: device.snapshot().to_dict(),
+    'save': lambda device, location: device.save(int(location)),
+    'recall': lambda device, location: device.call(int(location)),
+    'wait': wait,
+    'opc': lambda device: device.status.wait_complete(),
+    'send': lambda device, *command: device.send(' '.join(command)),
+    'query': lambda device, *command: device.query(' '.join(command)),
+    'identity': lambda device: device.identity,
+    'error': lambda device: device.error,
+    'beep': lambda device: device.beep(),
+}
+
+
+def run(device, lines, output, iteration=None) -> int:
+    """
+    Execute script lines, writing one JSON result per operation
+
+    Commands are queued and written in pipelined messages, until an operation needs a response.
+
+    :param device: HMP2030 device, with write-behind enabled
+    :param lines: iterable of script lines
+    :param output: text stream receiving the results
+    :param iteration: iteration number added to the results. None to omit
+    :return: number of failed operations
+    """
+    errors = 0
+    for number, line in enumerate(lines, 1):
+        words = line.split('#')[0].split()
+        if not words:
+            continue
+        result = {'line': number, 'op': words[0]}
+        if iteration is not None:
+            result['iteration'] = iteration
+        try:
+            if words[0] not in OPERATIONS:
+                raise ValueError(f"unknown operation '{words[0]}'")
+            value = OPERATIONS[words[0]](device, *words[1:])
+            if value is None:
+                continue
+            result['result'] = value
+        except (ValueError, TypeError, KeyError, TimeoutError, pyvisa.errors.VisaIOError) as error:
+            errors += 1
+            result['error'] = str(error)
+        output.write(json.dumps(result) + '\n')
+        output.flush()
+    device.flush()
+    return errors
+
 
 def main():
     """
@@ -17,18 +163,47 @@ def main():
 
     :return:
     """
-    parser = argparse.ArgumentParser(description='CLI for HMP2030 Power supply')
+    parser = argparse.ArgumentParser(description='CLI for HMP2030 Power supply', epilog=SCRIPT_HELP,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
     parser.add_argument('-n', '--name', default=NAME, help=f'device visa name or address. default = {NAME}')
     parser.add_argument('-l', '--library', default=LIBRARY, help=f'visa shared library. default = {LIBRARY}')
+    parser.add_argument('-s', '--simulate', action='store_true', help='use a simulated instrument')
+    parser.add_argument('script', nargs='?', help="script file of operations, '-' for the standard input")
+    parser.add_argument('-r', '--repeat', type=int, default=1, help='number of script executions, 0 for ever')
+    parser.add_argument('-i', '--interval', type=float, default=0.0, help='time (in seconds) between executions')
     args = parser.parse_args()
 
     try:
-        device = HMP2030(name=args.name,library= args.library)
-        device.beep()
-        print(f"device identity : {device.identity}")
+        rm = SimulatedResourceManager() if args.simulate else None
+        device = HMP2030(name=args.name, library=args.library, resource_manager=rm)
+        try:
+            if args.script is None:
+                device.beep()
+                print(f"device identity : {device.identity}")
+                return
+            device.enable_write_behind()
+            if args.script == '-':
+                lines = sys.stdin if args.repeat == 1 else sys.stdin.readlines()
+            else:
+                with open(args.script, encoding='utf-8') as file:
+                    lines = file.readlines()
+            errors = 0
+            deadline = time.monotonic()
+            iteration = 0
+            while args.repeat == 0 or iteration < args.repeat:
+                errors += run(device, lines, sys.stdout, iteration if args.repeat != 1 else None)
+                iteration += 1
+                if args.repeat == 0 or iteration < args.repeat:
+                    deadline += args.interval
+                    time.sleep(max(0.0, deadline - time.monotonic()))
+        finally:
+            device.close()
+        sys.exit(1 if errors else 0)
     except pyvisa.errors.VisaIOError as msg:
-        print(msg)
-
+        print(msg, file=sys.stderr)
+        sys.exit(1)
+    except KeyboardInterrupt:
+        pass
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,194 @@
+"""
+Preset library
+
+Named channel configurations are kept in the instrument memory locations (*SAV/*RCL), so that switching between
+them takes a single *RCL command. The library tracks which location holds which configuration by a hash of its
+setpoints, evicts the least recently used configuration when all the locations are in use, and can persist the
+presets and the location map in a JSON file.
+
+A memory location holds the voltage, current and step setpoints of every channel: the outputs are not part of a
+preset, and are left unchanged by an activation.
+"""
+
+import collections
+import hashlib
+import json
+import os
+from pyrs.snapshot import SETPOINTS, DeviceState
+
+
+def content_hash(state: DeviceState) -> str:
+    """
+    Hash the setpoints of a device state, formatted as the device reports them
+
+    :param state: DeviceState
+    :return: hexadecimal digest
+    """
+    text = ';'.join(fmt.format(getattr(channel, field)) for channel in state.channels
+                    for field, (_, fmt) in SETPOINTS.items())
+    return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+
+class PresetLibrary:
+    """
+    Named configurations cached in the instrument memory locations::
+
+        presets = PresetLibrary(device, 'presets.json')
+        presets.define('dut_a')           # the current device setpoints
+        presets.define('dut_b', state)    # a DeviceState, or a dictionary returned by DeviceState.to_dict()
+        presets.activate('dut_a')         # upload and *SAV on the first use, a single *RCL afterwards
+    """
+    def __init__(self, device, path=None, locations=range(10)):
+        """
+        Create a preset library
+
+        :param device: HMP2030 device
+        :param path: JSON file storing the presets and the location map. None for no persistence
+        :param locations: memory locations managed by the library
+        """
+        self.device = device
+        self.path = path
+        self.locations = list(locations)
+        self.presets = {}
+        self.hits = 0
+        self.misses = 0
+        self._slots = collections.OrderedDict()
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def define(self, name, state=None):
+        """
+        Define or replace a preset
+
+        :param name: preset name
+        :param state: DeviceState, or a dictionary returned by DeviceState.to_dict(). None reads the device
+        :return: None
+        """
+        if state is None:
+            state = self.device.snapshot()
+        elif isinstance(state, dict):
+            state = DeviceState.from_dict(state)
+        self.presets[name] = state
+        self._persist()
+
+    def remove(self, name):
+        """
+        Remove a preset. Its memory location is released when no other preset has the same setpoints
+
+        :param name: preset name
+        :return: None
+        """
+        digest = content_hash(self.presets.pop(name))
+        if all(content_hash(state) != digest for state in self.presets.values()):
+            for location in [location for location, value in self._slots.items() if value == digest]:
+                del self._slots[location]
+        self._persist()
+
+    def location(self, name):
+        """
+        Get the memory location holding a preset
+
+        :param name: preset name
+        :return: location number, or None when the preset is not resident
+        """
+        digest = content_hash(self.presets[name])
+        return next((location for location, value in self._slots.items() if value == digest), None)
+
+    def activate(self, name, verify=False) -> int:
+        """
+        Activate a preset
+
+        A resident preset is recalled with *RCL. Otherwise, the setpoints that differ are sent and saved in a free
+        location, or in the least recently used one.
+
+        :param name: preset name
+        :param verify: read the setpoints back after a recall, and upload the preset again when the location content
+                       was changed outside the library
+        :return: memory location of the preset
+        """
+        state = self.presets[name]
+        with self.device.transaction():
+            location = self.location(name)
+            if location is not None:
+                self.device.call(location)
+                self._slots.move_to_end(location)
+                if not verify or content_hash(self.device.snapshot()) == self._slots[location]:
+                    self.hits += 1
+                    self._persist()
+                    return location
+                del self._slots[location]
+            self.misses += 1
+            return self._upload(state, location)
+
+    def _upload(self, state, location=None):
+        """
+        Send the setpoints of a preset and save them in a memory location. The device lock must be held
+
+        :param state: DeviceState
+        :param location: memory location to use. None for a free location, or the least recently used one
+        :return: memory location
+        """
+        if location is None:
+            free = [location for location in self.locations if location not in self._slots]
+            location = free[0] if free else self._slots.popitem(last=False)[0]
+        current = self.device.known_state() or self.device.snapshot()
+        self.device.apply_snapshot(state.with_outputs(current))
+        self.device.save(location)
+        self._slots[location] = content_hash(state)
+        self._persist()
+        return location
+
+    def verify(self) -> list:
+        """
+        Check the content of the tracked memory locations, recalling each one, and forget the locations whose
+        setpoints changed outside the library. The device setpoints are restored afterwards, and the outputs are left
+        as the recalls set them: an output switched off is never switched on again
+
+        :return: a list of the forgotten locations
+        """
+        stale = []
+        with self.device.transaction():
+            current = self.device.snapshot()
+            for location, digest in list(self._slots.items()):
+                self.device.call(location)
+                if content_hash(self.device.snapshot()) != digest:
+                    del self._slots[location]
+                    stale.append(location)
+            self.device.apply_snapshot(current.with_outputs(self.device.snapshot()))
+        self._persist()
+        return stale
+
+    def to_dict(self) -> dict:
+        """
+        Get the presets and the location map as a dictionary
+
+        :return: a dictionary
+        """
+        return {'device': self.device.name,
+                'presets': {name: state.to_dict() for name, state in self.presets.items()},
+                'slots': [[location, digest] for location, digest in self._slots.items()]}
+
+    def load(self):
+        """
+        Load the presets and the location map from the JSON file. The location map is ignored when the file was
+        written for another device
+
+        :return: None
+        """
+        with open(self.path, encoding='utf-8') as file:
+            settings = json.load(file)
+        self.presets = {name: DeviceState.from_dict(state) for name, state in settings['presets'].items()}
+        self._slots.clear()
+        if settings.get('device') == self.device.name:
+            self._slots.update((location, digest) for location, digest in settings['slots']
+                               if location in self.locations)
+
+    def _persist(self):
+        """
+        Write the presets and the location map to the JSON file, if any
+
+        :return: None
+        """
+        if self.path is not None:
+            with open(self.path, 'w', encoding='utf-8') as file:
+                json.dump(self.to_dict(), file, indent=2)
@@ -0,0 +1,253 @@
+"""
+I/O error recovery
+
+When a VISA operation fails, the session is reopened in place and the last known channel selection and setpoints
+are replayed. The failed message is then sent again when repeating it is harmless: queries without side effects, and
+settings with an absolute argument.
+
+The outputs are left as read after the reconnection, so that a power cycled instrument keeps its outputs off. Their
+replay is an explicit opt-in (REPLAY_OUTPUTS), checked against a snapshot of the device.
+"""
+
+import copy
+import threading
+import time
+import pyvisa
+from pyrs import errors
+from pyrs.metrics import Histogram
+
+#: replay levels: the channel selection and setpoints (as replay=True), and the output states too
+REPLAY_SETTINGS, REPLAY_OUTPUTS = 1, 2
+
+#: settings with the same effect when executed once or several times, unless stepped UP or DOWN
+REPEATABLE = ('INST:NSEL', 'INST', 'VOLT', 'CURR', 'VOLT:STEP', 'CURR:STEP', 'APPL', 'OUTP', 'OUTP:STAT',
+              'OUTP:SEL', 'OUTP:GEN', '*CLS', '*ESE', '*SRE', '*WAI')
+#: queries clearing what they read
+DESTRUCTIVE = ('SYST:ERR?', '*ESR?', '*OPC?', 'STAT:QUES?', 'STAT:QUES:EVEN?')
+
+
+def idempotent(message) -> bool:
+    """
+    Tell whether a message can be sent again after an I/O error
+
+    The error queue query ending the messages in checked mode is repeated too: an error it read before the failure
+    is lost.
+
+    :param message: (compound) message string
+    :return: True when every part is a query without side effect or a repeatable setting
+    """
+    parts = message.split(';')
+    if len(parts) > 1 and parts[-1].strip().lstrip(':').upper() == errors.CHECK:
+        parts.pop()
+    for part in parts:
+        header, _, argument = part.strip().lstrip(':').partition(' ')
+        header = header.upper()
+        if header.endswith('?'):
+            if header in DESTRUCTIVE or header.endswith(':EVEN?'):
+                return False
+        elif header not in REPEATABLE or argument.strip().upper() in ('UP', 'DOWN'):
+            return False
+    return True
+
+
+class ReplayError(Exception):
+    """
+    Output states differing from the replayed ones after a recovery. The outputs are switched off
+    """
+
+
+class RecoveryStats:
+    """
+    Recovery counters and durations
+    """
+    def __init__(self):
+        """
+        Create empty statistics
+        """
+        self.failures = 0
+        self.retries = 0
+        self.recoveries = 0
+        self.failed = 0
+        self.replayed = 0
+        self.duration = Histogram()
+
+    def account(self, seconds, replayed):
+        """
+        Account a successful recovery
+
+        :param seconds: time from the failure to the end of the replay
+        :param replayed: number of replayed commands
+        :return: None
+        """
+        self.recoveries += 1
+        self.replayed += replayed
+        self.duration.observe(seconds)
+
+    def to_dict(self) -> dict:
+        """
+        Get the statistics content
+
+        :return: a dictionary
+        """
+        return {'failures': self.failures, 'retries': self.retries, 'recoveries': self.recoveries,
+                'failed': self.failed, 'replayed': self.replayed, 'duration': self.duration.to_dict()}
+
+    def __repr__(self):
+        mean = self.duration.sum / self.duration.count if self.duration.count else 0.0
+        return (f"RecoveryStats(failures={self.failures}, retries={self.retries}, recoveries={self.recoveries}, "
+                f"failed={self.failed}, mean={mean * 1000:.1f} ms)")
+
+
+class Recovery:
+    """
+    Recovery policy of a device
+
+    A failed operation triggers a reconnection, attempted up to retries times with an exponential backoff. The
+    channel selected on the bus is tracked from the written messages; the replayed setpoints come from the shadow
+    state, when enabled and fully known. The outputs are kept as read, unless replay is REPLAY_OUTPUTS.
+    """
+    def __init__(self, retries=3, backoff=0.01, replay=True):
+        """
+        Create a recovery policy
+
+        :param retries: maximum number of reconnections, and of repetitions of a failed message
+        :param backoff: time (in seconds) before the first reconnection, doubled at each attempt
+        :param replay: restore the channel selection and setpoints after a reconnection (True or REPLAY_SETTINGS),
+                       and the output states too (REPLAY_OUTPUTS). False to restore the channel selection only
+        """
+        self.retries = retries
+        self.backoff = backoff
+        self.replay = replay
+        self.channel = None
+        self.owner = None
+        self.busy = False
+        self.stats = RecoveryStats()
+
+    def delay(self, attempt) -> float:
+        """
+        Get the backoff time before a reconnection attempt
+
+        :param attempt: number of failed attempts, from 1
+        :return: time in seconds
+        """
+        return self.backoff * 2 ** (attempt - 1)
+
+    def retry(self, message, attempt) -> bool:
+        """
+        Tell whether a failed message is sent again after the recovery
+
+        :param message: message string
+        :param attempt: number of repetitions already made
+        :return: True to send the message again
+        """
+        return attempt < self.retries and idempotent(message)
+
+    def active(self) -> bool:
+        """
+        Tell whether the calling thread is recovering the session, and must write without the write-behind queue
+
+        :return: True during a recovery
+        """
+        return self.owner == threading.get_ident()
+
+    def run(self, device, message, operation):
+        """
+        Run an I/O operation, recovering the device session from VISA I/O errors. The device lock must be held
+
+        Nested operations are not retried: the outermost one recovers and runs again.
+
+        :param device: HMP2030 device
+        :param message: message sent by the operation
+        :param operation: callable without arguments
+        :return: the operation result
+        """
+        if self.busy:
+            return operation()
+        self.busy = True
+        try:
+            attempt = 0
+            while True:
+                try:
+                    return operation()
+                except pyvisa.errors.VisaIOError:
+                    self.stats.failures += 1
+                    retry = self.retry(message, attempt)
+                    device.recover()
+                    if not retry:
+                        raise
+                    self.stats.retries += 1
+                    attempt += 1
+        finally:
+            self.busy = False
+
+    def recover(self, device, state, checked=False) -> float:
+        """
+        Reopen the device session and replay the last known channel selection and settings. The device lock must be
+        held, and the checked mode disabled
+
+        :param device: HMP2030 device
+        :param state: device shadow state. None to replay the channel selection only
+        :param checked: drain the instrument errors caused by the replay
+        :return: recovery duration in seconds
+        """
+        start = time.perf_counter()
+        shadow = copy.deepcopy(state) if self.replay else None
+        selected = self.channel if self.channel is not None else state and state.channel
+        replayed = 0
+        busy, self.busy = self.busy, True
+        self.owner = threading.get_ident()
+        try:
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    time.sleep(self.delay(attempt))
+                try:
+                    replayed = self._reopen(device, shadow, selected, checked)
+                    break
+                except ReplayError:
+                    self.stats.failed += 1
+                    raise
+                except pyvisa.errors.VisaIOError:
+                    if attempt == self.retries:
+                        self.stats.failed += 1
+                        raise
+        finally:
+            self.owner = None
+            self.busy = busy
+        duration = time.perf_counter() - start
+        self.stats.account(duration, replayed)
+        return duration
+
+    def _reopen(self, device, shadow, selected, checked) -> int:
+        """
+        Reopen the session and replay the settings
+
+        The outputs are kept as read from the device, unless replay is REPLAY_OUTPUTS: the output states are then
+        checked against a snapshot, and all the outputs switched off on a difference. The instrument errors caused by
+        the replay, such as settings the device rejected before the failure, are discarded.
+
+        :param device: HMP2030 device
+        :param shadow: copy of the shadow state before the failure. None to replay nothing
+        :param selected: channel selected on the bus before the failure. None when unknown
+        :param checked: drain the instrument errors caused by the replay
+        :return: number of replayed commands
+        """
+        device.reconnect()
+        replayed = 0
+        if shadow is not None:
+            current = device.snapshot()
+            state = shadow.device_state(current)
+            if self.replay != REPLAY_OUTPUTS:
+                state = state.with_outputs(current)
+            replayed = device.apply_snapshot(state)
+            if self.replay == REPLAY_OUTPUTS:
+                outputs = device.snapshot().outputs()
+                if outputs != state.outputs():
+                    device.send('OUTP:GEN 0')
+                    raise ReplayError(f"outputs {outputs} instead of {state.outputs()} after the replay")
+        if selected is not None:
+            device.send(f'INST:NSEL {selected}')
+        if checked:
+            for _ in range(device.ERROR_QUEUE):
+                if errors.parse(device.exchange(errors.CHECK))[0] == 0:
+                    break
+        return replayed
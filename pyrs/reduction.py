@@ -0,0 +1,322 @@
+"""
+Streaming reduction of measurement series
+
+The stages consume batches of measurement records (time, channel, volt, current), as returned by HMP2030.measure()
+or a measurement stream, and keep a constant state per channel:
+
+- Deadband: change-only recording
+- Pyramid: min/max/mean buckets at several resolutions
+- ThresholdDetector: interpolated threshold crossing times
+"""
+
+import numpy as np
+from pyrs.stream import RingBuffer
+
+#: record type of a bucket: start time, channel, number of samples and min/max/mean of voltage and current
+BUCKET_DTYPE = np.dtype([('time', 'f8'), ('channel', 'u1'), ('count', 'u4'),
+                         ('volt_min', 'f8'), ('volt_max', 'f8'), ('volt_mean', 'f8'),
+                         ('current_min', 'f8'), ('current_max', 'f8'), ('current_mean', 'f8')])
+#: record type of a threshold crossing: interpolated time, channel, measured quantity, threshold and direction
+EVENT_DTYPE = np.dtype([('time', 'f8'), ('channel', 'u1'), ('field', 'U7'), ('level', 'f8'), ('rising', '?')])
+
+
+class Deadband:
+    """
+    Change-only recording
+
+    A record is kept when its voltage or current differs from the last kept record of its channel by more than the
+    deadband, or when the last kept record is older than the heartbeat interval. The cost is proportional to the
+    number of kept records.
+    """
+    def __init__(self, volt=0.01, current=0.001, interval=None):
+        """
+        Create a deadband filter
+
+        :param volt: voltage deadband in volt
+        :param current: current deadband in Ampere
+        :param interval: maximum time (in seconds) between kept records. None for no heartbeat
+        """
+        self.volt = volt
+        self.current = current
+        self.interval = interval
+        self._last = {}
+
+    def reset(self):
+        """
+        Forget the last kept records, so that the next record of each channel is kept
+
+        :return: None
+        """
+        self._last.clear()
+
+    def update(self, records):
+        """
+        Filter a batch of records
+
+        :param records: array of records (time, channel, volt, current)
+        :return: array of the kept records
+        """
+        keep = np.zeros(len(records), dtype=bool)
+        for channel in np.unique(records['channel']):
+            index = np.flatnonzero(records['channel'] == channel)
+            part = records[index]
+            last = self._last.get(channel)
+            start = 0
+            if last is None:
+                keep[index[0]] = True
+                last, start = part[0], 1
+            while start < len(part):
+                rest = part[start:]
+                exceed = ((np.abs(rest['volt'] - last['volt']) > self.volt) |
+                          (np.abs(rest['current'] - last['current']) > self.current))
+                if self.interval is not None:
+                    exceed |= rest['time'] - last['time'] >= self.interval
+                if not exceed.any():
+                    break
+                start += int(np.argmax(exceed))
+                keep[index[start]] = True
+                last = part[start]
+                start += 1
+            self._last[channel] = last.copy()
+        return records[keep]
+
+
+def to_buckets(records):
+    """
+    Convert measurement records to single sample buckets
+
+    :param records: array of records (time, channel, volt, current)
+    :return: array of buckets
+    """
+    buckets = np.empty(len(records), dtype=BUCKET_DTYPE)
+    buckets['time'] = records['time']
+    buckets['channel'] = records['channel']
+    buckets['count'] = 1
+    for name in ('volt', 'current'):
+        for suffix in ('min', 'max', 'mean'):
+            buckets[f'{name}_{suffix}'] = records[name]
+    return buckets
+
+
+class Resolution:
+    """
+    Buckets of a fixed duration, aggregated incrementally
+
+    The completed buckets are kept in a ring buffer, the bucket in progress of each channel apart.
+    """
+    def __init__(self, width, size):
+        """
+        Create a resolution level
+
+        :param width: bucket duration in seconds
+        :param size: number of completed buckets kept, all channels included
+        """
+        self.width = width
+        self.buffer = RingBuffer(size, BUCKET_DTYPE)
+        self._partial = {}
+
+    def _merge(self, buckets):
+        """
+        Merge consecutive buckets of a channel falling in the same bucket of this level
+
+        :param buckets: array of buckets of one channel, in time order
+        :return: array of merged buckets
+        """
+        key = np.floor(buckets['time'] / self.width)
+        starts = np.flatnonzero(np.concatenate(([True], key[1:] != key[:-1])))
+        merged = np.empty(len(starts), dtype=BUCKET_DTYPE)
+        merged['time'] = key[starts] * self.width
+        merged['channel'] = buckets['channel'][starts]
+        merged['count'] = np.add.reduceat(buckets['count'], starts)
+        for name in ('volt', 'current'):
+            merged[f'{name}_min'] = np.minimum.reduceat(buckets[f'{name}_min'], starts)
+            merged[f'{name}_max'] = np.maximum.reduceat(buckets[f'{name}_max'], starts)
+            merged[f'{name}_mean'] = (np.add.reduceat(buckets[f'{name}_mean'] * buckets['count'], starts) /
+                                      merged['count'])
+        return merged
+
+    def update(self, buckets):
+        """
+        Aggregate finer buckets
+
+        :param buckets: array of buckets, in time order per channel
+        :return: array of the buckets completed by the update
+        """
+        completed = []
+        for channel in np.unique(buckets['channel']):
+            part = buckets[buckets['channel'] == channel]
+            if channel in self._partial:
+                part = np.concatenate((self._partial[channel][np.newaxis], part))
+            merged = self._merge(part)
+            self._partial[channel] = merged[-1].copy()
+            completed.append(merged[:-1])
+        if not completed:
+            return np.empty(0, dtype=BUCKET_DTYPE)
+        completed = np.concatenate(completed)
+        completed = completed[np.argsort(completed['time'], kind='stable')]
+        self.buffer.append(completed)
+        return completed
+
+    def buckets(self, channel=None, partial=True):
+        """
+        Get the kept buckets
+
+        :param channel: channel number. None for all channels
+        :param partial: include the buckets in progress
+        :return: array of buckets, in time order
+        """
+        buckets = self.buffer.array()
+        if partial and self._partial:
+            buckets = np.concatenate((buckets, np.array(list(self._partial.values()), dtype=BUCKET_DTYPE)))
+        if channel is not None:
+            buckets = buckets[buckets['channel'] == channel]
+        return buckets[np.argsort(buckets['time'], kind='stable')]
+
+
+class Pyramid:
+    """
+    Min/max/mean buckets at several resolutions
+
+    The finest level aggregates the samples, and each coarser level aggregates the completed buckets of the level
+    below it, so every sample is processed once.
+    """
+    def __init__(self, widths=(1.0, 10.0, 60.0, 600.0), size=10000):
+        """
+        Create a pyramid
+
+        :param widths: bucket durations in seconds, from the finest. Each one a multiple of the previous one
+        :param size: number of completed buckets kept per level
+        """
+        for finer, coarser in zip(widths, widths[1:]):
+            ratio = coarser / finer
+            if ratio < 1 or abs(ratio - round(ratio)) > 1e-9:
+                raise ValueError(f"bucket width {coarser} is not a multiple of {finer}")
+        self.levels = [Resolution(width, size) for width in widths]
+
+    def update(self, records):
+        """
+        Aggregate a batch of records
+
+        :param records: array of records (time, channel, volt, current)
+        :return: None
+        """
+        buckets = to_buckets(records)
+        for level in self.levels:
+            buckets = level.update(buckets)
+            if buckets.size == 0:
+                break
+
+    def buckets(self, duration=None, channel=None):
+        """
+        Get the buckets of the finest level covering a duration
+
+        :param duration: time span (in seconds) to cover. None for the finest level
+        :param channel: channel number. None for all channels
+        :return: array of buckets, in time order
+        """
+        for level in self.levels:
+            buckets = level.buckets(channel)
+            if duration is None or (len(buckets) and buckets['time'][-1] - buckets['time'][0] >= duration):
+                break
+        return buckets[buckets['time'] >= buckets['time'][-1] - duration] if duration and len(buckets) else buckets
+
+
+class ThresholdDetector:
+    """
+    Threshold crossing detection
+
+    Each crossing time is interpolated between the two samples around it, including across batches.
+    """
+    def __init__(self, thresholds):
+        """
+        Create a detector
+
+        :param thresholds: a list of (channel, field, level) tuples, field being volt or current
+        """
+        self.thresholds = list(thresholds)
+        self._last = {}
+
+    def reset(self):
+        """
+        Forget the last samples, so that no crossing is detected across the next batch boundary
+
+        :return: None
+        """
+        self._last.clear()
+
+    def update(self, records):
+        """
+        Detect the crossings in a batch of records
+
+        :param records: array of records (time, channel, volt, current)
+        :return: array of events, in time order
+        """
+        events = []
+        for index, (channel, field, level) in enumerate(self.thresholds):
+            part = records[records['channel'] == channel]
+            if part.size == 0:
+                continue
+            times, values = part['time'], part[field]
+            if index in self._last:
+                times = np.concatenate(([self._last[index][0]], times))
+                values = np.concatenate(([self._last[index][1]], values))
+            self._last[index] = (times[-1], values[-1])
+            above = values > level
+            crossing = np.flatnonzero(above[1:] != above[:-1])
+            found = np.empty(len(crossing), dtype=EVENT_DTYPE)
+            before, after = values[crossing], values[crossing + 1]
+            found['time'] = times[crossing] + (level - before) / (after - before) * (times[crossing + 1] -
+                                                                                     times[crossing])
+            found['channel'] = channel
+            found['field'] = field
+            found['level'] = level
+            found['rising'] = above[crossing + 1]
+            events.append(found)
+        if not events:
+            return np.empty(0, dtype=EVENT_DTYPE)
+        events = np.concatenate(events)
+        return events[np.argsort(events['time'], kind='stable')]
+
+
+class Reducer:
+    """
+    Measurement reduction pipeline, feeding each batch to the configured stages::
+
+        reducer = Reducer(Deadband(0.01, 0.001), Pyramid(), ThresholdDetector([(1, 'current', 0.5)]))
+        for records in device.stream_measurements([1, 2], rate=50):
+            changes, events = reducer.update(records)
+    """
+    def __init__(self, deadband=None, pyramid=None, detector=None):
+        """
+        Create a reducer
+
+        :param deadband: Deadband stage. None keeps every record
+        :param pyramid: Pyramid stage. None for no buckets
+        :param detector: ThresholdDetector stage. None for no events
+        """
+        self.deadband = deadband
+        self.pyramid = pyramid
+        self.detector = detector
+
+    def reset(self):
+        """
+        Reset the deadband and detector states, after a gap in the series
+
+        :return: None
+        """
+        for stage in (self.deadband, self.detector):
+            if stage is not None:
+                stage.reset()
+
+    def update(self, records):
+        """
+        Reduce a batch of records
+
+        :param records: array of records (time, channel, volt, current)
+        :return: the kept records and the threshold events
+        """
+        if self.pyramid is not None:
+            self.pyramid.update(records)
+        events = self.detector.update(records) if self.detector is not None else np.empty(0, dtype=EVENT_DTYPE)
+        changes = self.deadband.update(records) if self.deadband is not None else records
+        return changes, events
@@ -0,0 +1,258 @@
+"""
+Closed-loop regulation of a channel output
+
+A regulator holds a channel at a target current, or at a target load voltage compensating the voltage drop in the
+leads (software remote sense), by adjusting the channel voltage setpoint with a PI controller.
+"""
+
+import math
+import threading
+import time
+from typing import NamedTuple
+from pyrs.arb import VOLT_RANGE
+
+#: regulated quantities
+MODES = ('current', 'voltage')
+
+
+class PIController:
+    """
+    Proportional-integral controller with output limits and slew rate cap
+
+    The integral term is frozen while the output is saturated (anti-windup).
+    """
+    def __init__(self, kp, ki, limits, slew=None):
+        """
+        Create a controller
+
+        :param kp: proportional gain, in volt per unit of error
+        :param ki: integral gain, in volt per unit of error and second
+        :param limits: (minimum, maximum) output voltage, within VOLT_RANGE. There is no default: the controller may
+                       drive the channel up to the maximum
+        :param slew: maximum output change in volt per second. None does not limit the slew rate
+        :raise ValueError: when the limits are not an interval of VOLT_RANGE
+        """
+        if not VOLT_RANGE[0] <= limits[0] <= limits[1] <= VOLT_RANGE[1]:
+            raise ValueError(f"invalid output limits {limits}, expected an interval of {VOLT_RANGE}")
+        self.kp = kp
+        self.ki = ki
+        self.limits = limits
+        self.slew = slew
+        self.output = limits[0]
+        self.saturated = False
+        self._integral = limits[0]
+
+    def reset(self, output):
+        """
+        Start from an output value, for a bumpless start
+
+        :param output: current output voltage
+        :return: None
+        """
+        self.output = self._integral = min(max(output, self.limits[0]), self.limits[1])
+        self.saturated = False
+
+    def update(self, error, dt) -> float:
+        """
+        Compute the next output
+
+        :param error: target minus measured value
+        :param dt: time (in seconds) since the previous update
+        :return: output voltage
+        """
+        integral = self._integral + self.ki * error * dt
+        output = self.kp * error + integral
+        low, high = self.limits
+        if self.slew is not None:
+            low, high = max(low, self.output - self.slew * dt), min(high, self.output + self.slew * dt)
+        self.saturated = not low <= output <= high
+        if not self.saturated:
+            self._integral = integral
+        self.output = min(max(output, low), high)
+        return self.output
+
+
+class Target(NamedTuple):
+    """
+    Regulated quantity and its target value
+    """
+    #: target current in Ampere, or load voltage in volt
+    value: float
+    #: regulated quantity: current or voltage
+    mode: str = 'current'
+    #: lead resistance (in ohm) compensated in voltage mode
+    resistance: float = 0.0
+
+    def measured(self, volt, current) -> float:
+        """
+        Get the regulated quantity
+
+        :param volt: measured channel voltage
+        :param current: measured channel current
+        :return: current, or compensated load voltage
+        """
+        if self.mode == 'current':
+            return current
+        return volt - current * self.resistance
+
+
+class RegulationStats:
+    """
+    Regulation loop statistics
+    """
+    def __init__(self):
+        """
+        Create empty statistics
+        """
+        self.start = time.monotonic()
+        self.iterations = 0
+        self.saturated = 0
+        self.error = 0.0
+        self.max_error = 0.0
+        self._square = 0.0
+
+    def account(self, error, saturated):
+        """
+        Account a loop iteration
+
+        :param error: tracking error
+        :param saturated: the controller output was limited
+        :return: None
+        """
+        self.iterations += 1
+        self.saturated += bool(saturated)
+        self.error = error
+        self.max_error = max(self.max_error, abs(error))
+        self._square += error * error
+
+    @property
+    def rate(self) -> float:
+        """
+        Get the achieved loop rate
+
+        :return: iterations per second
+        """
+        elapsed = time.monotonic() - self.start
+        return self.iterations / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def rms_error(self) -> float:
+        """
+        Get the root mean square tracking error
+
+        :return: RMS error
+        """
+        return math.sqrt(self._square / self.iterations) if self.iterations else 0.0
+
+    def to_dict(self) -> dict:
+        """
+        Get the statistics
+
+        :return: a dictionary
+        """
+        return {'iterations': self.iterations, 'rate': self.rate, 'error': self.error, 'rms_error': self.rms_error,
+                'max_error': self.max_error, 'saturated': self.saturated}
+
+    def __repr__(self):
+        return f"RegulationStats(iterations={self.iterations}, rate={self.rate:.1f}, " \
+               f"rms_error={self.rms_error:.4g}, saturated={self.saturated})"
+
+
+class Regulator:
+    """
+    Regulation loop running on a dedicated thread
+
+    Each iteration is a single message, setting the voltage computed from the previous measurement and measuring
+    the channel voltage and current::
+
+        with device.regulate(1, 0.5, PIController(kp=2.0, ki=20.0, limits=(0, 12), slew=5.0)) as regulator:
+            time.sleep(60)
+        print(regulator.stats)
+    """
+    def __init__(self, device, channel, target, controller, *, mode='current', rate=None, resistance=0.0):
+        """
+        Create a regulator
+
+        :param device: HMP2030 device
+        :param channel: channel number (1,2,3)
+        :param target: target current in Ampere, or load voltage in volt
+        :param controller: PIController computing the channel voltage
+        :param mode: regulated quantity: current or voltage
+        :param rate: loop rate in Hz. None runs as fast as the link allows
+        :param resistance: lead resistance (in ohm) compensated in voltage mode
+        """
+        if mode not in MODES:
+            raise ValueError(f"invalid regulation mode '{mode}', expected one of {MODES}")
+        self.channel = device.ch(channel)
+        self.target = Target(target, mode, resistance)
+        self.controller = controller
+        self.stats = RegulationStats()
+        self.error = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(1.0 / rate if rate else None,),
+                                        name=f'pyrs-regulator-{channel}', daemon=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @property
+    def running(self) -> bool:
+        """
+        Check whether the loop is running
+
+        :return: True while running
+        """
+        return self._thread.is_alive()
+
+    def start(self):
+        """
+        Start the regulation loop
+
+        :return: None
+        """
+        self.controller.reset(float(self.channel.device.query_channel(self.channel.number, 'VOLT?')))
+        self.stats = RegulationStats()
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stop the regulation loop, leaving the last voltage setpoint
+
+        :param timeout: maximum time (in seconds) to wait for the loop. None waits forever
+        :return: None
+        :raise: the error which stopped the loop, if any
+        """
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def _run(self, period):
+        """
+        Run the regulation loop until stopped
+
+        :param period: loop period in seconds. None runs as fast as the link allows
+        :return: None
+        """
+        device, channel = self.channel.device, self.channel.number
+        previous = deadline = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                response = device.query(f'INST:NSEL {channel};:VOLT {self.controller.output:.3f};'
+                                        f':MEAS:VOLT?;:MEAS:CURR?')
+                volt, current = (float(value) for value in response.split(';'))
+                now = time.monotonic()
+                error = self.target.value - self.target.measured(volt, current)
+                self.controller.update(error, now - previous)
+                self.stats.account(error, self.controller.saturated)
+                previous = now
+                if period is not None:
+                    deadline = max(deadline + period, now)
+                    self._stop.wait(deadline - now)
+        except Exception as error:  # pylint: disable=broad-except
+            self.error = error
@@ -0,0 +1,168 @@
+"""
+Process-wide VISA resource managers, and instrument sessions
+"""
+
+import threading
+import time
+import pyvisa
+
+_MANAGERS = {}
+_LOCK = threading.Lock()
+
+
+def resource_manager(library):
+    """
+    Get the resource manager of a VISA library, created on first use and shared by the whole process
+
+    :param library: Path on VISA backend library
+    :return: pyvisa ResourceManager
+    """
+    with _LOCK:
+        rm = _MANAGERS.get(library)
+        if rm is None:
+            rm = _MANAGERS[library] = pyvisa.ResourceManager(visa_library=library)
+        return rm
+
+
+def release(library=None):
+    """
+    Close shared resource managers, and their opened resources
+
+    :param library: Path on VISA backend library. None for all libraries
+    :return: None
+    """
+    with _LOCK:
+        libraries = list(_MANAGERS) if library is None else [library]
+        for name in libraries:
+            rm = _MANAGERS.pop(name, None)
+            if rm is not None:
+                rm.close()
+
+
+class Session:
+    """
+    VISA session of an instrument
+
+    The session paces the I/O: after a slow command, the next write or read waits until the instrument is ready. The
+    traffic is accounted in an Instrumentation, when enabled.
+    """
+    def __init__(self, manager, name, timeout=2000, delay=None):
+        """
+        Create a closed session
+
+        :param manager: pyvisa ResourceManager
+        :param name: VISA resource name
+        :param timeout: VISA I/O timeout in milliseconds
+        :param delay: fixed delay (in seconds) before each read. None reads as soon as the response is available
+        """
+        self.manager = manager
+        self.name = name
+        self.instr = None
+        self.delay = delay
+        self.metrics = None
+        self._timeout = timeout
+        self._ready = 0.0
+
+    def open(self):
+        """
+        Open the VISA session
+
+        :return: None
+        """
+        self.instr = self.manager.open_resource(self.name)
+        self.instr.timeout = self.timeout
+        self.instr.read_termination = '\n'
+        self.instr.write_termination = '\n'
+
+    def close(self):
+        """
+        Close the VISA session
+
+        :return: None
+        """
+        self.instr.close()
+
+    def reconnect(self):
+        """
+        Reopen a dropped VISA session, keeping the resource manager
+
+        :return: None
+        """
+        try:
+            self.instr.close()
+        except pyvisa.errors.VisaIOError:
+            pass
+        self._ready = 0.0
+        self.open()
+
+    @property
+    def timeout(self) -> int:
+        """
+        Get the VISA I/O timeout
+
+        :return: timeout in milliseconds
+        """
+        return self._timeout
+
+    @timeout.setter
+    def timeout(self, milliseconds):
+        """
+        Set the VISA I/O timeout, kept across reconnections
+
+        :param milliseconds: timeout in milliseconds
+        :return: None
+        """
+        self._timeout = milliseconds
+        if self.instr is not None:
+            self.instr.timeout = milliseconds
+
+    def _hold(self):
+        """
+        Wait until the instrument is ready after a slow command
+
+        :return: time waited, in seconds
+        """
+        remaining = self._ready - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+            return remaining
+        return 0.0
+
+    def write(self, message, busy=0.0):
+        """
+        Write a message
+
+        :param message: message string
+        :param busy: time (in seconds) the instrument needs to process the message before the next I/O
+        :return: None
+        """
+        wait = self._hold()
+        if self.metrics is None:
+            self.instr.write(message)
+        else:
+            start = time.perf_counter()
+            self.instr.write(message)
+            self.metrics.write(message, wait, time.perf_counter() - start, len(message) + 1)
+        if busy:
+            self._ready = time.monotonic() + busy
+
+    def read(self, delay=None):
+        """
+        Read a response
+
+        :param delay: fixed delay (in seconds) before read. None uses the session delay
+        :return: response string
+        """
+        if delay is None:
+            delay = self.delay
+        if delay:
+            time.sleep(delay)
+            wait = delay
+        else:
+            wait = self._hold()
+        if self.metrics is None:
+            return self.instr.read().strip()
+        start = time.perf_counter()
+        response = self.instr.read()
+        self.metrics.read(wait, time.perf_counter() - start, len(response))
+        return response.strip()
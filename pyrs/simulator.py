@@ -0,0 +1,703 @@
+"""
+HMP2030 Power supply simulator
+
+The simulator replaces the VISA resource of an HMP2030 object::
+
+    device = HMP2030('SIM::HMP2030', resource_manager=SimulatedResourceManager(latency=0.002))
+"""
+
+import random
+import re
+import threading
+import time
+from pyvisa import constants, errors
+
+
+class SimulatedArb:
+    """
+    Simulated ARB table
+    """
+    def __init__(self, points=(), repetitions=1):
+        """
+        Create an ARB table
+
+        :param points: a list of (volt, current, dwell) points
+        :param repetitions: number of repetitions. 0 repeats forever
+        """
+        self.points = list(points)
+        self.repetitions = repetitions
+        self.start = None
+
+    def play(self):
+        """
+        Start playing the table
+
+        :return: None
+        """
+        self.start = time.monotonic()
+
+    def setpoints(self):
+        """
+        Get the voltage and current of the playing point
+
+        :return: voltage and current
+        """
+        elapsed = time.monotonic() - self.start
+        total = sum(dwell for _, _, dwell in self.points)
+        if not self.repetitions or elapsed < total * self.repetitions:
+            elapsed %= total
+            for volt, current, dwell in self.points:
+                if elapsed < dwell:
+                    return volt, current
+                elapsed -= dwell
+        return self.points[-1][0], self.points[-1][1]
+
+
+class SimulatedChannel:
+    """
+    Simulated output channel, driving a resistive load
+    """
+    def __init__(self, load=100.0):
+        """
+        Create a channel in its reset state
+
+        :param load: load resistance in Ohm
+        """
+        self.load = load
+        self.volt = 0.0
+        self.current = 0.1
+        self.volt_step = 1.0
+        self.current_step = 0.1
+        self.output = False
+        self.arb = None
+
+    def setpoints(self):
+        """
+        Get the voltage and current setpoints, following the running ARB sequence if any
+
+        :return: voltage and current
+        """
+        if self.arb is None or self.arb.start is None:
+            return self.volt, self.current
+        return self.arb.setpoints()
+
+    def settings(self):
+        """
+        Get the channel settings, as saved in a memory location
+
+        :return: a tuple of settings
+        """
+        return self.volt, self.current, self.volt_step, self.current_step
+
+    def restore(self, settings):
+        """
+        Restore settings saved in a memory location
+
+        :param settings: a tuple of settings
+        :return: None
+        """
+        self.volt, self.current, self.volt_step, self.current_step = settings
+
+
+class SimulatedHMP2030:  # pylint: disable=too-many-instance-attributes
+    """
+    Simulated HMP2030 VISA resource
+
+    The simulator models 3 channels (setpoints, steps, outputs), the general output, the 10 memory locations, the
+    standard event status register and the error queue. Each write costs a programmable latency, plus a per-command
+    latency and a random jitter, and the I/O traffic is counted.
+    """
+    #: voltage and current ranges of a channel
+    VOLT_RANGE = (0.0, 32.05)
+    CURRENT_RANGE = (0.0, 5.0)
+    #: error queue size
+    QUEUE_SIZE = 16
+    #: long form of the command mnemonics
+    LONG_FORMS = {
+        'INSTRUMENT': 'INST', 'NSELECT': 'NSEL', 'SELECT': 'SEL', 'MEASURE': 'MEAS', 'SCALAR': 'SCAL',
+        'VOLTAGE': 'VOLT', 'CURRENT': 'CURR', 'OUTPUT': 'OUTP', 'STATE': 'STAT', 'GENERAL': 'GEN', 'SYSTEM': 'SYST',
+        'ERROR': 'ERR', 'VERSION': 'VERS', 'APPLY': 'APPL', 'SOURCE': 'SOUR', 'CLEAR': 'CLE', 'REPETITIONS': 'REP',
+        'TRANSFER': 'TRAN', 'START': 'STAR', 'STATUS': 'STAT', 'QUESTIONABLE': 'QUES', 'CONDITION': 'COND',
+    }
+    #: maximum number of ARB points
+    ARB_POINTS = 128
+
+    def __init__(self, name='SIM::HMP2030', latency=0.0, jitter=0.0, latencies=None):
+        """
+        Create a simulated instrument in its reset state
+
+        :param name: resource name
+        :param latency: time (in seconds) spent by each write
+        :param jitter: maximum random time (in seconds) added to each write
+        :param latencies: additional time (in seconds) per command header, e.g. {'MEAS:VOLT': 0.01}
+        """
+        self.resource_name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.latencies = latencies or {}
+        self.timeout = 2000
+        self.read_termination = '\n'
+        self.write_termination = '\n'
+        self.channels = {}
+        self.memories = {}
+        self.errors = []
+        self.counters = {'writes': 0, 'reads': 0, 'bytes_written': 0, 'bytes_read': 0}
+        self.selected = 1
+        self.general = False
+        self.esr = 0
+        self.enable = {'ESE': 0, 'SRE': 0}
+        self.events = set()
+        self.arb = SimulatedArb()
+        self._responses = []
+        self._lock = threading.Lock()
+        self.connected = True
+        self._offline = 0.0
+        self.reset()
+
+    def reset(self):
+        """
+        Reset the instrument state (*RST)
+
+        :return: None
+        """
+        self.channels = {i: SimulatedChannel() for i in (1, 2, 3)}
+        self.selected = 1
+        self.general = False
+        self.esr = 0
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # VISA resource interface
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def write(self, message):
+        """
+        Process a (compound) message
+
+        :param message: message string
+        :return: number of bytes written
+        """
+        with self._lock:
+            self._check_connection()
+            self.counters['writes'] += 1
+            self.counters['bytes_written'] += len(message) + len(self.write_termination)
+            responses = []
+            delay = self.latency + random.uniform(0, self.jitter)
+            for part in message.strip().split(';'):
+                header, _, argument = part.strip().partition(' ')
+                header = self.normalize(header)
+                delay += self.latencies.get(header.rstrip('?'), 0)
+                response = self.execute(header, argument.strip())
+                if response is not None:
+                    responses.append(response)
+            if responses:
+                self._responses.append(';'.join(responses))
+        if delay > 0:
+            time.sleep(delay)
+        return len(message)
+
+    def read(self):
+        """
+        Read the next response
+
+        :return: response string
+        """
+        with self._lock:
+            self._check_connection()
+            if not self._responses:
+                self.esr |= 0x04
+                raise errors.VisaIOError(constants.StatusCode.error_timeout)
+            response = self._responses.pop(0) + self.read_termination
+            self.counters['reads'] += 1
+            self.counters['bytes_read'] += len(response)
+            return response
+
+    def query(self, message):
+        """
+        Send a query and read its response
+
+        :param message: query string
+        :return: response string
+        """
+        self.write(message)
+        return self.read()
+
+    def enable_event(self, event_type, mechanism):
+        """
+        Enable the queuing of an event type
+
+        :param event_type: pyvisa EventType
+        :param mechanism: pyvisa EventMechanism. Only the queue mechanism is supported
+        :return: None
+        """
+        if mechanism != constants.EventMechanism.queue:
+            raise errors.VisaIOError(constants.StatusCode.error_nonsupported_mechanism)
+        self.events.add(event_type)
+
+    def disable_event(self, event_type, _):
+        """
+        Disable the queuing of an event type
+
+        :param event_type: pyvisa EventType
+        :return: None
+        """
+        self.events.discard(event_type)
+
+    def discard_events(self, event_type, mechanism):
+        """
+        Discard the queued events. The simulated events are not queued: a service request is pending as long as the
+        status byte requests it
+
+        :param event_type: pyvisa EventType
+        :param mechanism: pyvisa EventMechanism
+        :return: None
+        """
+
+    def wait_on_event(self, event_type, timeout):
+        """
+        Wait for an event
+
+        The simulated instrument executes the commands on write, so a service request is either already pending or
+        never raised.
+
+        :param event_type: pyvisa EventType. Only service requests are raised
+        :param timeout: maximum wait time in milliseconds
+        :return: None
+        """
+        if event_type not in self.events:
+            raise errors.VisaIOError(constants.StatusCode.error_not_enabled)
+        with self._lock:
+            self._check_connection()
+            if event_type == constants.EventType.service_request and self.status_byte() & 0x40:
+                return
+        time.sleep(timeout / 1000)
+        raise errors.VisaIOError(constants.StatusCode.error_timeout)
+
+    def close(self):
+        """
+        Close the resource
+
+        :return: None
+        """
+
+    def _check_connection(self):
+        """
+        Fail the I/O of a lost session
+
+        :return: None
+        """
+        if not self.connected:
+            raise errors.VisaIOError(constants.StatusCode.error_connection_lost)
+
+    def reopen(self):
+        """
+        Open a new session, once the instrument is back online
+
+        :return: None
+        """
+        with self._lock:
+            if time.monotonic() < self._offline:
+                raise errors.VisaIOError(constants.StatusCode.error_resource_not_found)
+            self.connected = True
+            self._responses = []
+
+    def disconnect(self, duration=0.0, power_cycle=False):
+        """
+        Drop the session, as on a USB link loss: the I/O fail until the resource is opened again
+
+        :param duration: time (in seconds) during which the resource cannot be opened
+        :param power_cycle: reset the settings and outputs, keeping the memory locations
+        :return: None
+        """
+        with self._lock:
+            self.connected = False
+            self._offline = time.monotonic() + duration
+            if power_cycle:
+                self.reset()
+                self.errors = []
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # Front panel
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def front_panel(self, channel, **settings):
+        """
+        Change channel settings from the front panel
+
+        :param channel: channel number
+        :param settings: SimulatedChannel attributes (volt, current, volt_step, current_step, output)
+        :return: None
+        """
+        with self._lock:
+            for name, value in settings.items():
+                setattr(self.channels[channel], name, value)
+            self.esr |= 0x40
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # Command processing
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def normalize(self, header):
+        """
+        Get the short upper case form of a command header
+
+        :param header: command header
+        :return: command header
+        """
+        query = '?' if header.endswith('?') else ''
+        nodes = header.strip(':?').upper().split(':')
+        nodes = [self.LONG_FORMS.get(node, node) for node in nodes]
+        if nodes[0] == 'SOUR':
+            nodes = nodes[1:]
+        if nodes[:2] == ['MEAS', 'SCAL']:
+            nodes = ['MEAS'] + nodes[2:]
+        return ':'.join(nodes) + query
+
+    def error(self, code, message):
+        """
+        Push an error in the error queue
+
+        :param code: SCPI error code
+        :param message: error message
+        :return: None
+        """
+        if len(self.errors) >= self.QUEUE_SIZE:
+            self.errors[-1] = (-350, 'Queue overflow')
+        else:
+            self.errors.append((code, message))
+        if -200 < code <= -100:
+            self.esr |= 0x20
+        elif -300 < code <= -200:
+            self.esr |= 0x10
+        else:
+            self.esr |= 0x08
+
+    def execute(self, header, argument):
+        """
+        Execute a single command
+
+        :param header: short upper case command header
+        :param argument: command argument
+        :return: response string of a query, otherwise None
+        """
+        handler = self.COMMON.get(header) or self.COMMANDS.get(header)
+        match = re.fullmatch(r'STAT:QUES:INST:ISUM([123]):COND\?', header)
+        if match is not None:
+            return str(self.questionable(self.channels[int(match.group(1))]))
+        if handler is None:
+            match = re.fullmatch(r'(VOLT|CURR)(:STEP)?(\?)?', header)
+            if match is None:
+                self.error(-113, 'Undefined header')
+                return None
+            return self.setpoint(match.group(1), bool(match.group(2)), bool(match.group(3)), argument)
+        return handler(self, argument)
+
+    def number(self, argument, value, step, limits):
+        """
+        Parse a numeric argument
+
+        :param argument: argument string (number, MIN, MAX, UP, DOWN)
+        :param value: current value
+        :param step: step value
+        :param limits: (minimum, maximum) tuple
+        :return: new value, or None when the argument is invalid
+        """
+        keywords = {'MIN': limits[0], 'MAX': limits[1], 'UP': min(value + step, limits[1]),
+                    'DOWN': max(value - step, limits[0])}
+        keyword = argument.upper()[:4].rstrip('I')
+        if keyword in keywords:
+            return keywords[keyword]
+        try:
+            number = float(argument)
+        except ValueError:
+            self.error(-104, 'Data type error')
+            return None
+        if not limits[0] <= number <= limits[1]:
+            self.error(-222, 'Data out of range')
+            return None
+        return number
+
+    def setpoint(self, name, step, query, argument):
+        """
+        Execute a VOLT/CURR setpoint or step command
+
+        :param name: VOLT or CURR
+        :param step: True for the step value
+        :param query: True for a query
+        :param argument: command argument
+        :return: response string of a query, otherwise None
+        """
+        channel = self.channels[self.selected]
+        attribute = ('volt' if name == 'VOLT' else 'current') + ('_step' if step else '')
+        limits = self.VOLT_RANGE if name == 'VOLT' else self.CURRENT_RANGE
+        digits = 3 if name == 'VOLT' else 4
+        if query:
+            return f"{getattr(channel, attribute):.{digits}f}"
+        if step:
+            value = self.number(argument, getattr(channel, attribute), 0.0, limits)
+        else:
+            value = self.number(argument, getattr(channel, attribute), getattr(channel, f'{attribute}_step'), limits)
+        if value is not None:
+            setattr(channel, attribute, value)
+        return None
+
+    def measure(self, channel):
+        """
+        Compute the output voltage and current of a channel
+
+        :param channel: SimulatedChannel object
+        :return: voltage and current
+        """
+        if not (channel.output and self.general):
+            return 0.0, 0.0
+        volt, limit = channel.setpoints()
+        current = volt / channel.load
+        if current > limit:
+            return limit * channel.load, limit
+        return volt, current
+
+    def questionable(self, channel):
+        """
+        Compute the questionable condition of a channel
+
+        :param channel: SimulatedChannel object
+        :return: condition register value (bit 0: constant current, bit 1: constant voltage)
+        """
+        if not (channel.output and self.general):
+            return 0
+        volt, limit = channel.setpoints()
+        return 0x01 if volt / channel.load > limit else 0x02
+
+    def status_byte(self):
+        """
+        Compute the status byte
+
+        :return: status byte value
+        """
+        stb = 0x04 if self.errors else 0
+        stb |= 0x10 if self._responses else 0
+        stb |= 0x20 if self.esr & self.enable['ESE'] else 0
+        return stb | (0x40 if stb & self.enable['SRE'] else 0)
+
+    def _idn(self, _):
+        return 'HAMEG,HMP2030,000000000,HW50020001/SW2.51'
+
+    def _rst(self, _):
+        self.reset()
+
+    def _cls(self, _):
+        self.errors.clear()
+        self.esr = 0
+
+    def _esr(self, _):
+        esr, self.esr = self.esr, 0
+        return str(esr)
+
+    def _opc(self, _):
+        self.esr |= 0x01
+
+    def _opc_query(self, _):
+        return '1'
+
+    def _stb(self, _):
+        return str(self.status_byte())
+
+    def _ese(self, argument):
+        self.enable['ESE'] = int(argument) & 0xff if argument.isdigit() else self.enable['ESE']
+
+    def _ese_query(self, _):
+        return str(self.enable['ESE'])
+
+    def _sre(self, argument):
+        self.enable['SRE'] = int(argument) & 0xbf if argument.isdigit() else self.enable['SRE']
+
+    def _sre_query(self, _):
+        return str(self.enable['SRE'])
+
+    def _sav(self, argument):
+        if argument not in [str(i) for i in range(10)]:
+            self.error(-222, 'Data out of range')
+            return
+        self.memories[int(argument)] = {i: channel.settings() for i, channel in self.channels.items()}
+
+    def _rcl(self, argument):
+        if argument not in [str(i) for i in range(10)]:
+            self.error(-222, 'Data out of range')
+            return
+        for i, settings in self.memories.get(int(argument), {}).items():
+            self.channels[i].restore(settings)
+
+    def _beep(self, _):
+        pass
+
+    def _version(self, _):
+        return '1999.0'
+
+    def _error(self, _):
+        if not self.errors:
+            return '0,"No error"'
+        code, message = self.errors.pop(0)
+        return f'{code},"{message}"'
+
+    def _inst(self, _):
+        return f'OUTP{self.selected}'
+
+    def _nsel(self, argument):
+        if argument not in ('1', '2', '3'):
+            self.error(-222, 'Data out of range')
+            return
+        self.selected = int(argument)
+
+    def _meas_volt(self, _):
+        return f"{self.measure(self.channels[self.selected])[0]:.3f}"
+
+    def _meas_curr(self, _):
+        return f"{self.measure(self.channels[self.selected])[1]:.4f}"
+
+    def _outp(self, _):
+        return '1' if self.channels[self.selected].output and self.general else '0'
+
+    def _outp_stat(self, argument):
+        state = self.state(argument)
+        if state is not None:
+            self.channels[self.selected].output = state
+            self.general = state or any(channel.output for channel in self.channels.values())
+
+    def _outp_sel(self, argument):
+        state = self.state(argument)
+        if state is not None:
+            self.channels[self.selected].output = state
+
+    def _outp_sel_query(self, _):
+        return '1' if self.channels[self.selected].output else '0'
+
+    def _outp_gen_query(self, _):
+        return '1' if self.general else '0'
+
+    def _outp_gen(self, argument):
+        state = self.state(argument)
+        if state is not None:
+            self.general = state
+
+    def _appl(self, argument):
+        values = [value.strip() for value in argument.split(',')]
+        self.setpoint('VOLT', False, False, values[0])
+        if len(values) > 1:
+            self.setpoint('CURR', False, False, values[1])
+
+    def _appl_query(self, _):
+        channel = self.channels[self.selected]
+        return f"{channel.volt:.3f},{channel.current:.4f}"
+
+    def _arb_cle(self, _):
+        self.arb.points = []
+
+    def _arb_data(self, argument):
+        try:
+            values = [float(value) for value in argument.split(',')]
+        except ValueError:
+            self.error(-104, 'Data type error')
+            return
+        points = [tuple(values[i:i + 3]) for i in range(0, len(values), 3)]
+        if len(values) % 3 or len(points) > self.ARB_POINTS:
+            self.error(-223, 'Too much data')
+        elif any(not 0.01 <= dwell <= 60 or not 0 <= volt <= self.VOLT_RANGE[1] for volt, _, dwell in points):
+            self.error(-222, 'Data out of range')
+        else:
+            self.arb.points = points
+
+    def _arb_rep(self, argument):
+        if not argument.isdigit() or int(argument) > 255:
+            self.error(-222, 'Data out of range')
+            return
+        self.arb.repetitions = int(argument)
+
+    def _arb_tran(self, argument):
+        if argument not in ('1', '2', '3') or not self.arb.points:
+            self.error(-221, 'Settings conflict')
+            return
+        self.channels[int(argument)].arb = SimulatedArb(self.arb.points, self.arb.repetitions)
+
+    def _arb_star(self, argument):
+        channel = self.channels.get(int(argument)) if argument in ('1', '2', '3') else None
+        if channel is None or channel.arb is None:
+            self.error(-221, 'Settings conflict')
+            return
+        channel.arb.play()
+
+    def _arb_stop(self, argument):
+        if argument in ('1', '2', '3'):
+            channel = self.channels[int(argument)]
+            channel.volt, channel.current = channel.setpoints()
+            channel.arb = None
+
+    def state(self, argument):
+        """
+        Parse a boolean argument
+
+        :param argument: ON, OFF, 1 or 0
+        :return: state, or None when the argument is invalid
+        """
+        if argument.upper() in ('ON', '1'):
+            return True
+        if argument.upper() in ('OFF', '0'):
+            return False
+        self.error(-224, 'Illegal parameter value')
+        return None
+
+    COMMON = {
+        '*IDN?': _idn, '*RST': _rst, '*CLS': _cls, '*ESR?': _esr, '*OPC': _opc, '*OPC?': _opc_query, '*SAV': _sav,
+        '*RCL': _rcl, '*WAI': _beep, '*STB?': _stb, '*ESE': _ese, '*ESE?': _ese_query, '*SRE': _sre,
+        '*SRE?': _sre_query,
+    }
+    COMMANDS = {
+        'SYST:BEEP': _beep, 'SYST:VERS?': _version, 'SYST:ERR?': _error, 'INST?': _inst, 'INST:NSEL': _nsel,
+        'INST:NSEL?': _inst, 'MEAS:VOLT?': _meas_volt, 'MEAS:CURR?': _meas_curr, 'OUTP?': _outp, 'OUTP:STAT?': _outp,
+        'OUTP': _outp_stat, 'OUTP:STAT': _outp_stat, 'OUTP:SEL': _outp_sel, 'OUTP:GEN': _outp_gen,
+        'OUTP:SEL?': _outp_sel_query, 'OUTP:GEN?': _outp_gen_query, 'APPL': _appl,
+        'APPL?': _appl_query, 'ARB:CLE': _arb_cle, 'ARB:DATA': _arb_data, 'ARB:REP': _arb_rep, 'ARB:TRAN': _arb_tran,
+        'ARB:STAR': _arb_star, 'ARB:STOP': _arb_stop,
+    }
+
+
+class SimulatedResourceManager:
+    """
+    Resource manager opening simulated HMP2030 instruments
+
+    Each resource name is bound to one simulated instrument, so reopening a name returns the same instrument state.
+    """
+    def __init__(self, **options):
+        """
+        Create a resource manager
+
+        :param options: SimulatedHMP2030 options (latency, jitter, latencies)
+        """
+        self.options = options
+        self.resources = {}
+
+    def open_resource(self, name, **_):
+        """
+        Open a simulated instrument
+
+        :param name: resource name
+        :return: SimulatedHMP2030 object
+        """
+        if name not in self.resources:
+            self.resources[name] = SimulatedHMP2030(name, **self.options)
+        else:
+            self.resources[name].reopen()
+        return self.resources[name]
+
+    def list_resources(self):
+        """
+        List the opened resource names
+
+        :return: a tuple of resource names
+        """
+        return tuple(self.resources)
+
+    def close(self):
+        """
+        Close the resource manager
+
+        :return: None
+        """
@@ -0,0 +1,118 @@
+"""
+Whole device state snapshots
+"""
+
+from typing import NamedTuple, Tuple
+
+#: channel numbers
+CHANNELS = (1, 2, 3)
+#: setpoint fields: (query/command header, response format)
+SETPOINTS = {
+    'volt': ('VOLT', '{:.3f}'),
+    'current': ('CURR', '{:.4f}'),
+    'volt_step': ('VOLT:STEP', '{:.3f}'),
+    'current_step': ('CURR:STEP', '{:.4f}'),
+}
+
+
+class ChannelState(NamedTuple):
+    """
+    Settings of a channel
+    """
+    volt: float
+    current: float
+    volt_step: float
+    current_step: float
+    output: bool
+
+    def changes(self, other) -> list:
+        """
+        List the setpoint commands turning another channel state into this one
+
+        :param other: current ChannelState, or None when unknown
+        :return: a list of command strings
+        """
+        commands = []
+        for field, (header, fmt) in SETPOINTS.items():
+            value = fmt.format(getattr(self, field))
+            if other is None or value != fmt.format(getattr(other, field)):
+                commands.append(f"{header} {value}")
+        return commands
+
+
+class DeviceState(NamedTuple):
+    """
+    Settings of all channels and the general output
+    """
+    channels: Tuple[ChannelState, ...]
+    general: bool
+
+    def channel(self, channel) -> ChannelState:
+        """
+        Get the state of a channel
+
+        :param channel: channel number
+        :return: ChannelState
+        """
+        return self.channels[channel - 1]
+
+    def to_dict(self) -> dict:
+        """
+        Get the state as a dictionary
+
+        :return: a dictionary
+        """
+        return {'channels': {i: state._asdict() for i, state in zip(CHANNELS, self.channels)},
+                'general': self.general}
+
+    @classmethod
+    def from_dict(cls, settings: dict):
+        """
+        Create a state from a dictionary
+
+        :param settings: dictionary returned by to_dict()
+        :return: DeviceState
+        """
+        channels = settings['channels']
+        return cls(tuple(ChannelState(**channels.get(i, channels.get(str(i)))) for i in CHANNELS),
+                   bool(settings['general']))
+
+    def outputs(self) -> tuple:
+        """
+        Get the output states
+
+        :return: a tuple of the channel outputs, followed by the general output
+        """
+        return tuple(state.output for state in self.channels) + (self.general,)
+
+    def with_outputs(self, other) -> 'DeviceState':
+        """
+        Get this state with the output states of another one
+
+        :param other: DeviceState providing the channel and general outputs
+        :return: DeviceState
+        """
+        return DeviceState(tuple(state._replace(output=source.output) for state, source in
+                                 zip(self.channels, other.channels)), other.general)
+
+    def commands(self, other=None) -> list:
+        """
+        List the commands turning another device state into this one
+
+        Outputs are switched off first, then the setpoints are changed channel by channel, and outputs are switched
+        on last.
+
+        :param other: current DeviceState. None sends every setting
+        :return: a list of command strings
+        """
+        off, setpoints, on = [], [], []
+        for i, state in zip(CHANNELS, self.channels):
+            current = None if other is None else other.channel(i)
+            changes = state.changes(current)
+            if changes:
+                setpoints += [f'INST:NSEL {i}'] + changes
+            if current is None or state.output != current.output:
+                (on if state.output else off).extend([f'INST:NSEL {i}', f'OUTP:SEL {int(state.output)}'])
+        if other is None or self.general != other.general:
+            (on if self.general else off).append(f'OUTP:GEN {int(self.general)}')
+        return off + setpoints + on
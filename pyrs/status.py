@@ -0,0 +1,199 @@
+"""
+Status registers
+
+The standard event status register reports the operation complete and front panel events, and the questionable
+instrument summary registers report the channel regulation modes and protections.
+"""
+
+import time
+import pyvisa
+from pyvisa.constants import EventMechanism, EventType
+
+#: event status register bits: operation complete, front panel key pressed (user request)
+ESR_OPC = 0x01
+ESR_URQ = 0x40
+#: status byte bit summarizing the event status register
+STB_ESB = 0x20
+#: questionable instrument summary bits: constant current mode, constant voltage mode, over temperature,
+#: over voltage protection and electronic fuse tripped
+QUES_CC = 0x0001
+QUES_CV = 0x0002
+QUES_TEMPERATURE = 0x0010
+QUES_OVP = 0x0200
+QUES_FUSE = 0x0400
+
+
+class Status:
+    """
+    Status registers of a HMP2030::
+
+        device.status.wait_complete(srq=True)
+        if device.status.current_limited(1):
+            ...
+    """
+    def __init__(self, device):
+        """
+        Create a status handle
+
+        :param device: HMP2030 device
+        """
+        self.device = device
+
+    @property
+    def event_status(self) -> int:
+        """
+        Query and clear the standard event status register
+
+        A front panel operation (user request bit) invalidates the shadow state.
+
+        :return: register value
+        """
+        return self._events(int(self.device.query('*ESR?')))
+
+    def _events(self, esr) -> int:
+        """
+        Handle standard event status register bits read from the device
+
+        :param esr: register value
+        :return: register value
+        """
+        if esr & ESR_URQ:
+            self.device.invalidate()
+        return esr
+
+    def clear(self):
+        """
+        Clear the status registers and the error queue
+
+        :return: None
+        """
+        self.device.send('*CLS')
+
+    def wait_complete(self, timeout=None, srq=False):
+        """
+        Wait until all pending commands have been executed
+
+        By default the wait is an *OPC? query, answered by the instrument as soon as the commands are done. With srq
+        set, the operation complete event raises a service request instead, so that no query is pending during the
+        wait. The *OPC? query is used when the VISA backend does not support service requests. The event enable
+        registers are restored afterwards. The wait runs in a device transaction: other threads sharing the device
+        wait until it ends.
+
+        :param timeout: maximum wait time in milliseconds. None uses the VISA timeout
+        :param srq: wait for a service request
+        :return: None
+        """
+        timeout = self.device.timeout if timeout is None else timeout
+        with self.device.transaction():
+            if srq and self._enable_srq():
+                try:
+                    self._wait_srq(timeout)
+                finally:
+                    self.device.instr.disable_event(EventType.service_request, EventMechanism.queue)
+                return
+            previous, self.device.timeout = self.device.timeout, timeout
+            try:
+                self.device.query('*OPC?')
+            finally:
+                self.device.timeout = previous
+
+    def _wait_srq(self, timeout):
+        """
+        Wait for the service request of the operation complete event, then restore the event enable registers. The
+        device lock must be held
+
+        :param timeout: maximum wait time in milliseconds
+        :return: None
+        """
+        with self.device.batch() as batch:
+            esr = batch.query('*ESR?', int)
+            ese = batch.query('*ESE?', int)
+            sre = batch.query('*SRE?', int)
+        self._events(esr.value)
+        try:
+            with self.device.batch() as batch:
+                batch.write(f'*ESE {ESR_OPC}')
+                batch.write(f'*SRE {STB_ESB}')
+                batch.write('*OPC')
+            self.device.instr.wait_on_event(EventType.service_request, timeout)
+        finally:
+            with self.device.batch() as batch:
+                batch.write(f'*SRE {sre.value}')
+                batch.write(f'*ESE {ese.value}')
+                esr = batch.query('*ESR?', int)
+            self._events(esr.value)
+
+    def _enable_srq(self) -> bool:
+        """
+        Enable the queuing of the service request events, discarding the pending ones
+
+        :return: False when the VISA backend does not support service requests
+        """
+        try:
+            self.device.instr.enable_event(EventType.service_request, EventMechanism.queue)
+        except (AttributeError, NotImplementedError, pyvisa.errors.VisaIOError):
+            return False
+        self.device.instr.discard_events(EventType.service_request, EventMechanism.queue)
+        return True
+
+    def questionable(self, channel) -> int:
+        """
+        Query the questionable condition register of a channel
+
+        :param channel: channel number
+        :return: register value (QUES_CC, QUES_CV, QUES_TEMPERATURE, QUES_OVP, QUES_FUSE bits)
+        """
+        return int(self.device.query(f'STAT:QUES:INST:ISUM{channel}:COND?'))
+
+    def current_limited(self, channel) -> bool:
+        """
+        Check if a channel is in constant current mode
+
+        :param channel: channel number
+        :return: True when the current limit is reached
+        """
+        return bool(self.questionable(channel) & QUES_CC)
+
+    def overvoltage_tripped(self, channel) -> bool:
+        """
+        Check if the over voltage protection of a channel has tripped
+
+        :param channel: channel number
+        :return: True when the protection has tripped
+        """
+        return bool(self.questionable(channel) & QUES_OVP)
+
+    def wait_settled(self, channel, tolerance=0.01, timeout=5.0, target=None, interval=0.01) -> float:
+        """
+        Wait until a channel output voltage has reached its setpoint
+
+        The pending commands are completed first (*OPC?), then the channel is polled: each poll is a single message
+        selecting the channel, measuring the voltage and reading the questionable condition. A channel in constant
+        current mode is reported settled, since its voltage will not reach the setpoint.
+
+        :param channel: channel number
+        :param tolerance: maximum voltage error in volt
+        :param timeout: maximum wait time in seconds
+        :param target: expected voltage. None uses the channel setpoint
+        :param interval: time (in seconds) between polls, leaving the bus to the other threads. 0 polls as fast as
+                         the link allows
+        :return: measured voltage
+        :raise TimeoutError: when the channel is not settled in time
+        """
+        self.wait_complete()
+        deadline = time.monotonic() + timeout
+        with self.device.batch() as batch:
+            batch.write(f'INST:NSEL {channel}')
+            setpoint = batch.query('VOLT?', float)
+        target = setpoint.value if target is None else target
+        while True:
+            with self.device.batch() as batch:
+                batch.write(f'INST:NSEL {channel}')
+                volt = batch.query('MEAS:VOLT?', float)
+                condition = batch.query(f'STAT:QUES:INST:ISUM{channel}:COND?', int)
+            if abs(volt.value - target) <= tolerance or condition.value & QUES_CC:
+                return volt.value
+            remaining = deadline - time.monotonic()
+            if remaining < 0:
+                raise TimeoutError(f"channel {channel} not settled: {volt.value} V, expected {target} V")
+            time.sleep(min(interval, remaining))
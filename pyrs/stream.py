@@ -0,0 +1,212 @@
+"""
+Measurement streaming
+"""
+
+import time
+import numpy as np
+from pyrs.snapshot import CHANNELS
+
+#: record type of a timestamped channel measurement
+SAMPLE_DTYPE = np.dtype([('time', 'f8'), ('channel', 'u1'), ('volt', 'f8'), ('current', 'f8')])
+
+
+def acquire(device, channels, samples=1):
+    """
+    Measure voltage and current on several channels, in as few round trips as possible
+
+    The channel selections and measurements are sent in compound messages filling the instrument input buffer, and
+    each response is parsed in one pass. A channel is only selected when it differs from the previous one.
+
+    :param device: HMP2030 device
+    :param channels: a list of channel number (1,2,3)
+    :param samples: number of samples per channel
+    :return: array of records, samples x channels
+    """
+    invalid = [channel for channel in channels if channel not in CHANNELS]
+    if invalid:
+        raise ValueError(f"invalid channel {invalid[0]}, expected one of {CHANNELS}")
+    sequence = list(channels) * samples
+    records = np.empty(len(sequence), dtype=SAMPLE_DTYPE)
+    records['channel'] = sequence
+    size = device.BUFFER_SIZE // len(':INST:NSEL 1;:MEAS:VOLT?;:MEAS:CURR?;') or 1
+    previous = None
+    for start in range(0, len(sequence), size):
+        parts = []
+        for channel in sequence[start:start + size]:
+            if channel != previous:
+                parts.append(f':INST:NSEL {channel}')
+                previous = channel
+            parts.append(':MEAS:VOLT?;:MEAS:CURR?')
+        values = np.fromstring(device.query(';'.join(parts)), sep=';')
+        stop = min(start + size, len(sequence))
+        if len(values) != 2 * (stop - start):
+            raise ValueError(f"expected {2 * (stop - start)} measurements, got {len(values)}")
+        records['time'][start:stop] = time.time()
+        records['volt'][start:stop] = values[0::2]
+        records['current'][start:stop] = values[1::2]
+    return records
+
+
+def average(records):
+    """
+    Average measurement records per channel
+
+    :param records: array of records
+    :return: array of records, one per channel
+    """
+    channels, index = np.unique(records['channel'], return_inverse=True)
+    counts = np.bincount(index)
+    result = np.empty(len(channels), dtype=SAMPLE_DTYPE)
+    result['channel'] = channels
+    for name in ('time', 'volt', 'current'):
+        result[name] = np.bincount(index, weights=records[name]) / counts
+    return result
+
+
+class RingBuffer:
+    """
+    Preallocated ring buffer of measurement records
+
+    The buffer never grows: once full, the oldest records are overwritten.
+    """
+    def __init__(self, size, dtype=SAMPLE_DTYPE):
+        """
+        Create a ring buffer
+
+        :param size: number of records
+        :param dtype: record type
+        """
+        self._data = np.zeros(size, dtype=dtype)
+        self._index = 0
+        self.count = 0
+
+    def __len__(self):
+        return min(self.count, len(self._data))
+
+    @property
+    def size(self) -> int:
+        """
+        Get the buffer capacity
+
+        :return: number of records
+        """
+        return len(self._data)
+
+    def append(self, records):
+        """
+        Append records, overwriting the oldest ones when full
+
+        :param records: array of records
+        :return: None
+        """
+        size = len(self._data)
+        records = records[-size:]
+        stop = self._index + len(records)
+        if stop <= size:
+            self._data[self._index:stop] = records
+        else:
+            split = size - self._index
+            self._data[self._index:] = records[:split]
+            self._data[:stop - size] = records[split:]
+        self._index = stop % size
+        self.count += len(records)
+
+    def array(self):
+        """
+        Get the buffered records in chronological order
+
+        :return: a copy of the records
+        """
+        if self.count < len(self._data):
+            return self._data[:self._index].copy()
+        return np.concatenate((self._data[self._index:], self._data[:self._index]))
+
+
+class StreamStats:
+    """
+    Streaming statistics
+    """
+    def __init__(self):
+        """
+        Create empty statistics
+        """
+        self.start = time.monotonic()
+        self.batches = 0
+        self.samples = 0
+        self.dropped = 0
+
+    @property
+    def rate(self) -> float:
+        """
+        Get the achieved acquisition rate
+
+        :return: batches per second
+        """
+        elapsed = time.monotonic() - self.start
+        return self.batches / elapsed if elapsed > 0 else 0.0
+
+    def __repr__(self):
+        return f"StreamStats(batches={self.batches}, samples={self.samples}, rate={self.rate:.1f}, " \
+               f"dropped={self.dropped})"
+
+
+class MeasurementStream:
+    """
+    Iterator sampling voltage and current on a set of channels
+
+    Each iteration sends one compound message selecting and measuring every channel, and yields the batch of
+    records (one per channel). The batches are also stored in a ring buffer. With a target rate, acquisitions are
+    scheduled on a fixed grid: when an acquisition overruns, the missed deadlines are skipped and counted as dropped.
+    """
+    def __init__(self, device, channels, rate=None, size=100000):
+        """
+        Create a measurement stream
+
+        :param device: HMP2030 device
+        :param channels: a list of channel number (1,2,3)
+        :param rate: target acquisition rate in Hz. None samples as fast as the link allows
+        :param size: ring buffer size, in records
+        """
+        self._device = device
+        self.channels = list(channels)
+        self.period = 1.0 / rate if rate else None
+        self.buffer = RingBuffer(size)
+        self.stats = StreamStats()
+        self._deadline = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.period is not None:
+            self._wait()
+        records = self.acquire()
+        self.buffer.append(records)
+        self.stats.batches += 1
+        self.stats.samples += len(records)
+        return records
+
+    def _wait(self):
+        """
+        Wait for the next deadline of the acquisition grid
+
+        :return: None
+        """
+        now = time.monotonic()
+        if self._deadline is None:
+            self._deadline = now
+        elif now > self._deadline + self.period:
+            missed = int((now - self._deadline) / self.period)
+            self.stats.dropped += missed
+            self._deadline += missed * self.period
+        elif now < self._deadline:
+            time.sleep(self._deadline - now)
+        self._deadline += self.period
+
+    def acquire(self):
+        """
+        Measure voltage and current on all channels in one round trip
+
+        :return: array of records
+        """
+        return self._device.measure(self.channels)
@@ -0,0 +1,199 @@
+"""
+Adaptive I-V characterization
+
+A sweep starts with a coarse uniform grid of voltage setpoints, then refines the intervals where the curve bends:
+an interval is split when the slopes around it differ enough for a linear interpolation to miss the curve by more
+than the tolerance. Flat and linear regions keep the coarse grid.
+"""
+
+import time
+import numpy as np
+from pyrs import arb, status
+
+#: record type of a curve point: voltage setpoint, measured voltage and current, current limit reached
+CURVE_DTYPE = np.dtype([('setpoint', 'f8'), ('volt', 'f8'), ('current', 'f8'), ('limited', '?')])
+
+
+def errors(setpoint, current):
+    """
+    Estimate the interpolation error of each interval of a curve
+
+    :param setpoint: sorted voltage setpoints
+    :param current: measured currents
+    :return: estimated error of each interval, in Ampere
+    """
+    width = np.diff(setpoint)
+    slope = np.diff(current) / width
+    if len(slope) < 2:
+        return np.zeros(len(slope))
+    change = np.abs(np.diff(slope))
+    bend = np.maximum(np.concatenate(([0.0], change)), np.concatenate((change, [0.0])))
+    return bend * width / 2
+
+
+class IVSweep:
+    """
+    Adaptive I-V sweep of one or several channels
+
+    The channels are swept in parallel: each step sets the next setpoint of every channel and measures them all in
+    one pipelined exchange. The channel outputs must be on; the setpoints are left at the start voltage::
+
+        curves = IVSweep(device, compliance=0.5, tolerance=0.002).run([1, 2], 0.0, 12.0)
+        volt, current = curves[1]['volt'], curves[1]['current']
+    """
+    def __init__(self, device, *, compliance=None, points=11, tolerance=0.01, min_step=0.01, settle=0.0):
+        """
+        Create a sweep
+
+        :param device: HMP2030 device
+        :param compliance: current limit (in Ampere) set on the channels. None keeps the channel current setpoints
+        :param points: number of points of the coarse grid
+        :param tolerance: maximum interpolation error, in Ampere
+        :param min_step: minimum voltage step
+        :param settle: time (in seconds) between setting the voltages and measuring
+        """
+        self.device = device
+        self.compliance = compliance
+        self.points = points
+        self.tolerance = tolerance
+        self.min_step = min_step
+        self.settle = settle
+
+    def exchange(self, setpoints: dict) -> dict:
+        """
+        Set the voltage of channels and measure them
+
+        Without settling time, the setpoints and the measurements are sent in a single message.
+
+        :param setpoints: dictionary of voltage setpoints by channel
+        :return: dictionary of (volt, current, limited) by channel
+        """
+        with self.device.transaction():
+            batch = self.device.batch()
+            for channel, volt in setpoints.items():
+                batch.write(f'INST:NSEL {channel}')
+                batch.write(f'VOLT {volt:.3f}')
+            if self.settle:
+                batch.execute()
+                time.sleep(self.settle)
+            return self.sample(list(setpoints), batch)
+
+    def sample(self, channels: list, batch=None) -> dict:
+        """
+        Measure channels, and read whether they are in constant current mode
+
+        :param channels: a list of channel number (1,2,3)
+        :param batch: batch holding commands to send first. None for a new batch
+        :return: dictionary of (volt, current, limited) by channel
+        """
+        batch = self.device.batch() if batch is None else batch
+        results = {}
+        for channel in channels:
+            batch.write(f'INST:NSEL {channel}')
+            results[channel] = (batch.query('MEAS:VOLT?', float), batch.query('MEAS:CURR?', float),
+                                batch.query(f'STAT:QUES:INST:ISUM{channel}:COND?', int))
+        batch.execute()
+        return {channel: (volt.value, current.value, bool(condition.value & status.QUES_CC))
+                for channel, (volt, current, condition) in results.items()}
+
+    def _measure(self, curves: dict, pending: dict):
+        """
+        Measure the pending setpoints, in parallel on the channels
+
+        :param curves: dictionary of curve point lists by channel, extended in place
+        :param pending: dictionary of setpoint lists by channel
+        :return: None
+        """
+        for row in range(max((len(setpoints) for setpoints in pending.values()), default=0)):
+            setpoints = {channel: values[row] for channel, values in pending.items() if row < len(values)}
+            for channel, values in self.exchange(setpoints).items():
+                curves[channel].append((setpoints[channel],) + values)
+
+    def _measure_arb(self, curves: dict, pending: dict, dwell):
+        """
+        Measure uniform grids played by the instrument ARB, sampling the middle of each step
+
+        Each sample is timestamped, and recorded with the setpoint of the step playing during the whole exchange: a
+        sample straddling a step boundary is dropped.
+
+        :param curves: dictionary of curve point lists by channel, extended in place
+        :param pending: dictionary of setpoint lists by channel, all equal
+        :param dwell: step duration in seconds
+        :return: None
+        :raise ValueError: when the dwell is shorter than a measurement exchange
+        """
+        channels = list(pending)
+        grid = pending[channels[0]]
+        start = time.monotonic()
+        self.sample(channels)
+        exchange = time.monotonic() - start
+        if dwell <= exchange:
+            raise ValueError(f"ARB dwell {dwell} s shorter than the measurement exchange ({exchange:.3f} s)")
+        self.device.arb.run(grid, self.compliance, dwell, channels)
+        start = time.monotonic()
+        try:
+            step = 0
+            while step < len(grid):
+                time.sleep(max(0.0, start + (step + 0.5) * dwell - exchange / 2 - time.monotonic()))
+                sent = time.monotonic()
+                values = self.sample(channels)
+                playing = int((sent - start) // dwell)
+                straddling = int((time.monotonic() - start) // dwell) != playing
+                if not straddling and playing < len(grid):
+                    for channel, value in values.items():
+                        curves[channel].append((grid[playing],) + value)
+                step = max(step, playing) + 1
+        finally:
+            self.device.arb.stop(channels)
+
+    def _split(self, points: list, max_points) -> list:
+        """
+        Get the setpoints refining a curve, in the middle of the intervals where the curve bends
+
+        :param points: a list of curve points (setpoint, volt, current, limited)
+        :param max_points: maximum number of points of the curve
+        :return: a list of setpoints
+        """
+        curve = np.array(sorted(points))
+        setpoint, current, limited = curve[:, 0], curve[:, 2], curve[:, 3].astype(bool)
+        split = ((errors(setpoint, current) > self.tolerance) & (np.diff(setpoint) >= 2 * self.min_step) &
+                 ~(limited[:-1] & limited[1:]))
+        return list(((setpoint[:-1] + setpoint[1:]) / 2)[split][:max(max_points - len(curve), 0)])
+
+    def run(self, channels: list, start, stop, *, max_points=200, arb_dwell=None) -> dict:
+        """
+        Sweep the channels voltage from start to stop
+
+        :param channels: a list of channel number (1,2,3)
+        :param start: start voltage
+        :param stop: stop voltage
+        :param max_points: maximum number of points per channel
+        :param arb_dwell: step duration (in seconds) of the coarse grid, played by the instrument ARB. None sets each
+                          point with a command
+        :return: dictionary of arrays of curve points (setpoint, volt, current, limited) by channel
+        """
+        if start == stop:
+            raise ValueError(f"empty sweep range: start and stop are both {start} V")
+        if arb_dwell is not None and self.compliance is None:
+            raise ValueError("an ARB sweep needs a compliance current")
+        if self.compliance is not None:
+            with self.device.transaction():
+                for channel in channels:
+                    self.device.ch(channel).current = self.compliance
+        grid = list(np.linspace(start, stop, self.points))
+        curves = {channel: [] for channel in channels}
+        pending = {channel: grid for channel in channels}
+        if arb_dwell is None:
+            self._measure(curves, pending)
+        else:
+            self._measure_arb(curves, pending, max(arb_dwell, arb.DWELL_RANGE[0]))
+        while True:
+            pending = {channel: self._split(curves[channel], max_points) for channel in channels}
+            if not any(pending.values()):
+                break
+            self._measure(curves, pending)
+        self.exchange({channel: start for channel in channels})
+        result = {}
+        for channel in channels:
+            result[channel] = np.array(sorted(curves[channel]), dtype=CURVE_DTYPE)
+        return result
@@ -0,0 +1,202 @@
+"""
+Host-timed setpoint timelines
+
+A timeline holds time-stamped actions on the channels of one or several HMP2030 devices, and plays them on the
+monotonic clock. Every action is scheduled from the common start time, so the timing does not drift with the link
+latency, and commands are dispatched early by the measured write latency of their device.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, NamedTuple, Optional, Tuple
+
+
+class Action(NamedTuple):
+    """
+    Time-stamped action on a device
+    """
+    at: float
+    device: object
+    channel: Optional[int]
+    commands: Tuple[str, ...]
+    function: Optional[Callable] = None
+
+
+class EventTiming(NamedTuple):
+    """
+    Timing of a played action
+    """
+    at: float
+    device: str
+    channel: Optional[int]
+    commands: Tuple[str, ...]
+    error: float
+
+
+class Timeline:
+    """
+    Timeline of setpoint changes across channels and devices
+
+    Each device plays its actions on its own thread. Command actions of a device falling in the same tick are merged
+    into one pipelined message. Function actions receive the device, and can read it to compute setpoints::
+
+        timeline = Timeline()
+        timeline.set(0.0, psu1, 1, volt=3.3, output=True)
+        timeline.set(0.1, psu2, 1, volt=5.0, output=True)
+        timeline.call(0.5, psu1, lambda device: device.ch(2).measure_voltage)
+        for event in timeline.run():
+            print(event.device, event.at, event.error)
+    """
+    def __init__(self, tick=0.005, spin=0.001):
+        """
+        Create an empty timeline
+
+        :param tick: time window (in seconds) of the merged commands
+        :param spin: time (in seconds) spent polling the clock before a dispatch, instead of sleeping
+        """
+        self.tick = tick
+        self.spin = spin
+        self.actions = []
+
+    def add(self, at, device, commands, channel=None):
+        """
+        Add commands
+
+        :param at: time (in seconds) from the timeline start
+        :param device: HMP2030 device
+        :param commands: command string, or a list of command strings
+        :param channel: channel selected before the commands. None to keep the selection
+        :return: None
+        """
+        commands = (commands,) if isinstance(commands, str) else tuple(commands)
+        self.actions.append(Action(at, device, channel, commands))
+
+    def set(self, at, device, channel, *, volt=None, current=None, output=None):
+        """
+        Add setpoint changes of a channel
+
+        :param at: time (in seconds) from the timeline start
+        :param device: HMP2030 device
+        :param channel: channel number (1,2,3)
+        :param volt: voltage value. None to keep the voltage
+        :param current: current value. None to keep the current
+        :param output: output state. None to keep the output
+        :return: None
+        """
+        commands = []
+        if volt is not None:
+            commands.append(f'VOLT {volt:.3f}')
+        if current is not None:
+            commands.append(f'CURR {current:.4f}')
+        if output is not None:
+            commands.append(f"OUTP:STAT {'ON' if output else 'OFF'}")
+        self.add(at, device, commands, channel)
+
+    def call(self, at, device, function):
+        """
+        Add a function call
+
+        :param at: time (in seconds) from the timeline start
+        :param device: HMP2030 device
+        :param function: callable taking the HMP2030 object
+        :return: None
+        """
+        self.actions.append(Action(at, device, None, (), function))
+
+    def groups(self, actions) -> list:
+        """
+        Merge the command actions of a device falling in the same tick
+
+        :param actions: actions of a device
+        :return: a list of action lists, in time order
+        """
+        groups = []
+        for action in sorted(actions, key=lambda action: action.at):
+            if (groups and action.function is None and groups[-1][0].function is None and
+                    action.at - groups[-1][0].at < self.tick):
+                groups[-1].append(action)
+            else:
+                groups.append([action])
+        return groups
+
+    @staticmethod
+    def latency(device, samples=3) -> float:
+        """
+        Measure the write latency of a device
+
+        :param device: HMP2030 device
+        :param samples: number of measured writes
+        :return: write duration in seconds
+        """
+        durations = []
+        for _ in range(samples):
+            start = time.monotonic()
+            device.send('*WAI')
+            device.flush()
+            durations.append(time.monotonic() - start)
+        return min(durations)
+
+    def _wait(self, deadline):
+        """
+        Wait until a deadline of the monotonic clock
+
+        :param deadline: monotonic time
+        :return: None
+        """
+        remaining = deadline - time.monotonic() - self.spin
+        if remaining > 0:
+            time.sleep(remaining)
+        while time.monotonic() < deadline:
+            pass
+
+    def _play(self, device, actions, start, latency) -> list:
+        """
+        Play the actions of a device
+
+        :param device: HMP2030 device
+        :param actions: actions of the device
+        :param start: monotonic start time
+        :param latency: initial write latency estimate, in seconds
+        :return: a list of EventTiming
+        """
+        timings = []
+        for group in self.groups(actions):
+            first = group[0]
+            if first.function is not None:
+                self._wait(start + first.at)
+                done = time.monotonic()
+                first.function(device)
+            else:
+                self._wait(start + first.at - latency)
+                dispatched = time.monotonic()
+                with device.batch() as batch:
+                    for action in group:
+                        if action.channel is not None:
+                            batch.write(f'INST:NSEL {action.channel}')
+                        for command in action.commands:
+                            batch.write(command)
+                device.flush()
+                done = time.monotonic()
+                latency = 0.8 * latency + 0.2 * (done - dispatched)
+            timings += [EventTiming(action.at, device.name, action.channel, action.commands, done - start - action.at)
+                        for action in group]
+        return timings
+
+    def run(self, lead=0.05) -> list:
+        """
+        Play the timeline
+
+        :param lead: time (in seconds) between the call and the timeline start
+        :return: a list of EventTiming, in time order. The error is the time the commands were written (or the
+                 function called) minus the scheduled time
+        """
+        devices = {}
+        for action in self.actions:
+            devices.setdefault(id(action.device), (action.device, []))[1].append(action)
+        latencies = {key: self.latency(device) for key, (device, _) in devices.items()}
+        start = time.monotonic() + lead
+        with ThreadPoolExecutor(max_workers=len(devices) or 1) as pool:
+            futures = [pool.submit(self._play, device, actions, start, latencies[key])
+                       for key, (device, actions) in devices.items()]
+            timings = [timing for future in futures for timing in future.result()]
+        return sorted(timings, key=lambda timing: timing.at)
@@ -0,0 +1,264 @@
+"""
+Write-behind command queue
+"""
+
+import threading
+import time
+from pyrs.pipeline import Batch
+
+#: setpoint commands coalesced per channel: only the last value is sent
+COALESCED = ('VOLT', 'CURR', 'VOLT:STEP', 'CURR:STEP')
+#: commands leaving the channel selection unknown
+RESELECT = ('*RST', '*RCL')
+
+
+def selection(message, channel=None):
+    """
+    Get the channel selected after a message
+
+    :param message: message string
+    :param channel: channel selected before the message. None when unknown
+    :return: channel number. None when unknown
+    """
+    for part in message.split(';'):
+        header, _, argument = part.strip().lstrip(':').partition(' ')
+        header = header.upper()
+        if header == 'INST:NSEL':
+            channel = int(argument)
+        elif header in RESELECT:
+            channel = None
+    return channel
+
+
+class CommandQueue:
+    """
+    Pending commands of a write-behind queue, with their channels
+
+    The queue tracks two channels: the channel selected by the queued commands, and the channel selected on the
+    bus once the written commands are executed. It is not thread-safe: WriteBehind guards it with its condition.
+    """
+    def __init__(self, size):
+        """
+        Create an empty queue
+
+        :param size: maximum message length in characters
+        """
+        self.size = size
+        self.pending = []
+        self.index = {}
+        self.channel = None
+        self.bus = None
+        self.closed = False
+
+    def __len__(self):
+        return len(self.pending)
+
+    @property
+    def idle(self) -> bool:
+        """
+        Tell whether there is nothing to write
+
+        :return: True when no command is pending and the bus selects the queue channel
+        """
+        return not self.pending and self.bus == self.channel
+
+    def select(self, command):
+        """
+        Track the channel selected by a message sent directly, once the queue is written
+
+        :param command: message string
+        :return: None
+        """
+        self.channel = self.bus = selection(command, self.bus)
+
+    def put(self, command):
+        """
+        Queue a command, coalescing the pending setpoints of the same channel and parameter
+
+        :param command: command string
+        :return: None
+        """
+        header, _, argument = command.strip().lstrip(':').partition(' ')
+        header = header.upper()
+        if header == 'INST:NSEL' and ';' not in command:
+            self.channel = int(argument)
+            return
+        key = (self.channel, header)
+        if header in COALESCED and ';' not in command and argument.upper() not in ('UP', 'DOWN'):
+            if key in self.index:
+                self.pending[self.index[key]] = (self.channel, command)
+                return
+            self.index[key] = len(self.pending)
+        else:
+            self.index = {}
+        channel = None if header == 'INST:NSEL' else self.channel
+        self.pending.append((channel, command))
+        self.channel = selection(command, self.channel)
+
+    def take(self):
+        """
+        Remove the pending commands, and build the messages writing them
+
+        :return: a list of messages, and the channel selected on the bus after them
+        """
+        items, self.pending, self.index = self.pending, [], {}
+        batch = Batch(None, self.size)
+        channel = self.bus
+        for target, command in items:
+            if target is not None and target != channel:
+                batch.write(f'INST:NSEL {target}')
+            batch.write(command)
+            channel = selection(command, target if target is not None else channel)
+        messages = [message for message, _ in batch.messages()]
+        if self.channel is not None and self.channel != channel:
+            messages.append(f':INST:NSEL {self.channel}')
+        return messages, self.channel
+
+
+class WriteBehind:
+    """
+    Queue of commands written to the device by a background thread
+
+    Commands are queued without waiting for the bus. Pending setpoints of the same channel and parameter are
+    coalesced, so that only the last value is sent, in place of the first one. Any other command is a barrier:
+    it is sent in order, and setpoints queued after it are never merged with setpoints queued before it.
+
+    The channel selections are not queued: each command remembers its channel, and the writer selects the channel
+    when needed. The pending commands are written in compound messages filling the instrument input buffer.
+
+    Queries must not overtake the queued commands: flush() writes the pending commands in the calling thread. The
+    writer holds the device lock while writing, so a thread holding it observes the queue either fully written or
+    not at all.
+    """
+    def __init__(self, write, size, *, lock=None, update=None, linger=0.0):
+        """
+        Create a queue and start its writer thread
+
+        :param write: callable writing a message to the device
+        :param size: maximum message length in characters
+        :param lock: device lock held while writing. None for a private lock
+        :param update: callable receiving each queued command, in queue order. None to ignore
+        :param linger: time (in seconds) the writer waits for more commands before writing
+        """
+        self._write = write
+        self._lock = lock or threading.RLock()
+        self._update = update
+        self._queue = CommandQueue(size)
+        self._error = None
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, args=(linger,), name='pyrs-write-behind', daemon=True)
+        self._thread.start()
+
+    def __len__(self):
+        with self._condition:
+            return len(self._queue)
+
+    def transaction(self):
+        """
+        Hold the queue, so that the commands queued by the thread are not interleaved with other threads commands
+
+        The transaction never waits for the bus, and must not contain queries.
+
+        :return: a context manager
+        """
+        return self._condition
+
+    def put(self, command) -> bool:
+        """
+        Queue a command
+
+        Queries are not queued: the pending commands are flushed, and the caller sends the query itself.
+
+        :param command: command string
+        :return: True when the command has been queued
+        """
+        if '?' in command:
+            self.flush()
+            with self._condition:
+                self._queue.select(command)
+            return False
+        with self._condition:
+            self._raise()
+            if self._update is not None:
+                self._update(command)
+            self._queue.put(command)
+            self._condition.notify()
+        return True
+
+    def flush(self, timeout=None):
+        """
+        Write every queued command
+
+        :param timeout: maximum time (in seconds) to wait for the device lock. None waits forever
+        :return: None
+        :raise TimeoutError: when the device lock is not acquired in time
+        """
+        if not self._lock.acquire(timeout=-1 if timeout is None else timeout):
+            raise TimeoutError(f"device busy, queued commands not written after {timeout} s")
+        try:
+            with self._condition:
+                self._raise()
+            self._drain()
+        finally:
+            self._lock.release()
+
+    def close(self):
+        """
+        Write the queued commands and stop the writer thread
+
+        :return: None
+        """
+        with self._condition:
+            self._queue.closed = True
+            self._condition.notify()
+        self._thread.join()
+        with self._condition:
+            self._raise()
+
+    def _raise(self):
+        """
+        Raise the error of the writer thread, once
+
+        :return: None
+        """
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _drain(self):
+        """
+        Write the queued commands. The device lock must be held
+
+        :return: None
+        """
+        with self._condition:
+            if self._queue.idle:
+                return
+            messages, target = self._queue.take()
+        try:
+            for message in messages:
+                self._write(message)
+        finally:
+            with self._condition:
+                self._queue.bus = target
+
+    def _run(self, linger):
+        """
+        Write the queued commands until closed
+
+        :param linger: time (in seconds) to wait for more commands before writing
+        :return: None
+        """
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: not self._queue.idle or self._queue.closed)
+                if self._queue.idle:
+                    return
+            if linger:
+                time.sleep(linger)
+            with self._lock:
+                try:
+                    self._drain()
+                except Exception as error:  # pylint: disable=broad-except
+                    with self._condition:
+                        self._error = error
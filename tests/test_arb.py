@@ -0,0 +1,47 @@
+"""
+EasyArb sequence compression
+"""
+
+import numpy as np
+from pyrs.arb import DWELL_RANGE, compress, sequence
+
+
+def test_lossless_merges_identical_points():
+    """
+    Consecutive identical points are merged, adding their dwell times
+    """
+    points = sequence([1.0, 1.0, 1.0, 2.0, 2.0, 1.0], [0.5, 0.5, 0.5, 0.5, 0.5, 0.5], [0.1, 0.2, 0.3, 1.0, 1.0, 0.5])
+    merged = compress(points)
+    np.testing.assert_allclose(merged, [[1.0, 0.5, 0.6], [2.0, 0.5, 2.0], [1.0, 0.5, 0.5]])
+
+
+def test_lossless_splits_long_dwell():
+    """
+    A merged dwell time longer than the instrument maximum is split into equal points
+    """
+    points = sequence(3.0, 1.0, [50.0, 50.0, 50.0])
+    merged = compress(points)
+    assert len(merged) == 3
+    assert np.all(merged[:, 2] <= DWELL_RANGE[1])
+    assert merged[:, 2].sum() == 150.0
+
+
+def test_tolerance_compares_with_run_start():
+    """
+    A point within the tolerance of the first point of its run is merged: a slow ramp does not drift into one point
+    """
+    points = sequence(np.arange(10) * 0.004, 1.0, 0.1)
+    merged = compress(points, tolerance=0.01)
+    np.testing.assert_allclose(merged[:, 0], [0.0, 0.012, 0.024, 0.036])
+    np.testing.assert_allclose(merged[:, 2], [0.3, 0.3, 0.3, 0.1])
+
+
+def test_tolerance_on_long_ramp():
+    """
+    A long ramp is compressed to one point per tolerance step, keeping the total duration
+    """
+    points = sequence(np.arange(20001) * 0.001, 1.0, 0.01)
+    merged = compress(points, tolerance=0.0025)
+    assert len(merged) == 6667
+    np.testing.assert_allclose(merged[:, 2].sum(), points[:, 2].sum())
+    assert np.all(np.diff(merged[:, 0]) > 0.0025)
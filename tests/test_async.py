@@ -0,0 +1,41 @@
+"""
+Asyncio interface with simulated instruments
+"""
+
+import asyncio
+from pyrs.async_hmp2030 import AsyncHMP2030
+from pyrs.simulator import SimulatedResourceManager
+
+
+def test_set_source():
+    """
+    The source parameter is changed between device operations, and used by the next ones
+    """
+    async def scenario(manager):
+        device = await AsyncHMP2030.open('SIM::HMP2030', resource_manager=manager)
+        await device.set_source('curr')
+        await device.set_param(0.5, channel=2)
+        source = device.source
+        await device.close()
+        return source
+
+    manager = SimulatedResourceManager()
+    assert asyncio.run(scenario(manager)) == 'curr'
+    assert manager.resources['SIM::HMP2030'].channels[2].current == 0.5
+
+
+def test_devices_run_concurrently():
+    """
+    Each device has its own worker: slow operations on several devices overlap
+    """
+    async def scenario(manager, names):
+        devices = await asyncio.gather(*(AsyncHMP2030.open(name, resource_manager=manager) for name in names))
+        start = asyncio.get_running_loop().time()
+        await asyncio.gather(*(device.measure_voltage(1) for device in devices))
+        elapsed = asyncio.get_running_loop().time() - start
+        await asyncio.gather(*(device.close() for device in devices))
+        return elapsed
+
+    manager = SimulatedResourceManager(latencies={'MEAS:VOLT': 0.2})
+    names = [f'SIM::{index}' for index in range(40)]
+    assert asyncio.run(scenario(manager, names)) < 0.35
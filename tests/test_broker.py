@@ -0,0 +1,74 @@
+"""
+Broker sessions with the simulated instrument
+"""
+
+import threading
+import pytest
+import pyvisa
+from pyrs.broker import Broker, BrokerResourceManager
+from pyrs.hmp2030 import HMP2030
+from pyrs.simulator import SimulatedResourceManager
+
+
+@pytest.fixture(name='setup')
+def fixture_setup(tmp_path):
+    """
+    Broker serving a simulated instrument whose voltage measurement takes 0.3 s
+    """
+    manager = SimulatedResourceManager(latencies={'MEAS:VOLT': 0.3})
+    broker = Broker(str(tmp_path / 'pyrs.sock'), {'psu': HMP2030('psu', resource_manager=manager)})
+    thread = threading.Thread(target=broker.serve_forever, daemon=True)
+    thread.start()
+    yield BrokerResourceManager(broker.server_address), manager.resources['psu']
+    broker.shutdown()
+    broker.server_close()
+    thread.join()
+
+
+def test_connections_keep_their_channel(setup):
+    """
+    Each connection has its own channel selection, and its queries are answered with their own responses
+    """
+    manager, simulated = setup
+    first = HMP2030('psu', resource_manager=manager)
+    second = HMP2030('psu', resource_manager=manager)
+    first.channel = 1
+    second.channel = 2
+    first.volt = 5
+    second.volt = 7
+    assert (first.volt, second.volt) == ('5.000', '7.000')
+    assert (simulated.channels[1].volt, simulated.channels[2].volt) == (5.0, 7.0)
+    first.close()
+    second.close()
+
+
+def test_timeout_drops_the_late_reply(setup):
+    """
+    A timed out query raises a VISA timeout, and its late reply is never read as the reply of the next query
+    """
+    manager, simulated = setup
+    simulated.channels[2].volt = 4.2
+    device = HMP2030('psu', resource_manager=manager, timeout=100)
+    with pytest.raises(pyvisa.errors.VisaIOError) as info:
+        device.query('MEAS:VOLT?')
+    assert info.value.error_code == pyvisa.constants.StatusCode.error_timeout
+    device.timeout = 2000
+    assert device.query('INST:NSEL 2;:VOLT?') == '4.200'
+    device.close()
+
+
+def test_recovery_after_timeout(setup):
+    """
+    The recovery opens a new broker session after a timeout, once the late reply has been dropped
+    """
+    manager, simulated = setup
+    device = HMP2030('psu', resource_manager=manager, timeout=100, cache=True)
+    device.enable_recovery(retries=1, backoff=0.5)
+    device.channel = 3
+    with pytest.raises(pyvisa.errors.VisaIOError):
+        device.query('VOLT UP;:MEAS:VOLT?')
+    assert device.recovery.stats.recoveries == 1
+    device.volt = 1.5
+    assert device.query('VOLT?') == '1.500'
+    assert simulated.channels[3].volt == 1.5
+    device.close()
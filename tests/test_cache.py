@@ -0,0 +1,52 @@
+"""
+Shadow state consistency with the simulated instrument
+"""
+
+import pytest
+from pyrs.hmp2030 import HMP2030
+from pyrs.simulator import SimulatedResourceManager
+
+#: output command sequences, each command sent after selecting its channel
+SEQUENCES = [
+    [(1, 'OUTP ON'), (1, 'OUTP OFF')],
+    [(1, 'OUTP ON'), (2, 'OUTP ON'), (1, 'OUTP OFF')],
+    [(1, 'OUTP:SEL ON'), (2, 'OUTP ON'), (2, 'OUTP OFF')],
+    [(1, 'OUTP:SEL ON'), (0, 'OUTP:GEN ON'), (1, 'OUTP:STAT OFF')],
+    [(2, 'OUTP ON'), (0, 'OUTP:GEN OFF'), (3, 'OUTP:SEL ON')],
+]
+
+
+@pytest.fixture(name='device')
+def fixture_device():
+    """
+    Cached device on a simulated instrument, with a fully known shadow state
+    """
+    device = HMP2030('SIM::HMP2030', resource_manager=SimulatedResourceManager(), cache=True)
+    device.snapshot()
+    yield device
+    device.close()
+
+
+@pytest.mark.parametrize('sequence', SEQUENCES)
+def test_known_state_after_outputs(device, sequence):
+    """
+    The shadow state never contradicts the device after output commands
+    """
+    for channel, command in sequence:
+        device.send(command if channel == 0 else f'INST:NSEL {channel};{command}')
+        known = device.known_state()
+        if known is not None:
+            assert known == device.snapshot()
+
+
+@pytest.mark.parametrize('sequence', SEQUENCES)
+def test_apply_snapshot_after_outputs(device, sequence):
+    """
+    A state recorded before output commands is restored from the shadow state
+    """
+    device.send('INST:NSEL 1;OUTP ON')
+    expected = device.snapshot()
+    for channel, command in sequence:
+        device.send(command if channel == 0 else f'INST:NSEL {channel};{command}')
+    device.apply_snapshot(expected)
+    assert device.snapshot() == expected
@@ -0,0 +1,82 @@
+"""
+Checked mode error reporting with the simulated instrument
+"""
+
+import pytest
+from pyrs import errors
+from pyrs.hmp2030 import HMP2030
+from pyrs.simulator import SimulatedResourceManager
+
+
+@pytest.fixture(name='device')
+def fixture_device():
+    """
+    Checked device on a simulated instrument
+    """
+    device = HMP2030('SIM::HMP2030', resource_manager=SimulatedResourceManager(), checked=True)
+    yield device
+    device.close()
+
+
+@pytest.mark.parametrize('code, error', [
+    (-113, errors.CommandError),
+    (-222, errors.ExecutionError),
+    (-310, errors.DeviceError),
+    (42, errors.DeviceError),
+    (-410, errors.QueryError),
+    (-999, errors.InstrumentError),
+])
+def test_error_class(code, error):
+    """
+    Error codes are typed by SCPI error class
+    """
+    assert errors.error_class(code) is error
+
+
+def test_command_error_on_query(device):
+    """
+    An undefined header raises a CommandError with the next query, naming the messages sent since the last check
+    """
+    device.send('FOO')
+    with pytest.raises(errors.CommandError) as info:
+        device.query('VOLT?')
+    assert (info.value.code, info.value.message) == (-113, 'Undefined header')
+    assert info.value.commands[0] == 'FOO'
+    assert device.query('VOLT?') == '0.000'
+
+
+def test_execution_error_on_check(device):
+    """
+    check() raises the first queued error, and drains the others into the same exception
+    """
+    device.send('VOLT 40')
+    device.send('VOLT ABC')
+    with pytest.raises(errors.ExecutionError) as info:
+        device.check()
+    assert info.value.code == -222
+    assert info.value.errors == ((-222, 'Data out of range'), (-104, 'Data type error'))
+    assert info.value.commands == ('VOLT 40', 'VOLT ABC')
+    device.check()
+
+
+def test_batch_error(device):
+    """
+    A batch checks the error queue with its last message, and its query results are still dispatched
+    """
+    with pytest.raises(errors.ExecutionError):
+        with device.batch() as batch:
+            volt = batch.query('VOLT?', float)
+            batch.write('CURR 9')
+    assert volt.value == 0.0
+
+
+def test_unchecked_mode(device):
+    """
+    Without checked mode, errors are left in the queue until checked
+    """
+    device.checked = False
+    device.send('FOO')
+    assert device.query('VOLT?') == '0.000'
+    device.checked = True
+    with pytest.raises(errors.CommandError):
+        device.check()
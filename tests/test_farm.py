@@ -0,0 +1,61 @@
+"""
+Power supply farm with simulated instruments
+"""
+
+import pytest
+from pyrs.farm import PowerSupplyFarm
+from pyrs.simulator import SimulatedResourceManager
+from pyrs.snapshot import DeviceState
+
+
+@pytest.fixture(name='setup')
+def fixture_setup():
+    """
+    Farm of two simulated instruments
+    """
+    manager = SimulatedResourceManager()
+    with PowerSupplyFarm(['SIM::A', 'SIM::B'], resource_manager=manager) as farm:
+        yield farm, manager.resources
+
+
+def test_snapshot(setup):
+    """
+    Every device is read in one operation
+    """
+    farm, simulated = setup
+    simulated['SIM::B'].channels[2].volt = 3.0
+    result = farm.snapshot()
+    assert result.ok
+    assert all(isinstance(state, DeviceState) for state in result.results.values())
+    assert result['SIM::B'].channel(2).volt == 3.0
+
+
+def test_empty_names(setup):
+    """
+    An empty device list is an empty result
+    """
+    farm, _ = setup
+    assert farm.measure([1], names=[]).results == {}
+    assert farm.output_selected([1], 1, names=[], synchronized=True).results == {}
+
+
+def test_unknown_name(setup):
+    """
+    An unknown device name is rejected before any device is driven
+    """
+    farm, simulated = setup
+    with pytest.raises(ValueError):
+        farm.set_power({1: 5.0}, names=['SIM::A', 'SIM::C'])
+    assert simulated['SIM::A'].channels[1].volt == 0.0
+
+
+def test_synchronized_output(setup):
+    """
+    The selected channels are switched together, and an empty channel list leaves the general output unchanged
+    """
+    farm, simulated = setup
+    result = farm.output_selected([1, 2], 1, synchronized=True)
+    assert result.ok
+    assert all(device.general and device.channels[2].output for device in simulated.values())
+    assert farm.output_selected([], 0, synchronized=True).ok
+    assert all(device.general for device in simulated.values())
@@ -0,0 +1,85 @@
+"""
+Command pipelining with the simulated instrument
+"""
+
+import pytest
+from pyrs.hmp2030 import HMP2030
+from pyrs.pipeline import Batch
+from pyrs.simulator import SimulatedResourceManager
+
+
+@pytest.fixture(name='setup')
+def fixture_setup(monkeypatch):
+    """
+    Device on a simulated instrument, with the list of the messages written to the instrument
+    """
+    manager = SimulatedResourceManager()
+    device = HMP2030('SIM::HMP2030', resource_manager=manager)
+    simulated = manager.resources['SIM::HMP2030']
+    messages = []
+    write = simulated.write
+
+    def record(message):
+        messages.append(message)
+        return write(message)
+
+    monkeypatch.setattr(simulated, 'write', record)
+    yield device, simulated, messages
+    device.close()
+
+
+def test_messages_fit_the_buffer():
+    """
+    The queued commands are split into messages no longer than the buffer size, keeping their order
+    """
+    batch = Batch(None, HMP2030.BUFFER_SIZE)
+    commands = [f'VOLT {index / 10:.1f}' for index in range(100)]
+    for command in commands:
+        batch.write(command)
+    messages = [message for message, _ in batch.messages()]
+    assert len(messages) > 1
+    assert all(len(message) <= HMP2030.BUFFER_SIZE for message in messages)
+    assert ';'.join(messages) == ';'.join(f':{command}' for command in commands)
+
+
+def test_split_at_the_buffer_size():
+    """
+    A message filling the buffer size exactly is kept whole, and the next command starts a new message
+    """
+    batch = Batch(None, 21)
+    batch.write('A' * 9)
+    batch.write('B' * 9)
+    batch.write('C')
+    assert [message for message, _ in batch.messages()] == [f":{'A' * 9};:{'B' * 9}", ':C']
+
+
+def test_responses_across_messages(setup):
+    """
+    The responses of a batch split into several messages are dispatched to their queries
+    """
+    device, simulated, messages = setup
+    for channel in (1, 2, 3):
+        simulated.channels[channel].volt = channel + 0.5
+    with device.batch() as batch:
+        results = []
+        for index in range(60):
+            batch.write(f'INST:NSEL {index % 3 + 1}')
+            results.append(batch.query('VOLT?', float))
+    assert len(messages) > 1
+    assert all(len(message) <= HMP2030.BUFFER_SIZE for message in messages)
+    assert [result.value for result in results] == [index % 3 + 1.5 for index in range(60)]
+
+
+def test_commands_only(setup):
+    """
+    A batch without queries is written without reading, each message within the buffer size
+    """
+    device, simulated, messages = setup
+    with device.batch() as batch:
+        for index in range(50):
+            batch.write(f'INST:NSEL {index % 3 + 1}')
+            batch.write(f'VOLT {index / 10:.1f}')
+    assert len(messages) > 1
+    assert all(len(message) <= HMP2030.BUFFER_SIZE for message in messages)
+    assert simulated.counters['reads'] == 0
+    assert [simulated.channels[channel].volt for channel in (1, 2, 3)] == [4.8, 4.9, 4.7]
@@ -0,0 +1,53 @@
+"""
+Preset library with the simulated instrument
+"""
+
+import pytest
+from pyrs.hmp2030 import HMP2030
+from pyrs.presets import PresetLibrary
+from pyrs.simulator import SimulatedResourceManager
+
+
+@pytest.fixture(name='setup')
+def fixture_setup():
+    """
+    Device on a simulated instrument, with channel 1 set and its output on
+    """
+    manager = SimulatedResourceManager()
+    device = HMP2030('SIM::HMP2030', resource_manager=manager)
+    device.send('INST:NSEL 1;VOLT 5.0;CURR 0.5;OUTP:SEL ON;OUTP:GEN ON')
+    yield device, manager.resources['SIM::HMP2030']
+    device.close()
+
+
+def test_activate_keeps_outputs(setup):
+    """
+    Activating a preset changes the setpoints only
+    """
+    device, simulated = setup
+    presets = PresetLibrary(device)
+    presets.define('low', device.snapshot()._replace(general=False))
+    device.send('INST:NSEL 1;VOLT 3.0')
+    presets.activate('low')
+    assert simulated.channels[1].volt == 5.0
+    assert simulated.channels[1].output and simulated.general
+
+
+def test_verify_restores_setpoints_not_outputs(setup, monkeypatch):
+    """
+    The setpoints are restored after a verification, and outputs switched off by a recall stay off
+    """
+    device, simulated = setup
+    presets = PresetLibrary(device)
+    presets.define('low', device.snapshot())
+    presets.activate('low')
+    device.send('INST:NSEL 1;VOLT 7.0')
+    call = device.call
+
+    def recall_off(location):
+        call(location)
+        device.send('OUTP:GEN OFF')
+    monkeypatch.setattr(device, 'call', recall_off)
+    assert not presets.verify()
+    assert simulated.channels[1].volt == 7.0
+    assert not simulated.general
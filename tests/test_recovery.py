@@ -0,0 +1,66 @@
+"""
+Recovery replay with the simulated instrument
+"""
+
+import pytest
+from pyrs.hmp2030 import HMP2030
+from pyrs.recovery import REPLAY_OUTPUTS, ReplayError
+from pyrs.simulator import SimulatedResourceManager
+
+
+@pytest.fixture(name='setup')
+def fixture_setup():
+    """
+    Cached device on a simulated instrument, with channel 2 set and its output on
+    """
+    manager = SimulatedResourceManager()
+    device = HMP2030('SIM::HMP2030', resource_manager=manager, cache=True)
+    device.send('INST:NSEL 2;VOLT 5.0;CURR 0.5;OUTP:SEL ON;OUTP:GEN ON')
+    yield device, manager.resources['SIM::HMP2030']
+    device.close()
+
+
+def test_outputs_kept_off_after_power_cycle(setup):
+    """
+    The setpoints are replayed after a power cycle, the outputs stay off
+    """
+    device, simulated = setup
+    device.enable_recovery(backoff=0.0)
+    simulated.disconnect(power_cycle=True)
+    device.query('MEAS:VOLT?')
+    assert device.recovery.stats.recoveries == 1
+    assert (simulated.channels[2].volt, simulated.channels[2].current) == (5.0, 0.5)
+    assert not simulated.channels[2].output and not simulated.general
+    assert device.known_state() == device.snapshot()
+
+
+def test_outputs_replayed_on_request(setup):
+    """
+    The output states are replayed when opted in
+    """
+    device, simulated = setup
+    device.enable_recovery(backoff=0.0, replay=REPLAY_OUTPUTS)
+    simulated.disconnect(power_cycle=True)
+    device.query('MEAS:VOLT?')
+    assert simulated.channels[2].output and simulated.general
+    assert simulated.channels[2].volt == 5.0
+
+
+def test_outputs_off_when_replay_differs(setup, monkeypatch):
+    """
+    An output replay that does not verify switches the outputs off
+    """
+    device, simulated = setup
+    device.enable_recovery(backoff=0.0, replay=REPLAY_OUTPUTS)
+    simulated.disconnect(power_cycle=True)
+    apply_snapshot = device.apply_snapshot
+
+    def ignore_outputs(state):
+        count = apply_snapshot(state)
+        simulated.channels[2].output = False
+        return count
+    monkeypatch.setattr(device, 'apply_snapshot', ignore_outputs)
+    with pytest.raises(ReplayError):
+        device.query('MEAS:VOLT?')
+    assert not simulated.general
+    assert device.recovery.stats.failed == 1
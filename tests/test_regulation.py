@@ -0,0 +1,50 @@
+"""
+PI controller clamps
+"""
+
+import pytest
+from pyrs.regulation import PIController
+
+
+def test_limits_required():
+    """
+    A controller has no default output limits, and its limits stay within the channel range
+    """
+    with pytest.raises(TypeError):
+        PIController(1.0, 1.0)  # pylint: disable=no-value-for-parameter
+    with pytest.raises(ValueError):
+        PIController(1.0, 1.0, limits=(0.0, 40.0))
+    with pytest.raises(ValueError):
+        PIController(1.0, 1.0, limits=(5.0, 2.0))
+
+
+def test_anti_windup():
+    """
+    The integral term is frozen while the output is saturated, so the output leaves the limit at once
+    """
+    controller = PIController(kp=1.0, ki=1.0, limits=(0.0, 5.0))
+    controller.reset(4.0)
+    assert controller.update(10.0, 1.0) == 5.0
+    assert controller.saturated
+    assert controller.update(-1.0, 1.0) == 2.0
+    assert not controller.saturated
+
+
+def test_slew_rate():
+    """
+    The output change is capped by the slew rate
+    """
+    controller = PIController(kp=10.0, ki=0.0, limits=(0.0, 10.0), slew=1.0)
+    controller.reset(0.0)
+    assert controller.update(5.0, 0.5) == 0.5
+    assert controller.saturated
+    assert controller.update(5.0, 0.5) == 1.0
+
+
+def test_reset_clamps():
+    """
+    A reset output outside the limits starts from the nearest limit
+    """
+    controller = PIController(kp=1.0, ki=1.0, limits=(1.0, 3.0))
+    controller.reset(12.0)
+    assert controller.output == 3.0
@@ -0,0 +1,48 @@
+"""
+Status subsystem with the simulated instrument
+"""
+
+import pytest
+from pyrs.hmp2030 import HMP2030
+from pyrs.simulator import SimulatedResourceManager
+
+
+@pytest.fixture(name='setup')
+def fixture_setup():
+    """
+    Device on a simulated instrument
+    """
+    manager = SimulatedResourceManager()
+    device = HMP2030('SIM::HMP2030', resource_manager=manager)
+    yield device, manager.resources['SIM::HMP2030']
+    device.close()
+
+
+def test_wait_complete_restores_enable_registers(setup):
+    """
+    Waiting for the service request leaves the event enable registers as they were
+    """
+    device, simulated = setup
+    device.send('*ESE 4;*SRE 8')
+    device.status.wait_complete(srq=True)
+    assert simulated.enable == {'ESE': 4, 'SRE': 8}
+
+
+def test_wait_complete_restores_timeout(setup):
+    """
+    The *OPC? wait timeout applies to the wait only
+    """
+    device, simulated = setup
+    device.status.wait_complete(timeout=500)
+    assert device.timeout == simulated.timeout == 2000
+
+
+def test_wait_settled_polls_at_interval(setup):
+    """
+    An unsettled channel is polled at the given interval until the timeout
+    """
+    device, simulated = setup
+    writes = simulated.counters['writes']
+    with pytest.raises(TimeoutError):
+        device.status.wait_settled(1, timeout=0.2, target=10.0, interval=0.05)
+    assert simulated.counters['writes'] - writes < 12
@@ -0,0 +1,83 @@
+"""
+Write-behind queue with the simulated instrument
+"""
+
+import time
+import pytest
+from pyrs.hmp2030 import HMP2030
+from pyrs.simulator import SimulatedResourceManager
+from pyrs.writer import CommandQueue
+
+
+@pytest.fixture(name='setup')
+def fixture_setup(monkeypatch):
+    """
+    Device on a simulated instrument, with the list of the messages written to the instrument
+    """
+    manager = SimulatedResourceManager()
+    device = HMP2030('SIM::HMP2030', resource_manager=manager)
+    simulated = manager.resources['SIM::HMP2030']
+    messages = []
+    write = simulated.write
+
+    def record(message):
+        write(message)
+        messages.append(message)
+
+    monkeypatch.setattr(simulated, 'write', record)
+    yield device, simulated, messages
+    device.close()
+
+
+def test_setpoints_coalesced_per_channel():
+    """
+    Pending setpoints of the same channel and parameter are coalesced, in place of the first one
+    """
+    queue = CommandQueue(HMP2030.BUFFER_SIZE)
+    for command in ('INST:NSEL 2', 'VOLT 1', 'VOLT 9', 'INST:NSEL 1', 'VOLT 4', 'VOLT 5'):
+        queue.put(command)
+    assert queue.take() == ([':INST:NSEL 2;:VOLT 9;:INST:NSEL 1;:VOLT 5'], 1)
+
+
+def test_barrier_not_overtaken():
+    """
+    A setpoint queued after a barrier command is never merged with a setpoint queued before it
+    """
+    queue = CommandQueue(HMP2030.BUFFER_SIZE)
+    for command in ('INST:NSEL 1', 'VOLT 1', 'OUTP ON', 'VOLT 2', 'VOLT 3'):
+        queue.put(command)
+    assert queue.take() == ([':INST:NSEL 1;:VOLT 1;:OUTP ON;:VOLT 3'], 1)
+
+
+def test_query_flushes_the_queue(setup):
+    """
+    A query writes the pending commands first, without waiting for the writer linger time
+    """
+    device, simulated, messages = setup
+    device.enable_write_behind(linger=0.5)
+    start = time.perf_counter()
+    device.channel = 2
+    for volt in range(10):
+        device.volt = volt
+    device.channel = 1
+    device.volt = 4
+    assert device.volt == '4.000'
+    assert time.perf_counter() - start < 0.5
+    assert messages == [':INST:NSEL 2;:VOLT 9;:INST:NSEL 1;:VOLT 4', 'VOLT?']
+    assert (simulated.channels[1].volt, simulated.channels[2].volt) == (4.0, 9.0)
+
+
+def test_writer_thread(setup):
+    """
+    The writer thread writes the queued commands once the linger time has elapsed
+    """
+    device, simulated, messages = setup
+    device.enable_write_behind(linger=0.01)
+    device.channel = 3
+    device.volt = 2.5
+    device.current = 0.5
+    deadline = time.monotonic() + 2.0
+    while not messages and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert (simulated.channels[3].volt, simulated.channels[3].current) == (2.5, 0.5)
+    assert messages == [':INST:NSEL 3;:VOLT 2.5;:CURR 0.5']